@@ -6,17 +6,241 @@ import torch
 import torch.nn as nn
 import cv2
 import numpy as np
-from PIL import Image
-import torchvision.transforms as transforms
+import torchvision
 from pathlib import Path
 import logging
 from typing import Dict, List, Tuple, Any
+import gc
+import os
+import queue
+import threading
 import time
 import pretrained_microscopy_models as pmm
 import torch.utils.model_zoo as model_zoo
+from django.conf import settings
+
+from .metrics import (
+    Histogram,
+    observe_stage_timings,
+    set_batching_stats,
+    set_model_registry_stats,
+    time_stage,
+)
+from .model_registry import ModelRegistry, trim_heap
+from .preprocessing import ImagePreprocessor
+from .weight_store import get_weight_store, WeightStoreError
 
 logger = logging.getLogger(__name__)
 
+TASK_TYPES = ("classification", "segmentation")
+DEFAULT_DISEASE_TYPE = "parasite"
+DEFAULT_MODEL_CONFIG = "parasite_classification"
+
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+# Height and width every image is resized to before inference
+INPUT_SIZE = (224, 224)
+
+# Input size of the dummy batch used to warm up freshly loaded models
+WARMUP_INPUT_SIZE = (1, 3) + INPUT_SIZE
+
+MODEL_CONFIGS = {
+    "malaria_classification": {
+        "encoder": "efficientnet-b2",  # Good accuracy/speed balance
+        "num_classes": 3,  # normal, infected, suspicious
+        "confidence_threshold": 0.7,
+        "class_names": ["Normal", "Malaria_Infected", "Suspicious"],
+        "version": "micronet_v1.1",
+        "quantization": None,  # None, "dynamic" or "static" INT8 on CPU
+    },
+    "malaria_segmentation": {
+        "encoder": "resnet50",
+        "num_classes": 3,  # background, cell, parasite
+        "confidence_threshold": 0.6,
+        "class_names": ["Background", "Blood_Cell", "Parasite"],
+        "version": "micronet_v1.1",
+        "quantization": None,  # None, "dynamic" or "static" INT8 on CPU
+    },
+    "parasite_classification": {
+        "encoder": "se_resnext50_32x4d",  # High accuracy for parasites
+        "num_classes": 4,  # normal, malaria, other_parasite, artifact
+        "confidence_threshold": 0.75,
+        "class_names": ["Normal", "Malaria", "Other_Parasite", "Artifact"],
+        "version": "micronet_v1.1",
+        "quantization": None,  # None, "dynamic" or "static" INT8 on CPU
+    },
+    "general_segmentation": {
+        "encoder": "efficientnet-b1",
+        "num_classes": 2,  # background, abnormal_region
+        "confidence_threshold": 0.5,
+        "class_names": ["Background", "Abnormal_Region"],
+        "version": "micronet_v1.1",
+        "quantization": None,  # None, "dynamic" or "static" INT8 on CPU
+    },
+}
+
+
+# Clinical severity of predicted classes, used for session-level aggregates.
+# Classes not listed (Normal, Background, Blood_Cell, Artifact) are 0.
+CLASS_SEVERITY = {
+    "Suspicious": 1,
+    "Malaria_Infected": 2,
+    "Malaria": 2,
+    "Other_Parasite": 2,
+    "Parasite": 2,
+    "Abnormal_Region": 2,
+}
+
+# Severity from which a prediction counts as parasite-positive
+POSITIVE_SEVERITY = 2
+
+
+class InferenceBatcher:
+    """
+    Coalesces concurrent forward passes for the same model into one batch.
+
+    Each model key gets a queue and a dispatcher thread. A batch is run as
+    soon as max_batch_size requests are pending or max_wait_time seconds
+    have passed since the first one arrived. Callers block until their
+    slice of the batch output is ready, so batching only kicks in when
+    several tasks run concurrently in one process (e.g. a threads pool).
+    """
+
+    def __init__(self, device, max_batch_size: int = 8, max_wait_time: float = 0.01):
+        self.device = device
+        self.max_batch_size = max_batch_size
+        self.max_wait_time = max_wait_time
+        self.batch_sizes = Histogram(range(1, max_batch_size + 1))
+        self.latencies = Histogram()
+        self._lock = threading.Lock()
+        self._queues = {}
+        self._pid = os.getpid()
+
+    def submit(self, model_key: str, model: nn.Module, input_tensor: torch.Tensor):
+        """Queue a single unbatched input and wait for its model output."""
+        request = {
+            "input": input_tensor,
+            "output": None,
+            "error": None,
+            "done": threading.Event(),
+            "submitted_at": time.time(),
+        }
+        self._get_queue(model_key).put((model, request))
+        request["done"].wait()
+
+        if request["error"] is not None:
+            raise request["error"]
+        return request["output"]
+
+    def _get_queue(self, model_key: str) -> queue.Queue:
+        with self._lock:
+            # Dispatcher threads do not survive a fork, start fresh in children
+            if self._pid != os.getpid():
+                self._queues = {}
+                self._pid = os.getpid()
+
+            if model_key not in self._queues:
+                request_queue = queue.Queue()
+                thread = threading.Thread(
+                    target=self._dispatch,
+                    args=(request_queue,),
+                    name=f"inference-batcher-{model_key}",
+                    daemon=True,
+                )
+                thread.start()
+                self._queues[model_key] = request_queue
+
+            return self._queues[model_key]
+
+    def _dispatch(self, request_queue: queue.Queue):
+        while True:
+            model, first_request = request_queue.get()
+            batch = [first_request]
+            deadline = time.time() + self.max_wait_time
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    _, request = request_queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+
+            self._run_batch(model, batch)
+
+    def _run_batch(self, model: nn.Module, batch: List[Dict]):
+        try:
+            inputs = torch.stack([r["input"] for r in batch]).to(self.device)
+            with torch.no_grad():
+                outputs = model(inputs)
+            for i, request in enumerate(batch):
+                request["output"] = outputs[i : i + 1]
+        except Exception as e:
+            logger.error(f"Batched inference failed for {len(batch)} inputs: {e}")
+            for request in batch:
+                request["error"] = e
+        finally:
+            finished_at = time.time()
+            self.batch_sizes.observe(len(batch))
+            for request in batch:
+                self.latencies.observe(finished_at - request["submitted_at"])
+                request["done"].set()
+
+        # Callers are already awake; failing to publish must not stop the
+        # dispatcher thread
+        try:
+            set_batching_stats(self.get_stats())
+        except Exception as e:
+            logger.warning(f"Could not publish batching stats: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Batch size and per-request latency histograms."""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_time": self.max_wait_time,
+            "batch_size": self.batch_sizes.snapshot(),
+            "latency": self.latencies.snapshot(),
+        }
+
+
+class OnnxRuntimeModel:
+    """
+    Callable wrapper running an exported ONNX model on the ONNX Runtime CPU
+    provider, taking and returning torch tensors like the eager model.
+    """
+
+    def __init__(self, path):
+        import onnxruntime as ort
+
+        self.path = path
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            str(path), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, input_tensor: torch.Tensor) -> torch.Tensor:
+        outputs = self.session.run(
+            None, {self.input_name: input_tensor.detach().cpu().numpy()}
+        )
+        return torch.from_numpy(outputs[0])
+
+
+def ends_in_softmax(model: nn.Module) -> bool:
+    """
+    Whether a segmentation model's head already turns logits into class
+    probabilities, as pretrained_microscopy_models builds multi-class UNets
+    with a softmax2d activation.
+    """
+    head = getattr(model, "segmentation_head", None)
+    return head is not None and any(
+        isinstance(module, nn.Softmax) for module in head.modules()
+    )
+
 
 class MicroscopyModelManager:
     """
@@ -25,21 +249,121 @@ class MicroscopyModelManager:
     """
 
     def __init__(self):
-        self.models = {}
+        # Loaded models, evicted least recently used first to stay within
+        # the per-process memory budget
+        budget_mb = getattr(settings, "AI_MODEL_MEMORY_BUDGET_MB", 0)
+        self.models = ModelRegistry(int(budget_mb * 2**20))
+        self._load_lock = threading.Lock()
+        # Set in a parent that loaded the models for its forked workers
+        self.shared_before_fork = False
+        # Models configured for a quantization mode that does not apply
+        self._unquantized_warnings = set()
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         logger.info(f"NASA MicroNet models will run on: {self.device}")
 
-        # Image preprocessing pipeline for microscopy
-        self.transform = transforms.Compose(
-            [
-                transforms.Resize((224, 224)),
-                transforms.ToTensor(),
-                transforms.Normalize(
-                    mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]
-                ),
-            ]
+        # Optional micro-batching of concurrent requests for the same model
+        self.batcher = None
+        if getattr(settings, "AI_BATCHING_ENABLED", False):
+            self.batcher = InferenceBatcher(
+                self.device,
+                max_batch_size=getattr(settings, "AI_BATCH_MAX_SIZE", 8),
+                max_wait_time=getattr(settings, "AI_BATCH_MAX_WAIT", 0.01),
+            )
+
+        # Image preprocessing pipeline for microscopy, normalising into a
+        # pinned buffer when inputs have to be copied to the GPU
+        self.preprocessor = ImagePreprocessor(
+            INPUT_SIZE,
+            IMAGENET_MEAN,
+            IMAGENET_STD,
+            pin_memory=self.device.type == "cuda",
+        )
+
+    def load_weights(self, name: str, fetch) -> Dict[str, torch.Tensor]:
+        """
+        Resolve pretrained weights from the local weight store first and
+        only call fetch() to download them when downloads are allowed.
+        """
+        state_dict = get_weight_store().load_state_dict(name)
+        if state_dict is not None:
+            logger.info(f"Loaded {name} weights from local weight store")
+            return state_dict
+
+        if getattr(settings, "AI_WEIGHTS_OFFLINE", False):
+            raise WeightStoreError(
+                f"Weights {name} are not in the local weight store and "
+                "downloads are disabled (run manage.py populate_weight_store)"
+            )
+
+        logger.warning(f"Weights {name} not in local weight store, downloading")
+        return fetch()
+
+    def build_torchvision_model(self, arch: str, pretrained: bool = False):
+        """Build a torchvision architecture, optionally with ImageNet weights."""
+        model = torchvision.models.get_model(arch, weights=None)
+        if pretrained:
+            state_dict = self.load_weights(
+                f"torchvision-imagenet/{arch}",
+                lambda: torchvision.models.get_model_weights(arch)[
+                    "IMAGENET1K_V1"
+                ].get_state_dict(progress=False),
+            )
+            model.load_state_dict(state_dict, assign=True)
+        return model
+
+    def load_micronet_encoder_weights(self, encoder_name: str):
+        """MicroNet pretrained encoder weights for an encoder backbone."""
+        return self.load_weights(
+            f"micronet/{encoder_name}",
+            lambda: model_zoo.load_url(
+                pmm.util.get_pretrained_microscopynet_url(encoder_name, "micronet"),
+                map_location="cpu",
+            ),
+        )
+
+    def load_imagenet_encoder_weights(self, encoder_name: str):
+        """ImageNet pretrained weights for a segmentation_models_pytorch encoder."""
+        import segmentation_models_pytorch as smp
+
+        return self.load_weights(
+            f"smp-imagenet/{encoder_name}",
+            lambda: smp.encoders.get_encoder(
+                encoder_name, weights="imagenet"
+            ).state_dict(),
         )
 
+    def build_unet(
+        self,
+        encoder_name: str,
+        encoder_weights: str,
+        num_classes: int,
+        use_pmm: bool = True,
+    ):
+        """
+        Build a UNet without any network access during construction and load
+        the encoder weights through the weight store.
+        """
+        if use_pmm:
+            model = pmm.segmentation_training.create_segmentation_model(
+                "Unet", encoder_name, None, classes=num_classes
+            )
+        else:
+            import segmentation_models_pytorch as smp
+
+            model = smp.Unet(
+                encoder_name=encoder_name,
+                encoder_weights=None,
+                classes=num_classes,
+                activation=None,
+            )
+
+        if encoder_weights == "micronet":
+            state_dict = self.load_micronet_encoder_weights(encoder_name)
+        else:
+            state_dict = self.load_imagenet_encoder_weights(encoder_name)
+        model.encoder.load_state_dict(state_dict, assign=True)
+        return model
+
     def load_micronet_classifier(self, encoder_name: str = "resnet50"):
         """Load MicroNet pretrained classification model."""
         try:
@@ -47,23 +371,18 @@ class MicroscopyModelManager:
             logger.info(f"Available pmm.util methods: {dir(pmm.util)}")
 
             # Load base model architecture
-            model = torch.hub.load(
-                "pytorch/vision:v0.10.0", encoder_name, pretrained=False
-            )
+            model = self.build_torchvision_model(encoder_name)
 
             # Try to load MicroNet pretrained weights
             try:
-                url = pmm.util.get_pretrained_microscopynet_url(
-                    encoder_name, "micronet"
+                model.load_state_dict(
+                    self.load_micronet_encoder_weights(encoder_name), assign=True
                 )
-                model.load_state_dict(model_zoo.load_url(url))
                 logger.info(f"Successfully loaded MicroNet weights for {encoder_name}")
             except Exception as weight_error:
                 logger.warning(f"Could not load MicroNet weights: {weight_error}")
                 logger.info("Falling back to ImageNet pretrained weights")
-                model = torch.hub.load(
-                    "pytorch/vision:v0.10.0", encoder_name, pretrained=True
-                )
+                model = self.build_torchvision_model(encoder_name, pretrained=True)
 
             # Modify classifier head for diagnostic classes
             num_classes = self.get_num_classes()
@@ -89,9 +408,7 @@ class MicroscopyModelManager:
             logger.error(f"Failed to load classifier {encoder_name}: {e}")
             # Fallback to simple ResNet
             logger.info("Using fallback ResNet18 model")
-            model = torch.hub.load(
-                "pytorch/vision:v0.10.0", "resnet18", pretrained=True
-            )
+            model = self.build_torchvision_model("resnet18", pretrained=True)
             model.fc = nn.Linear(model.fc.in_features, self.get_num_classes())
             model = model.to(self.device)
             model.eval()
@@ -109,9 +426,7 @@ class MicroscopyModelManager:
 
             # Try to create UNet with MicroNet backbone
             try:
-                model = pmm.segmentation_training.create_segmentation_model(
-                    "Unet", encoder_name, "micronet", classes=num_classes
-                )
+                model = self.build_unet(encoder_name, "micronet", num_classes)
                 logger.info(f"Successfully created MicroNet UNet with {encoder_name}")
             except Exception as seg_error:
                 logger.warning(
@@ -121,19 +436,12 @@ class MicroscopyModelManager:
 
                 # Fallback: create basic UNet with ImageNet backbone
                 try:
-                    model = pmm.segmentation_training.create_segmentation_model(
-                        "Unet", encoder_name, "imagenet", classes=num_classes
-                    )
+                    model = self.build_unet(encoder_name, "imagenet", num_classes)
                 except Exception as fallback_error:
                     logger.error(f"Fallback segmentation failed: {fallback_error}")
                     # Use a simple segmentation model
-                    import segmentation_models_pytorch as smp
-
-                    model = smp.Unet(
-                        encoder_name=encoder_name,
-                        encoder_weights="imagenet",
-                        classes=num_classes,
-                        activation=None,
+                    model = self.build_unet(
+                        encoder_name, "imagenet", num_classes, use_pmm=False
                     )
 
             model = model.to(self.device)
@@ -146,13 +454,8 @@ class MicroscopyModelManager:
             logger.error(f"Failed to load segmentation model: {e}")
             # Final fallback - basic UNet
             try:
-                import segmentation_models_pytorch as smp
-
-                model = smp.Unet(
-                    encoder_name="resnet18",
-                    encoder_weights="imagenet",
-                    classes=num_classes,
-                    activation=None,
+                model = self.build_unet(
+                    "resnet18", "imagenet", num_classes, use_pmm=False
                 )
                 model = model.to(self.device)
                 model.eval()
@@ -169,90 +472,390 @@ class MicroscopyModelManager:
 
     def load_model(self, disease_type: str, task_type: str = "classification"):
         """Load appropriate MicroNet model based on disease type and task."""
-        model_key = f"{disease_type}_{task_type}"
+        model_key = self.get_model_key(disease_type, task_type)
 
-        if model_key not in self.models:
-            config = self.get_model_config(disease_type, task_type)
+        model_info = self.models.get(model_key)
+        if model_info is not None:
+            return model_info
 
-            if task_type == "classification":
-                model = self.load_micronet_classifier(config["encoder"])
-            else:  # segmentation
-                model = self.load_micronet_segmentation(
-                    config["encoder"], config["num_classes"]
-                )
+        # One load at a time, so concurrent requests for a model not yet
+        # resident neither build it twice nor overshoot the budget
+        with self._load_lock:
+            model_info = self.models.get(model_key)
+            if model_info is not None:
+                return model_info
 
-            self.models[model_key] = {
+            config = self.get_model_config(disease_type, task_type)
+            backend = getattr(settings, "AI_INFERENCE_BACKEND", "eager")
+
+            quantization = self.get_quantization_mode(model_key, config, task_type)
+
+            model = None
+            outputs_probabilities = False
+            if backend != "eager":
+                model = self.load_exported_model(model_key, backend, config, task_type)
+                if model is not None:
+                    # Exported graphs no longer expose the head to inspect
+                    outputs_probabilities = self.exported_ends_in_softmax(
+                        model_key, backend
+                    )
+                if model is not None and quantization:
+                    logger.warning(
+                        f"Quantization is only applied to eager models, "
+                        f"ignoring it for {model_key} on {backend}"
+                    )
+                    quantization = None
+            if model is None:
+                backend = "eager"
+                model = self.build_eager_model(config, task_type)
+                outputs_probabilities = ends_in_softmax(model)
+                if quantization:
+                    model, quantization = self.quantize(model, quantization, task_type)
+
+            model_info = {
+                "model_key": model_key,
                 "model": model,
                 "config": config,
                 "task_type": task_type,
+                "backend": backend,
+                "quantization": quantization,
+                "outputs_probabilities": outputs_probabilities,
+                "model_version": self.get_model_version(
+                    config, quantization, task_type
+                ),
+            }
+            self.models.add(model_key, model_info)
+
+        stats = self.models.get_stats()
+        set_model_registry_stats(stats)
+        logger.info(
+            f"Loaded {model_key}; {len(stats['models'])} models resident in "
+            f"{stats['resident_bytes'] / 2**20:.1f} MB of "
+            f"{stats['budget_bytes'] / 2**20:.1f} MB, "
+            f"{stats['evictions']} evictions so far"
+        )
+        return model_info
+
+    def get_quantization_mode(
+        self, model_key: str, config: Dict[str, Any], task_type: str
+    ):
+        """INT8 quantization mode of a model: settings override, then config."""
+        from .quantization import supports_quantization
+
+        overrides = getattr(settings, "AI_MODEL_QUANTIZATION", {})
+        mode = overrides.get(model_key, config.get("quantization"))
+        if mode and self.device.type != "cpu":
+            logger.info(f"Skipping INT8 quantization of {model_key} on {self.device}")
+            return None
+        if mode and not supports_quantization(mode, task_type):
+            # Left untagged, as the model would run unchanged in float
+            if model_key not in self._unquantized_warnings:
+                self._unquantized_warnings.add(model_key)
+                logger.warning(
+                    f"{mode} quantization does not quantize {task_type} models, "
+                    f"keeping {model_key} in float; use static mode"
+                )
+            return None
+        return mode or None
+
+    def get_model_version(
+        self, config: Dict[str, Any], quantization: str = None, task_type: str = None
+    ) -> str:
+        """
+        Model version, tagged when the weights are quantized and when
+        segmentation runs on tiles, as both change the predictions and so
+        must not share cached results with the plain model.
+        """
+        version = config["version"]
+        if quantization:
+            version = f"{version}+int8-{quantization}"
+        if (
+            task_type == "segmentation"
+            and getattr(settings, "AI_SEGMENTATION_MODE", "resize") == "tiled"
+        ):
+            version = f"{version}+{self.get_tiling_tag()}"
+        return version
+
+    def get_tiling_tag(self) -> str:
+        """Tile size, stride and stitching of the tiled segmentation mode."""
+        tag = (
+            f"tiled{getattr(settings, 'AI_TILE_SIZE', 512)}"
+            f"s{getattr(settings, 'AI_TILE_STRIDE', 256)}"
+        )
+        if getattr(settings, "AI_TILE_STREAMING", False):
+            tag = f"{tag}-{getattr(settings, 'AI_TILE_WINDOW', 'cosine')}"
+        return tag
+
+    def quantize(
+        self, model: nn.Module, mode: str, task_type: str
+    ) -> Tuple[nn.Module, str]:
+        """
+        Quantize a float model, calibrating static mode on stored images.
+        Returns the model and the mode actually applied, since static mode
+        falls back to dynamic, or to float where dynamic mode would not
+        quantize anything, when there are no images to calibrate on.
+        """
+        from .quantization import (
+            load_calibration_inputs,
+            quantize_model,
+            supports_quantization,
+        )
+
+        calibration_inputs = []
+        if mode == "static":
+            calibration_inputs = load_calibration_inputs(
+                self.preprocessor,
+                getattr(settings, "AI_QUANTIZATION_CALIBRATION_SIZE", 32),
+            )
+            if not calibration_inputs:
+                if not supports_quantization("dynamic", task_type):
+                    logger.warning(
+                        "No stored images to calibrate static quantization, "
+                        f"keeping the {task_type} model in float"
+                    )
+                    return model, None
+                logger.warning(
+                    "No stored images to calibrate static quantization, "
+                    "using dynamic quantization instead"
+                )
+                mode = "dynamic"
+
+        return quantize_model(model, mode, calibration_inputs, task_type), mode
+
+    def build_eager_model(self, config: Dict[str, Any], task_type: str):
+        """Build the eager PyTorch model for a configuration."""
+        if task_type == "classification":
+            return self.load_micronet_classifier(config["encoder"])
+        # segmentation
+        return self.load_micronet_segmentation(config["encoder"], config["num_classes"])
+
+    def load_exported_model(
+        self,
+        model_key: str,
+        backend: str,
+        config: Dict[str, Any],
+        task_type: str = "classification",
+    ):
+        """
+        Load the exported artifact of a model for a runtime backend. Returns
+        None, so the caller falls back to eager PyTorch, when there is no
+        artifact for the current model version, it failed its equivalence
+        check at export time or it only runs at the export input size while
+        segmentation runs on tiles.
+        """
+        from .model_export import BACKEND_FORMATS, get_export_path, read_export_report
+
+        if backend not in BACKEND_FORMATS:
+            logger.error(f"Unknown inference backend {backend}, using eager PyTorch")
+            return None
+
+        export_format = BACKEND_FORMATS[backend]
+        path = get_export_path(model_key, export_format)
+        report = read_export_report(model_key, export_format)
+
+        if not path.exists() or report is None:
+            logger.warning(f"No {export_format} export for {model_key}, using eager")
+            return None
+        if report.get("version") != config["version"]:
+            logger.warning(
+                f"{export_format} export of {model_key} is for version "
+                f"{report.get('version')}, not {config['version']}, using eager"
+            )
+            return None
+        if not report.get("equivalent"):
+            logger.warning(
+                f"{export_format} export of {model_key} failed its equivalence "
+                "check, using eager"
+            )
+            return None
+        if (
+            task_type == "segmentation"
+            and getattr(settings, "AI_SEGMENTATION_MODE", "resize") == "tiled"
+            and not report.get("dynamic_spatial")
+        ):
+            logger.warning(
+                f"{export_format} export of {model_key} has a fixed input size "
+                "and cannot run on tiles, using eager (re-run export_models)"
+            )
+            return None
+
+        if backend == "onnxruntime":
+            model = OnnxRuntimeModel(path)
+        else:  # torchscript
+            model = torch.jit.load(str(path), map_location=self.device)
+            model.eval()
+
+        logger.info(f"Loaded {model_key} with {backend} backend from {path}")
+        return model
+
+    def exported_ends_in_softmax(self, model_key: str, backend: str) -> bool:
+        """Whether the exported model's export report records a softmax head."""
+        from .model_export import BACKEND_FORMATS, read_export_report
+
+        report = read_export_report(model_key, BACKEND_FORMATS[backend]) or {}
+        return report.get("outputs_probabilities", False)
+
+    def run_model(self, model_info: Dict, input_tensor: torch.Tensor) -> torch.Tensor:
+        """
+        Run the model on a single preprocessed image tensor (C, H, W) and
+        return its output with a leading batch dimension of one.
+        """
+        if self.batcher is not None:
+            return self.batcher.submit(
+                model_info["model_key"], model_info["model"], input_tensor
+            )
+
+        with torch.no_grad():
+            return model_info["model"](
+                input_tensor.unsqueeze(0).to(self.device, non_blocking=True)
+            )
+
+    def warm_up_model(self, model_info: Dict) -> None:
+        """Run a dummy forward pass so kernels and allocators are initialised."""
+        dummy_input = torch.zeros(WARMUP_INPUT_SIZE, device=self.device)
+        with torch.no_grad():
+            model_info["model"](dummy_input)
+
+    def preload_models(self, warm_up: bool = True) -> Dict[str, Dict[str, float]]:
+        """
+        Build and warm up every configured model ahead of the first request.
+        Returns per-model load and warm-up times in seconds.
+        """
+        load_stats = {}
+
+        targets = self.get_preload_targets()
+        if self.shared_before_fork:
+            # Models the parent process could not load would fail here again
+            targets = [
+                target
+                for target in targets
+                if self.get_model_key(*target) in self.models
+            ]
+
+        for disease_type, task_type in targets:
+            model_key = self.get_model_key(disease_type, task_type)
+            if self.models.evictions:
+                # Preloading more would only evict models preloaded earlier
+                logger.warning(
+                    f"Model memory budget reached, not preloading {model_key}"
+                )
+                continue
+            try:
+                start_time = time.time()
+                model_info = self.load_model(disease_type, task_type)
+                load_time = time.time() - start_time
+
+                start_time = time.time()
+                if warm_up:
+                    self.warm_up_model(model_info)
+                warmup_time = time.time() - start_time
+            except Exception as e:
+                logger.error(f"Failed to preload model {model_key}: {e}")
+                continue
+
+            load_stats[model_key] = {
+                "load_time": round(load_time, 3),
+                "warmup_time": round(warmup_time, 3),
             }
+            logger.info(
+                f"Preloaded {model_key} ({model_info['config']['encoder']}) "
+                f"in {load_time:.3f}s, warm-up {warmup_time:.3f}s"
+            )
 
-        return self.models[model_key]
+        set_model_registry_stats(self.models.get_stats())
+        return load_stats
+
+    def prepare_for_fork(self) -> Dict[str, Dict[str, float]]:
+        """
+        Load every configured model in a parent process about to fork worker
+        processes, so the children share the weight pages copy-on-write
+        instead of each building its own copy. The models are frozen (eval
+        mode, no gradients), the freed heap is returned to the OS and every
+        object alive is moved out of the garbage collector's reach, as
+        collection passes in the children would otherwise write to, and so
+        copy, the pages holding them. Warm-up is left to the children: running kernels
+        starts thread pools that do not survive fork.
+        """
+        if self.device.type != "cpu":
+            logger.warning(f"Not sharing model weights across workers on {self.device}")
+            return {}
+        backend = getattr(settings, "AI_INFERENCE_BACKEND", "eager")
+        if backend == "onnxruntime":
+            logger.warning("ONNX Runtime sessions are not fork-safe, not sharing them")
+            return {}
+
+        load_stats = self.preload_models(warm_up=False)
+        for _, model_info in self.models.items():
+            model = model_info["model"]
+            if isinstance(model, nn.Module):
+                model.eval()
+                model.requires_grad_(False)
+
+        self.shared_before_fork = True
+        gc.collect()
+        trim_heap()
+        gc.freeze()
+        logger.info(
+            f"Sharing {len(load_stats)} preloaded models with forked workers "
+            f"({self.models.resident_bytes / 2**20:.1f} MB)"
+        )
+        return load_stats
 
     def get_model_config(self, disease_type: str, task_type: str) -> Dict[str, Any]:
         """Get model configuration for specific disease type and task."""
-        configs = {
-            "malaria_classification": {
-                "encoder": "efficientnet-b2",  # Good accuracy/speed balance
-                "num_classes": 3,  # normal, infected, suspicious
-                "confidence_threshold": 0.7,
-                "class_names": ["Normal", "Malaria_Infected", "Suspicious"],
-                "version": "micronet_v1.1",
-            },
-            "malaria_segmentation": {
-                "encoder": "resnet50",
-                "num_classes": 3,  # background, cell, parasite
-                "confidence_threshold": 0.6,
-                "class_names": ["Background", "Blood_Cell", "Parasite"],
-                "version": "micronet_v1.1",
-            },
-            "parasite_classification": {
-                "encoder": "se_resnext50_32x4d",  # High accuracy for parasites
-                "num_classes": 4,  # normal, malaria, other_parasite, artifact
-                "confidence_threshold": 0.75,
-                "class_names": ["Normal", "Malaria", "Other_Parasite", "Artifact"],
-                "version": "micronet_v1.1",
-            },
-            "general_segmentation": {
-                "encoder": "efficientnet-b1",
-                "num_classes": 2,  # background, abnormal_region
-                "confidence_threshold": 0.5,
-                "class_names": ["Background", "Abnormal_Region"],
-                "version": "micronet_v1.1",
-            },
-        }
+        key = f"{disease_type}_{task_type}"
+        return MODEL_CONFIGS.get(key, MODEL_CONFIGS[DEFAULT_MODEL_CONFIG])
 
+    def get_model_key(self, disease_type: str, task_type: str) -> str:
+        """Get the registry key of the model serving a disease type and task.
+
+        Disease types without a dedicated configuration share the default
+        parasite model, so they resolve to a single key instead of loading
+        one copy per disease type.
+        """
         key = f"{disease_type}_{task_type}"
-        return configs.get(key, configs["parasite_classification"])
+        if key in MODEL_CONFIGS:
+            return key
+        return f"{DEFAULT_DISEASE_TYPE}_{task_type}"
+
+    def get_preload_targets(self) -> List[Tuple[str, str]]:
+        """List (disease_type, task_type) pairs covering every servable model."""
+        targets = [tuple(key.rsplit("_", 1)) for key in MODEL_CONFIGS]
+        for task_type in TASK_TYPES:
+            if (DEFAULT_DISEASE_TYPE, task_type) not in targets:
+                targets.append((DEFAULT_DISEASE_TYPE, task_type))
+        return targets
 
     def predict_classification(
-        self, model_info: Dict, image_path: str
+        self, model_info: Dict, image_path: str, timings: Dict[str, float] = None
     ) -> Dict[str, Any]:
         """Run classification inference on microscopy image."""
         try:
             # Load and preprocess image
-            image = Image.open(image_path).convert("RGB")
-            input_tensor = self.transform(image).unsqueeze(0).to(self.device)
+            input_tensor, _ = self.preprocessor.load(image_path, timings)
 
             # Run inference
-            with torch.no_grad():
-                outputs = model_info["model"](input_tensor)
-                probabilities = torch.nn.functional.softmax(outputs, dim=1)
-                confidence, predicted = torch.max(probabilities, 1)
+            with time_stage(timings, "forward"):
+                outputs = self.run_model(model_info, input_tensor)
 
-            config = model_info["config"]
-            class_names = config.get(
-                "class_names", [f"Class_{i}" for i in range(config["num_classes"])]
-            )
+            with time_stage(timings, "postprocess"):
+                with torch.no_grad():
+                    probabilities = torch.nn.functional.softmax(outputs, dim=1)
+                    confidence, predicted = torch.max(probabilities, 1)
 
-            predicted_class = class_names[predicted.item()]
-            confidence_score = confidence.item()
+                config = model_info["config"]
+                class_names = config.get(
+                    "class_names", [f"Class_{i}" for i in range(config["num_classes"])]
+                )
 
-            # Get all class probabilities
-            all_probs = probabilities[0].cpu().numpy()
-            class_probabilities = {
-                class_names[i]: float(all_probs[i]) for i in range(len(class_names))
-            }
+                predicted_class = class_names[predicted.item()]
+                confidence_score = confidence.item()
+
+                # Get all class probabilities
+                all_probs = probabilities[0].cpu().numpy()
+                class_probabilities = {
+                    class_names[i]: float(all_probs[i]) for i in range(len(class_names))
+                }
 
             return {
                 "prediction": predicted_class,
@@ -266,35 +869,49 @@ class MicroscopyModelManager:
             logger.error(f"Classification prediction failed: {e}")
             raise
 
-    def predict_segmentation(self, model_info: Dict, image_path: str) -> Dict[str, Any]:
+    def predict_segmentation(
+        self, model_info: Dict, image_path: str, timings: Dict[str, float] = None
+    ) -> Dict[str, Any]:
         """Run segmentation inference on microscopy image."""
         try:
-            # Load and preprocess image
-            image = cv2.imread(image_path)
-            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            # Load image
+            with time_stage(timings, "decode"):
+                image_rgb = self.preprocessor.decode(image_path)
             original_size = image_rgb.shape[:2]
 
-            # Resize for model
-            image_resized = cv2.resize(image_rgb, (224, 224))
-            image_pil = Image.fromarray(image_resized)
-            input_tensor = self.transform(image_pil).unsqueeze(0).to(self.device)
+            if getattr(settings, "AI_SEGMENTATION_MODE", "resize") == "tiled":
+                # Tiles are normalised as they are cut, inside the forward stage
+                with time_stage(timings, "forward"):
+                    predicted_mask = self.segment_tiled(model_info, image_rgb)
+                with time_stage(timings, "postprocess"):
+                    return self.analyze_segmentation_mask(
+                        predicted_mask, model_info["config"]
+                    )
+
+            # Resize and normalise for model
+            input_tensor = self.preprocessor.to_tensor(image_rgb, timings)
 
             # Run inference
-            with torch.no_grad():
-                outputs = model_info["model"](input_tensor)
-                predicted_mask = torch.argmax(outputs, dim=1).squeeze(0).cpu().numpy()
-
-            # Resize mask back to original size
-            predicted_mask = cv2.resize(
-                predicted_mask.astype(np.uint8),
-                (original_size[1], original_size[0]),
-                interpolation=cv2.INTER_NEAREST,
-            )
+            with time_stage(timings, "forward"):
+                outputs = self.run_model(model_info, input_tensor)
 
-            # Analyze segmentation results
-            analysis = self.analyze_segmentation_mask(
-                predicted_mask, model_info["config"]
-            )
+            with time_stage(timings, "postprocess"):
+                with torch.no_grad():
+                    predicted_mask = (
+                        torch.argmax(outputs, dim=1).squeeze(0).cpu().numpy()
+                    )
+
+                # Resize mask back to original size
+                predicted_mask = cv2.resize(
+                    predicted_mask.astype(np.uint8),
+                    (original_size[1], original_size[0]),
+                    interpolation=cv2.INTER_NEAREST,
+                )
+
+                # Analyze segmentation results
+                analysis = self.analyze_segmentation_mask(
+                    predicted_mask, model_info["config"]
+                )
 
             return analysis
 
@@ -302,6 +919,82 @@ class MicroscopyModelManager:
             logger.error(f"Segmentation prediction failed: {e}")
             raise
 
+    def normalize_image(self, image: np.ndarray) -> np.ndarray:
+        """Scale an RGB uint8 image to the normalised float32 model input."""
+        image = image.astype(np.float32) / 255.0
+        image -= IMAGENET_MEAN
+        image /= IMAGENET_STD
+        return image
+
+    def segment_tiled(self, model_info: Dict, image_rgb: np.ndarray) -> np.ndarray:
+        """
+        Segment an image at native resolution with overlapping tiles, using
+        the overlap-tile routine of pretrained_microscopy_models. Only model
+        activations are bounded by the tile batch size: by default the whole
+        image is normalised and its class scores stitched in memory, 3 +
+        num_classes floats per pixel. AI_TILE_STREAMING keeps just one row of
+        tiles of both, plus the uint8 class ids of the image. Like the resize
+        path, each pixel gets the class of highest probability.
+        """
+        model = model_info["model"]
+        if model_info.get("outputs_probabilities"):
+            predict_probabilities = model
+        else:
+
+            def predict_probabilities(tiles: torch.Tensor) -> torch.Tensor:
+                # Per-class probabilities make blended tile overlaps average
+                # probabilities, not logits
+                return torch.softmax(model(tiles), dim=1)
+
+        return pmm.segmentation_training.segmentation_models_inference(
+            image_rgb,
+            predict_probabilities,
+            self.normalize_image,
+            device=self.device,
+            batch_size=getattr(settings, "AI_TILE_BATCH_SIZE", 8),
+            patch_size=getattr(settings, "AI_TILE_SIZE", 512),
+            stride_size=getattr(settings, "AI_TILE_STRIDE", 256),
+            num_classes=model_info["config"]["num_classes"],
+            streaming=getattr(settings, "AI_TILE_STREAMING", False),
+            window=getattr(settings, "AI_TILE_WINDOW", "cosine"),
+            return_class_ids=True,
+        )
+
+    def find_detection_regions(
+        self, binary_mask: np.ndarray, min_area: float = 100
+    ) -> List[List[int]]:
+        """
+        Bounding boxes [x1, y1, x2, y2] of the outer contours of a binary mask
+        enclosing more than min_area, with areas and boxes computed for all
+        contours at once instead of one OpenCV call per contour.
+        """
+        contours, _ = cv2.findContours(
+            binary_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+        )
+        if not contours:
+            return []
+
+        lengths = np.fromiter((len(c) for c in contours), np.intp, len(contours))
+        points = np.concatenate(contours).reshape(-1, 2).astype(np.int64)
+        x, y = points[:, 0], points[:, 1]
+        ends = np.cumsum(lengths)
+        starts = ends - lengths
+
+        # Shoelace formula, closing each contour back onto its first point.
+        # Integer coordinates keep it exactly equal to cv2.contourArea.
+        following = np.arange(1, len(points) + 1)
+        following[ends - 1] = starts
+        cross = x * y[following] - x[following] * y
+        areas = np.abs(np.add.reduceat(cross, starts)) / 2
+
+        keep = areas > min_area
+        x1 = np.minimum.reduceat(x, starts)[keep]
+        y1 = np.minimum.reduceat(y, starts)[keep]
+        x2 = np.maximum.reduceat(x, starts)[keep] + 1
+        y2 = np.maximum.reduceat(y, starts)[keep] + 1
+
+        return np.stack([x1, y1, x2, y2], axis=1).tolist()
+
     def analyze_segmentation_mask(
         self, mask: np.ndarray, config: Dict
     ) -> Dict[str, Any]:
@@ -311,31 +1004,27 @@ class MicroscopyModelManager:
                 "class_names", [f"Class_{i}" for i in range(config["num_classes"])]
             )
 
-            # Count pixels for each class
-            unique_classes, counts = np.unique(mask, return_counts=True)
+            # Count pixels for every class in one pass over the mask; each
+            # (mask == class_id) allocates a full-size array, so one is only
+            # built for the contour pass of classes present in the mask
             total_pixels = mask.size
+            counts = np.bincount(mask.ravel(), minlength=len(class_names))
 
             class_percentages = {}
             detection_regions = []
 
-            for class_id, count in zip(unique_classes, counts):
-                if class_id < len(class_names):
-                    class_name = class_names[class_id]
-                    percentage = (count / total_pixels) * 100
-                    class_percentages[class_name] = round(percentage, 2)
-
-                    # Find bounding boxes for non-background classes
-                    if class_id > 0:  # Skip background
-                        contours, _ = cv2.findContours(
-                            (mask == class_id).astype(np.uint8),
-                            cv2.RETR_EXTERNAL,
-                            cv2.CHAIN_APPROX_SIMPLE,
-                        )
-
-                        for contour in contours:
-                            if cv2.contourArea(contour) > 100:  # Filter small regions
-                                x, y, w, h = cv2.boundingRect(contour)
-                                detection_regions.append([x, y, x + w, y + h])
+            for class_id, class_name in enumerate(class_names):
+                count = counts[class_id]
+                if count == 0:
+                    continue
+
+                percentage = (count / total_pixels) * 100
+                class_percentages[class_name] = round(float(percentage), 2)
+
+                # Find bounding boxes for non-background classes
+                if class_id > 0:  # Skip background
+                    class_mask = (mask == class_id).view(np.uint8)
+                    detection_regions.extend(self.find_detection_regions(class_mask))
 
             # Determine overall prediction
             max_abnormal_class = None
@@ -382,22 +1071,28 @@ class MicroscopyModelManager:
             start_time = time.time()
 
             # Load model
-            model_info = self.load_model(disease_type, task_type)
+            timings = {}
+            with time_stage(timings, "load"):
+                model_info = self.load_model(disease_type, task_type)
 
             # Run appropriate prediction
             if task_type == "classification":
-                results = self.predict_classification(model_info, image_path)
+                results = self.predict_classification(model_info, image_path, timings)
             else:
-                results = self.predict_segmentation(model_info, image_path)
+                results = self.predict_segmentation(model_info, image_path, timings)
 
             # Add metadata
             processing_time = time.time() - start_time
+            observe_stage_timings(timings)
             results.update(
                 {
                     "processing_time": round(processing_time, 3),
-                    "model_version": model_info["config"]["version"],
+                    "model_version": model_info["model_version"],
                     "encoder": model_info["config"]["encoder"],
                     "framework": "NASA_MicroNet",
+                    "stage_timings": {
+                        stage: round(seconds, 4) for stage, seconds in timings.items()
+                    },
                 }
             )
 
@@ -424,3 +1119,52 @@ def predict_image(
 ) -> Dict[str, Any]:
     """Main prediction function for external use."""
     return microscopy_model_manager.predict_image(disease_type, image_path, task_type)
+
+
+def get_model_identity(disease_type: str, task_type: str) -> Tuple[str, str]:
+    """Model key and version that would serve a request, without loading it."""
+    manager = microscopy_model_manager
+    config = manager.get_model_config(disease_type, task_type)
+    model_key = manager.get_model_key(disease_type, task_type)
+    quantization = manager.get_quantization_mode(model_key, config, task_type)
+    return model_key, manager.get_model_version(config, quantization, task_type)
+
+
+def summarize_prediction(results: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Class, severity and positivity of a prediction, in the form consumed by
+    DiagnosticSession.add_result_aggregates.
+    """
+    prediction = results.get("prediction", "Unknown")
+    # Segmentation predictions read "<class> Detected"
+    class_name = prediction.removesuffix(" Detected")
+    severity = CLASS_SEVERITY.get(class_name, 0)
+    return {
+        "confidence": results.get("confidence", 0.0),
+        "class_name": class_name,
+        "severity": severity,
+        "positive": severity >= POSITIVE_SEVERITY,
+        "failed": "error" in results,
+    }
+
+
+def get_batching_stats() -> Dict[str, Any]:
+    """Batch size and latency histograms of the global model manager."""
+    if microscopy_model_manager.batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **microscopy_model_manager.batcher.get_stats()}
+
+
+def get_model_registry_stats() -> Dict[str, Any]:
+    """Memory budget, residency and evictions of the global model manager."""
+    return microscopy_model_manager.models.get_stats()
+
+
+def preload_models() -> Dict[str, Dict[str, float]]:
+    """Warm up all configured models in the global model manager."""
+    return microscopy_model_manager.preload_models()
+
+
+def share_models_before_fork() -> Dict[str, Dict[str, float]]:
+    """Load the global model manager's models for forked workers to share."""
+    return microscopy_model_manager.prepare_for_fork()
@@ -0,0 +1,265 @@
+# ==============================================================================
+# async_mobile_views.py - Async Mobile API Views for NASA MicroNet (ASGI)
+# ==============================================================================
+#
+# Async versions of the mobile upload, create-session and result endpoints.
+# Served through the ASGI application (e.g. `uvicorn pathfinder.asgi:application`),
+# the request body of a slow mobile upload is received by the event loop
+# before the view runs, instead of holding a WSGI worker for the whole
+# transfer. Database access uses the async ORM; multipart parsing, image
+# decoding, file writes and task dispatch run in worker threads so they never
+# block the loop.
+
+import asyncio
+import json
+import logging
+
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET, require_POST
+
+from . import response_cache, result_push
+from .models import AIAnalysisResult, DiagnosticSession, MicroscopyImage, Patient
+from .tasks import process_microscopy_image_micronet
+from .uploads import get_rejected_uploads, prepare_image_upload
+
+logger = logging.getLogger(__name__)
+
+
+def error_response(message: str, status: int) -> JsonResponse:
+    return JsonResponse({"error": message}, status=status)
+
+
+async def get_user(request):
+    """The session's user when authenticated, else None (IsAuthenticated)."""
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+
+def not_authenticated() -> JsonResponse:
+    # Same status and body as DRF's IsAuthenticated on the sync views
+    return JsonResponse(
+        {"detail": "Authentication credentials were not provided."}, status=403
+    )
+
+
+async def parse_request_data(request):
+    """
+    Form or JSON fields and uploaded files of a request. Multipart bodies are
+    parsed in a thread, as the upload handlers hash and write each file.
+    """
+    if request.content_type == "application/json":
+        return json.loads(request.body or b"{}"), {}
+
+    def parse():
+        return request.POST, request.FILES
+
+    return await asyncio.to_thread(parse)
+
+
+def save_image_files(image: MicroscopyImage, files) -> None:
+    """Write the files of an unsaved image to storage under their upload_to."""
+    for field_name, content in files.items():
+        getattr(image, field_name).save(content.name, content, save=False)
+
+
+@require_POST
+async def async_upload_image_micronet(request):
+    """Upload microscopy image and trigger MicroNet AI processing."""
+    user = await get_user(request)
+    if user is None:
+        return not_authenticated()
+
+    try:
+        data, files = await parse_request_data(request)
+        session_id = data.get("session_id")
+        task_type = data.get("task_type", "classification")
+
+        if not session_id:
+            return error_response("session_id is required", 400)
+
+        if task_type not in ["classification", "segmentation"]:
+            return error_response(
+                'task_type must be "classification" or "segmentation"', 400
+            )
+
+        try:
+            session = await DiagnosticSession.objects.filter(pk=session_id).afirst()
+        except ValidationError:
+            session = None
+        if session is None:
+            return error_response("Session not found", 404)
+
+        if "image" not in files:
+            if get_rejected_uploads(request):
+                return error_response("Image file is too large", 413)
+            return error_response("No image file provided", 400)
+
+        # Validate image file
+        image_file = files["image"]
+        if not image_file.content_type.startswith("image/"):
+            return error_response("Invalid file type. Please upload an image.", 400)
+
+        try:
+            upload_metadata, inference_image, thumbnail = await asyncio.to_thread(
+                prepare_image_upload, image_file
+            )
+        except ValueError:
+            return error_response(
+                "Could not read the image. Please upload a valid image.", 400
+            )
+
+        image = MicroscopyImage(
+            session=session,
+            uploaded_by_name=user.get_username(),
+            image_metadata={
+                "uploaded_via": "mobile_app_micronet_async",
+                "task_type": task_type,
+                "camera_settings": data.get("camera_settings", {}),
+                "file_size": image_file.size,
+                "content_type": image_file.content_type,
+                **upload_metadata,
+            },
+        )
+        # Files are written first, off the loop; saving the row then finds
+        # them already committed
+        await asyncio.to_thread(
+            save_image_files,
+            image,
+            {
+                "image": image_file,
+                "inference_image": inference_image,
+                "thumbnail": thumbnail,
+            },
+        )
+        await image.asave()
+
+        logger.info(f"Image {image.id} uploaded for MicroNet {task_type} (async)")
+
+        # Trigger async MicroNet processing; publishing talks to the broker
+        task = await asyncio.to_thread(
+            process_microscopy_image_micronet.delay, str(image.id), task_type
+        )
+
+        return JsonResponse(
+            {
+                "success": True,
+                "image_id": str(image.id),
+                "task_id": task.id,
+                "task_type": task_type,
+                "message": f"Image uploaded successfully, MicroNet {task_type} processing started",
+                "estimated_processing_time": "15-45 seconds",
+            },
+            status=201,
+        )
+
+    except Exception as e:
+        logger.error(f"Failed to upload image for MicroNet: {e}")
+        return error_response("Failed to process upload", 500)
+
+
+@require_GET
+async def async_check_micronet_result(request, image_id):
+    """Check MicroNet processing status and results."""
+    user = await get_user(request)
+    if user is None:
+        return not_authenticated()
+
+    try:
+
+        async def build():
+            # Only finished analyses are cached, as they no longer change
+            result = await AIAnalysisResult.objects.filter(image_id=image_id).afirst()
+            if result is None:
+                return None
+            data = {
+                "status": "completed",
+                "result": result_push.serialize_result(result),
+            }
+            return data, True, result.updated_at
+
+        entry = await response_cache.aget_or_build(
+            response_cache.get_image_key(image_id), build
+        )
+        if entry is not None:
+            return response_cache.respond(request, entry, response_class=JsonResponse)
+
+        image = (
+            await MicroscopyImage.objects.select_related("session")
+            .filter(pk=image_id)
+            .afirst()
+        )
+        if image is None:
+            return error_response("Image not found", 404)
+
+        # Check if processing failed
+        if image.session.status == "failed":
+            return JsonResponse(
+                {
+                    "status": "failed",
+                    "message": "MicroNet processing failed. Please try uploading again.",
+                }
+            )
+        return JsonResponse(
+            {
+                "status": "processing",
+                "message": "MicroNet analysis is still in progress",
+            }
+        )
+
+    except Exception as e:
+        logger.error(f"Failed to check MicroNet result for image {image_id}: {e}")
+        return error_response("Failed to retrieve result", 500)
+
+
+@require_POST
+async def async_create_diagnostic_session(request):
+    """Create a new diagnostic session."""
+    user = await get_user(request)
+    if user is None:
+        return not_authenticated()
+
+    try:
+        data, _ = await parse_request_data(request)
+        patient_id = data.get("patient_id")
+        disease_type = data.get("disease_type", "malaria")
+
+        if not patient_id:
+            return error_response("patient_id is required", 400)
+
+        # Create or get patient
+        patient = await Patient.objects.filter(patient_id=patient_id).afirst()
+        if patient is None:
+            # Patients belong to a facility, so a new one needs it
+            facility_id = data.get("facility_id")
+            if not facility_id:
+                return error_response("facility_id is required for a new patient", 400)
+            patient = await Patient.objects.acreate(
+                patient_id=patient_id,
+                age=data.get("age", 0),
+                gender=data.get("gender", "unknown"),
+                facility_id=facility_id,
+            )
+
+        # Create diagnostic session
+        session = await DiagnosticSession.objects.acreate(
+            patient=patient,
+            technician_name=user.get_username(),
+            disease_type=disease_type,
+            status="active",
+        )
+
+        return JsonResponse(
+            {
+                "success": True,
+                "session_id": str(session.id),
+                "patient_id": patient_id,
+                "disease_type": disease_type,
+                "status": "active",
+            },
+            status=201,
+        )
+
+    except Exception as e:
+        logger.error(f"Failed to create session: {e}")
+        return error_response("Failed to create diagnostic session", 500)
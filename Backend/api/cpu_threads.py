@@ -0,0 +1,127 @@
+# ==============================================================================
+# cpu_threads.py - Torch Thread Pools and CPU Affinity per Worker Process
+# ==============================================================================
+#
+# Every PyTorch process sizes its intra-op pool to all the cores of the
+# machine, so N prefork workers running inference at once start N times more
+# threads than there are cores and spend their time contending for them.
+# Each worker instead gets an equal share of the CPUs it may run on and,
+# optionally, is pinned to its own slice of them.
+
+import logging
+import os
+from typing import Dict, List, Optional
+
+import torch
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Process count of the pool about to fork, recorded by the parent
+_pool_size = {"processes": None}
+
+
+def get_available_cpus() -> List[int]:
+    """
+    CPUs this process may be scheduled on: its affinity mask (taskset,
+    cpusets), capped by a cgroup CPU quota (container --cpus limits).
+    """
+    if hasattr(os, "sched_getaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = list(range(os.cpu_count() or 1))
+
+    quota = get_cgroup_cpu_quota()
+    if quota is not None and quota < len(cpus):
+        cpus = cpus[: max(1, int(quota))]
+    return cpus
+
+
+def get_cgroup_cpu_quota() -> Optional[float]:
+    """CPUs granted by the cgroup CPU bandwidth limit, None if unlimited."""
+    try:
+        # cgroup v2
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota == "max":
+            return None
+        return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+
+    try:
+        # cgroup v1
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        return quota / period if quota > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def set_pool_size(processes: int) -> None:
+    """Record how many worker processes will share the CPUs (before fork)."""
+    _pool_size["processes"] = processes
+
+
+def plan_worker_threads(
+    worker_index: int,
+    worker_count: int,
+    cpus: List[int],
+    threads: Optional[int] = None,
+) -> Dict[str, object]:
+    """
+    Intra-op threads and CPU slice of one of worker_count processes sharing
+    cpus. threads defaults to an equal share of the CPUs, at least one; an
+    explicit count is kept as is. With more workers than CPUs the slices
+    wrap around.
+    """
+    worker_count = max(1, worker_count)
+    if not threads:
+        threads = max(1, len(cpus) // worker_count)
+
+    width = min(threads, len(cpus))
+    start = (worker_index * width) % len(cpus)
+    cpu_slice = [cpus[(start + i) % len(cpus)] for i in range(width)]
+    return {"threads": threads, "cpus": cpu_slice}
+
+
+def configure_worker_threads(
+    worker_index: int = 0, worker_count: Optional[int] = None
+) -> Dict[str, object]:
+    """
+    Size the torch thread pools of this worker process, and pin it to its
+    CPU slice when AI_CPU_AFFINITY is set. Run it before the first forward
+    pass: the inter-op pool can only be sized before it starts.
+    """
+    if worker_count is None:
+        worker_count = _pool_size["processes"] or 1
+    cpus = get_available_cpus()
+    plan = plan_worker_threads(
+        worker_index,
+        worker_count,
+        cpus,
+        threads=getattr(settings, "AI_TORCH_THREADS", 0),
+    )
+
+    torch.set_num_threads(plan["threads"])
+    interop_threads = getattr(settings, "AI_TORCH_INTEROP_THREADS", 1)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            # Only settable once, before any inter-op work has started
+            logger.warning(f"Could not set inter-op threads: {e}")
+
+    pinned = False
+    if getattr(settings, "AI_CPU_AFFINITY", False) and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, plan["cpus"])
+        pinned = True
+
+    logger.info(
+        f"Worker {worker_index + 1}/{worker_count}: {plan['threads']} torch "
+        f"threads of {len(cpus)} CPUs"
+        + (f", pinned to CPUs {plan['cpus']}" if pinned else "")
+    )
+    return {**plan, "pinned": pinned, "available_cpus": len(cpus)}
@@ -0,0 +1,141 @@
+# ==============================================================================
+# inference_client.py - Client of the MicroNet Inference Server
+# ==============================================================================
+#
+# Celery tasks run predictions through this module. With
+# AI_INFERENCE_SERVER_SOCKET set they are sent to the inference server
+# (api.inference_server) and the task process never loads a model;
+# otherwise they run in-process as before.
+
+import json
+import logging
+import os
+import socket
+import threading
+from typing import Any, Dict, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceServerError(Exception):
+    """The inference server could not be reached or rejected the request."""
+
+
+class InferenceClient:
+    """
+    Client keeping one persistent connection per thread and process, so
+    concurrent tasks of a threads pool do not interleave on a socket and
+    forked workers do not share their parent's connection.
+    """
+
+    def __init__(self, socket_path: str, timeout: float = 300.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def call(self, op: str, **params) -> Any:
+        """Send one request and return its result."""
+        payload = json.dumps({"op": op, **params}).encode() + b"\n"
+
+        # A kept-alive connection may have been closed by a server restart;
+        # requests are idempotent, so resend once on a fresh connection
+        for attempt in range(2):
+            connection = self._get_connection()
+            try:
+                connection["socket"].sendall(payload)
+                line = connection["reader"].readline()
+                if not line:
+                    raise ConnectionResetError("inference server closed the connection")
+                break
+            except OSError as e:
+                self.close()
+                if attempt or isinstance(e, socket.timeout):
+                    raise InferenceServerError(
+                        f"Inference server at {self.socket_path} failed: {e}"
+                    ) from e
+
+        response = json.loads(line)
+        if not response["ok"]:
+            raise InferenceServerError(response["error"])
+        return response["result"]
+
+    def close(self) -> None:
+        connection = getattr(self._local, "connection", None)
+        self._local.connection = None
+        if connection is not None:
+            connection["reader"].close()
+            connection["socket"].close()
+
+    def _get_connection(self) -> Dict[str, Any]:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and connection["pid"] == os.getpid():
+            return connection
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError as e:
+            sock.close()
+            raise InferenceServerError(
+                f"Inference server at {self.socket_path} is unreachable: {e}"
+            ) from e
+
+        connection = {
+            "pid": os.getpid(),
+            "socket": sock,
+            "reader": sock.makefile("rb"),
+        }
+        self._local.connection = connection
+        return connection
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def is_enabled() -> bool:
+    return bool(getattr(settings, "AI_INFERENCE_SERVER_SOCKET", ""))
+
+
+def get_client() -> InferenceClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = InferenceClient(
+                settings.AI_INFERENCE_SERVER_SOCKET,
+                timeout=getattr(settings, "AI_INFERENCE_SERVER_TIMEOUT", 300.0),
+            )
+        return _client
+
+
+def predict_image(
+    disease_type: str, image_path: str, task_type: str = "classification"
+) -> Dict[str, Any]:
+    """Run a prediction on the inference server, or in-process without one."""
+    if not is_enabled():
+        from .ai_inference import predict_image
+
+        return predict_image(disease_type, image_path, task_type)
+
+    return get_client().call(
+        "predict",
+        disease_type=disease_type,
+        image_path=os.path.abspath(image_path),
+        task_type=task_type,
+    )
+
+
+def get_model_identity(disease_type: str, task_type: str) -> Tuple[str, str]:
+    """Model key and version that would serve a request, as the server sees it."""
+    if not is_enabled():
+        from .ai_inference import get_model_identity
+
+        return get_model_identity(disease_type, task_type)
+
+    model_key, model_version = get_client().call(
+        "identity", disease_type=disease_type, task_type=task_type
+    )
+    return model_key, model_version
@@ -0,0 +1,171 @@
+# ==============================================================================
+# inference_server.py - Long-Lived MicroNet Inference Server on a Unix Socket
+# ==============================================================================
+#
+# One process owns the MicroscopyModelManager: it loads the models once,
+# batches the forward passes of concurrent requests and sizes its own torch
+# thread pools, independently of the Celery workers that call it through
+# api.inference_client. Run it with `python manage.py run_inference_server`.
+#
+# Protocol: newline-delimited JSON over a stream socket, one request and one
+# response per line on a persistent connection.
+#
+#   {"op": "predict", "disease_type": ..., "image_path": ..., "task_type": ...}
+#   {"op": "identity", "disease_type": ..., "task_type": ...}
+#   {"op": "stats"}
+#   {"op": "ping"}
+#
+# Responses are {"ok": true, "result": ...} or {"ok": false, "error": ...}.
+
+import json
+import logging
+import os
+import socketserver
+import stat
+import threading
+import time
+from typing import Any, Dict
+
+import torch
+from django.conf import settings
+
+from . import ai_inference
+from .cpu_threads import get_available_cpus
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceRequestHandler(socketserver.StreamRequestHandler):
+    """Serves the requests of one client connection until it closes."""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                response = {"ok": True, "result": self.server.dispatch(request)}
+            except Exception as e:
+                logger.error(f"Inference server request failed: {e}")
+                response = {"ok": False, "error": str(e)}
+
+            try:
+                self.wfile.write(json.dumps(response).encode() + b"\n")
+            except OSError:
+                # The client went away while its request was running
+                return
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix socket server with a thread per client connection. Connections run
+    their preprocessing in parallel and meet in the manager's batcher, which
+    stacks their forward passes per model.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, manager=None):
+        self.manager = manager or ai_inference.microscopy_model_manager
+        if self.manager.batcher is None:
+            self.manager.batcher = ai_inference.InferenceBatcher(
+                self.manager.device,
+                max_batch_size=getattr(settings, "AI_BATCH_MAX_SIZE", 8),
+                max_wait_time=getattr(settings, "AI_BATCH_MAX_WAIT", 0.01),
+            )
+        self.started_at = time.time()
+        self.requests = 0
+        self.failures = 0
+        self._stats_lock = threading.Lock()
+
+        remove_stale_socket(socket_path)
+        super().__init__(socket_path, InferenceRequestHandler)
+        # Only the owner and its group (the Celery workers) may connect
+        os.chmod(socket_path, 0o660)
+
+    def dispatch(self, request: Dict[str, Any]) -> Any:
+        op = request.get("op")
+        if op == "predict":
+            result = self.manager.predict_image(
+                request["disease_type"],
+                request["image_path"],
+                request.get("task_type", "classification"),
+            )
+            with self._stats_lock:
+                self.requests += 1
+                self.failures += "error" in result
+            return result
+        if op == "identity":
+            return list(
+                ai_inference.get_model_identity(
+                    request["disease_type"], request["task_type"]
+                )
+            )
+        if op == "stats":
+            return self.get_stats()
+        if op == "ping":
+            return "pong"
+        raise ValueError(f"Unknown inference server op: {op!r}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            requests, failures = self.requests, self.failures
+        return {
+            "pid": os.getpid(),
+            "uptime": round(time.time() - self.started_at, 3),
+            "requests": requests,
+            "failures": failures,
+            "threads": torch.get_num_threads(),
+            "interop_threads": torch.get_num_interop_threads(),
+            "batching": self.manager.batcher.get_stats(),
+            "model_registry": self.manager.models.get_stats(),
+        }
+
+    def server_close(self):
+        super().server_close()
+        remove_stale_socket(self.server_address)
+
+
+def remove_stale_socket(socket_path: str) -> None:
+    """Remove the socket file left by a server that is no longer running."""
+    try:
+        mode = os.stat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f"{socket_path} exists and is not a socket")
+    os.unlink(socket_path)
+
+
+def configure_threads(threads: int = 0, interop_threads: int = 0) -> None:
+    """
+    Size the torch intra-op and inter-op thread pools of the server; 0 uses
+    every CPU the process may run on, respectively keeps the torch default.
+    Must run before the first forward pass.
+    """
+    torch.set_num_threads(threads or len(get_available_cpus()))
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            # Only settable once, before any inter-op work has started
+            logger.warning(f"Could not set inter-op threads: {e}")
+
+
+def serve(
+    socket_path: str,
+    threads: int = 0,
+    interop_threads: int = 0,
+    preload: bool = True,
+) -> None:
+    """Load the models and serve inference requests until interrupted."""
+    configure_threads(threads, interop_threads)
+    if preload:
+        load_stats = ai_inference.preload_models()
+        logger.info(f"Inference server preloaded {len(load_stats)} models")
+
+    with InferenceServer(socket_path) as server:
+        logger.info(
+            f"Inference server listening on {socket_path} "
+            f"({torch.get_num_threads()} threads, "
+            f"{torch.get_num_interop_threads()} inter-op threads)"
+        )
+        server.serve_forever()
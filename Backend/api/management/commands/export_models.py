@@ -0,0 +1,89 @@
+# ==============================================================================
+# export_models.py - Export MicroNet Models for the Optimized CPU Backends
+# ==============================================================================
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.ai_inference import microscopy_model_manager
+from api.model_export import EXPORT_SUFFIXES, export_model
+
+
+class Command(BaseCommand):
+    help = (
+        "Export every configured MicroNet model to TorchScript and/or ONNX, "
+        "check the artifacts against the eager model and report latencies."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format",
+            action="append",
+            dest="formats",
+            choices=sorted(EXPORT_SUFFIXES),
+            help="Export format (repeatable). Defaults to all formats.",
+        )
+        parser.add_argument(
+            "--model",
+            action="append",
+            dest="model_keys",
+            help="Only export this model key, e.g. malaria_segmentation.",
+        )
+        parser.add_argument(
+            "--atol",
+            type=float,
+            default=1e-3,
+            help="Maximum absolute output difference against eager PyTorch.",
+        )
+        parser.add_argument(
+            "--runs",
+            type=int,
+            default=10,
+            help="Forward passes used to compare eager and exported latency.",
+        )
+
+    def handle(self, *args, **options):
+        formats = options["formats"] or sorted(EXPORT_SUFFIXES)
+        manager = microscopy_model_manager
+
+        failed = []
+        for disease_type, task_type in manager.get_preload_targets():
+            model_key = manager.get_model_key(disease_type, task_type)
+            if options["model_keys"] and model_key not in options["model_keys"]:
+                continue
+
+            config = manager.get_model_config(disease_type, task_type)
+            model_info = {
+                "model_key": model_key,
+                "model": manager.build_eager_model(config, task_type),
+                "config": config,
+                "task_type": task_type,
+            }
+
+            for export_format in formats:
+                try:
+                    report = export_model(
+                        model_info, export_format, options["atol"], options["runs"]
+                    )
+                except Exception as e:
+                    failed.append(f"{model_key}.{export_format}")
+                    self.stdout.write(
+                        self.style.ERROR(f"{model_key} [{export_format}]: {e}")
+                    )
+                    continue
+
+                style = self.style.SUCCESS if report["equivalent"] else self.style.ERROR
+                self.stdout.write(
+                    style(
+                        f"{model_key} [{export_format}]: "
+                        f"max diff {report['max_abs_diff']:.2e}, "
+                        f"agreement {report['prediction_agreement']:.2%}, "
+                        f"eager {report['eager_latency'] * 1000:.1f}ms -> "
+                        f"{report['exported_latency'] * 1000:.1f}ms "
+                        f"({report['speedup']}x)"
+                    )
+                )
+                if not report["equivalent"]:
+                    failed.append(f"{model_key}.{export_format}")
+
+        if failed:
+            raise CommandError(f"Exports failed or not equivalent: {', '.join(failed)}")
@@ -0,0 +1,123 @@
+# ==============================================================================
+# populate_weight_store.py - Download Pretrained Weights into the Local Store
+# ==============================================================================
+
+import torch
+import torchvision
+import torch.utils.model_zoo as model_zoo
+import pretrained_microscopy_models as pmm
+from django.core.management.base import BaseCommand, CommandError
+
+from api.ai_inference import MODEL_CONFIGS
+from api.weight_store import get_weight_store
+
+# Backbones used by the loader fallbacks in addition to the configured ones
+FALLBACK_ENCODERS = ["resnet18"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Download every pretrained weight file the MicroNet loaders need into "
+        "the local weight store, so workers can start without network access."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--encoder",
+            action="append",
+            dest="encoders",
+            help="Only fetch weights for this encoder (repeatable).",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Fetch weights again even if they are already stored.",
+        )
+        parser.add_argument(
+            "--import",
+            nargs=2,
+            metavar=("NAME", "PATH"),
+            dest="import_file",
+            help="Store a state dict file copied in by hand, e.g. "
+            "--import micronet/resnet50 resnet50_microscopynet_v1.1.pth.tar",
+        )
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only recompute and check the checksum of every stored object.",
+        )
+
+    def handle(self, *args, **options):
+        store = get_weight_store()
+
+        if options["verify"]:
+            self.verify(store)
+            return
+
+        if options["import_file"]:
+            name, path = options["import_file"]
+            state_dict = torch.load(path, map_location="cpu", weights_only=True)
+            sha256 = store.add_state_dict(name, state_dict, source=path)
+            self.stdout.write(self.style.SUCCESS(f"Imported {name} ({sha256})"))
+            return
+
+        encoders = options["encoders"] or sorted(
+            {config["encoder"] for config in MODEL_CONFIGS.values()}
+            | set(FALLBACK_ENCODERS)
+        )
+
+        failures = 0
+        for name, source, fetch in self.get_weight_sources(encoders):
+            if store.has(name) and not options["force"]:
+                self.stdout.write(f"{name}: already stored")
+                continue
+            try:
+                sha256 = store.add_state_dict(name, fetch(), source=source)
+                self.stdout.write(self.style.SUCCESS(f"{name}: stored {sha256}"))
+            except Exception as e:
+                failures += 1
+                self.stdout.write(self.style.WARNING(f"{name}: not available ({e})"))
+
+        self.stdout.write(f"Weight store: {store.root} ({failures} unavailable)")
+
+    def get_weight_sources(self, encoders):
+        """Yield (name, source, fetch) for each weight file an encoder may use."""
+        import segmentation_models_pytorch as smp
+
+        torchvision_models = set(torchvision.models.list_models())
+
+        for encoder in encoders:
+            try:
+                url = pmm.util.get_pretrained_microscopynet_url(encoder, "micronet")
+                yield (
+                    f"micronet/{encoder}",
+                    url,
+                    lambda url=url: model_zoo.load_url(url, map_location="cpu"),
+                )
+            except ValueError:
+                pass
+
+            if encoder in torchvision_models:
+                yield (
+                    f"torchvision-imagenet/{encoder}",
+                    f"torchvision:{encoder}:IMAGENET1K_V1",
+                    lambda encoder=encoder: torchvision.models.get_model_weights(
+                        encoder
+                    )["IMAGENET1K_V1"].get_state_dict(progress=False),
+                )
+
+            yield (
+                f"smp-imagenet/{encoder}",
+                f"segmentation_models_pytorch:{encoder}:imagenet",
+                lambda encoder=encoder: smp.encoders.get_encoder(
+                    encoder, weights="imagenet"
+                ).state_dict(),
+            )
+
+    def verify(self, store):
+        results = store.verify()
+        for name, ok in sorted(results.items()):
+            status = self.style.SUCCESS("ok") if ok else self.style.ERROR("CORRUPT")
+            self.stdout.write(f"{name}: {status}")
+        if not all(results.values()):
+            raise CommandError("Weight store verification failed")
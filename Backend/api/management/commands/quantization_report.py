@@ -0,0 +1,103 @@
+# ==============================================================================
+# quantization_report.py - Accuracy Delta of INT8 vs Float MicroNet Models
+# ==============================================================================
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.ai_inference import microscopy_model_manager
+from api.quantization import (
+    QUANTIZATION_MODES,
+    accuracy_delta_report,
+    load_calibration_inputs,
+    quantize_model,
+    supports_quantization,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Quantize the configured models to INT8 and report prediction agreement, "
+        "probability drift, latency and size against the float models, using "
+        "stored microscopy images for calibration and evaluation."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--mode",
+            choices=QUANTIZATION_MODES,
+            default="static",
+            help="Quantization mode to evaluate.",
+        )
+        parser.add_argument(
+            "--model",
+            action="append",
+            dest="model_keys",
+            help="Only evaluate this model key (repeatable).",
+        )
+        parser.add_argument(
+            "--calibration-size",
+            type=int,
+            default=32,
+            help="Stored images used to calibrate static quantization.",
+        )
+        parser.add_argument(
+            "--eval-size",
+            type=int,
+            default=64,
+            help="Stored images, disjoint from calibration, used for the report.",
+        )
+        parser.add_argument("--output", help="Also write the report as JSON here.")
+
+    def handle(self, *args, **options):
+        manager = microscopy_model_manager
+        calibration_size = options["calibration_size"]
+
+        images = load_calibration_inputs(
+            manager.preprocessor, calibration_size + options["eval_size"]
+        )
+        calibration_inputs = images[:calibration_size]
+        eval_inputs = images[calibration_size:]
+        if not eval_inputs:
+            raise CommandError(
+                f"Need more than {calibration_size} stored images, found {len(images)}"
+            )
+
+        reports = {}
+        for disease_type, task_type in manager.get_preload_targets():
+            model_key = manager.get_model_key(disease_type, task_type)
+            if options["model_keys"] and model_key not in options["model_keys"]:
+                continue
+            if not supports_quantization(options["mode"], task_type):
+                self.stderr.write(
+                    f"{model_key}: {options['mode']} quantization does not "
+                    f"quantize {task_type} models, skipping"
+                )
+                continue
+
+            config = manager.get_model_config(disease_type, task_type)
+            float_model = manager.build_eager_model(config, task_type).cpu().eval()
+            quantized_model = quantize_model(
+                float_model, options["mode"], calibration_inputs, task_type
+            )
+
+            report = accuracy_delta_report(
+                float_model, quantized_model, eval_inputs, task_type
+            )
+            report["mode"] = options["mode"]
+            reports[model_key] = report
+
+            self.stdout.write(
+                f"{model_key} [{options['mode']}]: "
+                f"agreement {report['prediction_agreement']:.2%}, "
+                f"mean prob delta {report['mean_probability_delta']:.4f}, "
+                f"{report['float_latency'] * 1000:.1f}ms -> "
+                f"{report['quantized_latency'] * 1000:.1f}ms "
+                f"({report['speedup']}x), "
+                f"{report['float_size_mb']}MB -> {report['quantized_size_mb']}MB"
+            )
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(reports, f, indent=2)
@@ -0,0 +1,65 @@
+# ==============================================================================
+# rebuild_session_aggregates.py - Recompute Session Aggregates from Results
+# ==============================================================================
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api import response_cache
+from api.ai_inference import summarize_prediction
+from api.models import AIAnalysisResult, DiagnosticSession
+
+# Predictions written for analyses that raised instead of producing a result
+FAILED_PREDICTIONS = ("Error", "Analysis Failed")
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the per-session aggregates (images processed, positives, "
+        "mean confidence, worst class) from the stored analysis results, e.g. "
+        "for sessions analysed before the aggregates existed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--session",
+            action="append",
+            dest="session_ids",
+            help="Only rebuild this session (repeatable).",
+        )
+
+    def handle(self, *args, **options):
+        sessions = DiagnosticSession.objects.all()
+        if options["session_ids"]:
+            sessions = sessions.filter(pk__in=options["session_ids"])
+
+        rebuilt = 0
+        for session_id in sessions.values_list("pk", flat=True).iterator():
+            with transaction.atomic():
+                session = DiagnosticSession.objects.select_for_update().get(
+                    pk=session_id
+                )
+                summaries = []
+                for prediction, confidence in AIAnalysisResult.objects.filter(
+                    image__session=session
+                ).values_list("prediction", "confidence_score"):
+                    results = {"prediction": prediction, "confidence": confidence}
+                    if prediction in FAILED_PREDICTIONS:
+                        results["error"] = prediction
+                    summaries.append(summarize_prediction(results))
+
+                DiagnosticSession.objects.filter(pk=session.pk).update(
+                    images_processed=0,
+                    failed_count=0,
+                    positive_count=0,
+                    confidence_sum=0.0,
+                    worst_class="",
+                    worst_severity=-1,
+                )
+                session.add_result_aggregates(summaries)
+                response_cache.invalidate(session_ids=[session.pk])
+            rebuilt += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt aggregates of {rebuilt} sessions")
+        )
@@ -0,0 +1,63 @@
+# ==============================================================================
+# run_inference_server.py - Serve MicroNet Inference over a Unix Socket
+# ==============================================================================
+
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.inference_server import serve
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the long-lived inference server that owns the MicroNet models. "
+        "Celery tasks send their predictions to it when "
+        "AI_INFERENCE_SERVER_SOCKET is set."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--socket",
+            default=settings.AI_INFERENCE_SERVER_SOCKET,
+            help="Path of the Unix socket to listen on "
+            "(default: AI_INFERENCE_SERVER_SOCKET).",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=settings.AI_INFERENCE_SERVER_THREADS,
+            help="Torch intra-op threads, 0 for every available CPU.",
+        )
+        parser.add_argument(
+            "--interop-threads",
+            type=int,
+            default=settings.AI_INFERENCE_SERVER_INTEROP_THREADS,
+            help="Torch inter-op threads, 0 for the torch default.",
+        )
+        parser.add_argument(
+            "--no-preload",
+            action="store_true",
+            help="Load models on their first request instead of at start.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["socket"]:
+            raise CommandError(
+                "No socket path: pass --socket or set AI_INFERENCE_SERVER_SOCKET"
+            )
+
+        # Stop like on Ctrl+C, so the socket file is removed
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+        self.stdout.write(f"Starting inference server on {options['socket']}")
+        try:
+            serve(
+                options["socket"],
+                threads=options["threads"],
+                interop_threads=options["interop_threads"],
+                preload=not options["no_preload"],
+            )
+        except KeyboardInterrupt:
+            self.stdout.write("Inference server stopped")
@@ -0,0 +1,491 @@
+# ==============================================================================
+# metrics.py - Lightweight In-Process Metrics for AI Inference
+# ==============================================================================
+
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Default latency buckets in seconds, from 5ms up to 30s
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Stages of a single image analysis, in pipeline order
+INFERENCE_STAGES = (
+    "load",
+    "decode",
+    "preprocess",
+    "forward",
+    "postprocess",
+    "db_write",
+)
+
+STAGE_METRIC = "micronet_inference_stage_seconds"
+REGISTRY_METRIC = "micronet_model_registry"
+BATCH_SIZE_METRIC = "micronet_batch_size"
+BATCH_LATENCY_METRIC = "micronet_batch_latency_seconds"
+RESULT_CACHE_METRIC = "micronet_result_cache"
+RESULT_CACHE_COUNTERS = ("hits", "misses", "evictions")
+
+
+class Histogram:
+    """
+    Thread-safe cumulative histogram with fixed bucket upper bounds,
+    following the Prometheus histogram semantics.
+    """
+
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """Record a single observation."""
+        with self._lock:
+            self.sum += value
+            self.count += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.bucket_counts[i] += 1
+                    break
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return cumulative bucket counts, sum and count."""
+        with self._lock:
+            buckets = {}
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, self.bucket_counts):
+                cumulative += bucket_count
+                buckets[str(bound)] = cumulative
+            buckets["+Inf"] = self.count
+            return {"buckets": buckets, "sum": round(self.sum, 6), "count": self.count}
+
+
+@contextmanager
+def time_stage(timings: Optional[Dict[str, float]], stage: str):
+    """Record the wall time of the enclosed block as timings[stage]."""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[stage] = time.perf_counter() - start_time
+
+
+# Stage histograms of this process, recreated after a fork so that worker
+# processes never report observations inherited from their parent
+_stage_histograms: Dict[str, Histogram] = {}
+_model_registry_stats: Dict[str, Any] = {}
+_batching_stats: Dict[str, Any] = {}
+_result_cache_stats: Dict[str, int] = {}
+# Cumulative metrics of exited processes folded into this process's snapshot
+_inherited: Dict[str, Dict[str, Any]] = {}
+_process = {
+    "pid": None,
+    "token": None,
+    "dirty": False,
+    "exported_at": 0.0,
+    "flush_timer": None,
+}
+_process_lock = threading.Lock()
+# Threads of one process (threads pool, inference server) share its file
+_export_lock = threading.Lock()
+
+
+def get_stage_histograms() -> Dict[str, Histogram]:
+    with _process_lock:
+        if _process["pid"] != os.getpid():
+            _process["pid"] = os.getpid()
+            _process["token"] = uuid.uuid4().hex[:8]
+            _stage_histograms.clear()
+            _stage_histograms.update({stage: Histogram() for stage in INFERENCE_STAGES})
+            _model_registry_stats.clear()
+            _batching_stats.clear()
+            _result_cache_stats.clear()
+            _inherited.clear()
+            # The parent's export state and flush timer thread stay behind
+            _process.update(dirty=False, exported_at=0.0, flush_timer=None)
+    return _stage_histograms
+
+
+def observe_stage_timings(timings: Dict[str, float]) -> None:
+    """Add per-stage timings of one request to the stage histograms."""
+    histograms = get_stage_histograms()
+    for stage, seconds in timings.items():
+        if stage in histograms:
+            histograms[stage].observe(seconds)
+    export_stage_snapshot()
+
+
+def set_model_registry_stats(stats: Dict[str, Any]) -> None:
+    """Publish the model residency of this process's model registry."""
+    get_stage_histograms()
+    _model_registry_stats.clear()
+    _model_registry_stats.update(stats)
+    export_stage_snapshot()
+
+
+def set_batching_stats(stats: Dict[str, Any]) -> None:
+    """Publish the batch size and latency histograms of this process's batcher."""
+    get_stage_histograms()
+    _batching_stats.clear()
+    _batching_stats.update(stats)
+    export_stage_snapshot()
+
+
+def set_result_cache_stats(stats: Dict[str, int]) -> None:
+    """Publish the result cache counters of this process."""
+    get_stage_histograms()
+    _result_cache_stats.clear()
+    _result_cache_stats.update(stats)
+    export_stage_snapshot()
+
+
+def export_stage_snapshot() -> None:
+    """
+    Publish this process's stage histograms, model residency, batching and
+    result cache counters to AI_METRICS_DIR. Inference runs in Celery worker
+    processes while the scrape endpoint runs in the web process, so each
+    process publishes its own file and the endpoint sums them, like the
+    multiprocess mode of the Prometheus client.
+
+    Writes happen at most every AI_METRICS_EXPORT_INTERVAL seconds; changes
+    within the interval are written by a timer when it ends.
+    """
+    if not getattr(settings, "AI_METRICS_DIR", None):
+        return
+
+    get_stage_histograms()
+    interval = getattr(settings, "AI_METRICS_EXPORT_INTERVAL", 0)
+    with _export_lock:
+        _process["dirty"] = True
+        wait = _process["exported_at"] + interval - time.monotonic()
+        if wait > 0:
+            if _process["flush_timer"] is None:
+                timer = threading.Timer(wait, flush_stage_snapshot)
+                timer.daemon = True
+                _process["flush_timer"] = timer
+                timer.start()
+            return
+    flush_stage_snapshot()
+
+
+def build_process_snapshot() -> Dict[str, Any]:
+    """This process's metrics, including those inherited from exited ones."""
+    histograms = get_stage_histograms()
+    own = {
+        "stages": {
+            stage: histogram.snapshot() for stage, histogram in histograms.items()
+        },
+        "batching": dict(_batching_stats),
+        "result_cache": dict(_result_cache_stats),
+    }
+    snapshot = merge_process_snapshots(own, _inherited)
+    snapshot["model_registry"] = dict(_model_registry_stats)
+    return snapshot
+
+
+def flush_stage_snapshot() -> None:
+    """
+    Write this process's metrics file if they changed since the last write.
+    Metrics are best effort: an unwritable AI_METRICS_DIR is logged and
+    never fails the inference or request that reported them.
+    """
+    metrics_dir = getattr(settings, "AI_METRICS_DIR", None)
+    if not metrics_dir:
+        return
+
+    get_stage_histograms()
+    with _export_lock:
+        _process["flush_timer"] = None
+        if not _process["dirty"]:
+            return
+        _process["exported_at"] = time.monotonic()
+
+        path = os.path.join(metrics_dir, f"{os.getpid()}-{_process['token']}.json")
+        try:
+            os.makedirs(metrics_dir, exist_ok=True)
+            with open(f"{path}.tmp", "w") as f:
+                json.dump(build_process_snapshot(), f)
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            logger.warning(f"Could not export metrics to {metrics_dir}: {e}")
+            return
+        _process["dirty"] = False
+
+
+def merge_process_snapshots(
+    snapshot: Dict[str, Any], other: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Sum the cumulative stage, batching and result cache metrics of two processes."""
+    stages = dict(snapshot.get("stages", {}))
+    for stage, histogram in other.get("stages", {}).items():
+        stages[stage] = (
+            merge_snapshots([stages[stage], histogram])
+            if stage in stages
+            else histogram
+        )
+
+    batching = dict(snapshot.get("batching", {}))
+    other_batching = other.get("batching", {})
+    if batching and other_batching:
+        for histogram in ("batch_size", "latency"):
+            batching[histogram] = merge_snapshots(
+                [batching[histogram], other_batching[histogram]]
+            )
+    elif other_batching:
+        batching = dict(other_batching)
+
+    result_cache = dict(snapshot.get("result_cache", {}))
+    for counter, count in other.get("result_cache", {}).items():
+        result_cache[counter] = result_cache.get(counter, 0) + count
+
+    return {"stages": stages, "batching": batching, "result_cache": result_cache}
+
+
+def prune_dead_snapshots(metrics_dir: str) -> None:
+    """
+    Fold the files of exited processes into this process's snapshot, so
+    their cumulative counts are kept while their files do not pile up in
+    AI_METRICS_DIR. Renaming a file first makes sure only one of several
+    scraping processes folds it. Pids are checked on this host, as for the
+    model residency gauges.
+    """
+    get_stage_histograms()
+    for path in glob.glob(os.path.join(metrics_dir, "*.json")):
+        try:
+            pid = int(os.path.basename(path).split("-", 1)[0])
+        except ValueError:
+            continue
+        if is_process_alive(pid):
+            continue
+
+        claimed_path = f"{path}.{_process['token']}.fold"
+        try:
+            os.rename(path, claimed_path)
+        except OSError:
+            continue  # Folded by another process
+        try:
+            with open(claimed_path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Dropping unreadable metrics file {path}: {e}")
+            snapshot = {}
+
+        with _export_lock:
+            _inherited.update(merge_process_snapshots(_inherited, snapshot))
+            _process["dirty"] = True
+        try:
+            os.remove(claimed_path)
+        except OSError:
+            pass
+
+
+def read_snapshots() -> Iterable[Tuple[int, Dict[str, Any]]]:
+    """(pid, snapshot) of every process that published to AI_METRICS_DIR."""
+    metrics_dir = getattr(settings, "AI_METRICS_DIR", None)
+    # This process's own changes count even within the export interval
+    prune_dead_snapshots(metrics_dir)
+    flush_stage_snapshot()
+    for path in glob.glob(os.path.join(metrics_dir, "*.json")):
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+            pid = int(os.path.basename(path).split("-", 1)[0])
+        except (OSError, ValueError):
+            continue
+        yield pid, snapshot
+
+
+def is_process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def merge_snapshots(snapshots: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Sum histogram snapshots sharing the same buckets."""
+    merged = {"buckets": {}, "sum": 0.0, "count": 0}
+    for snapshot in snapshots:
+        for bound, count in snapshot["buckets"].items():
+            merged["buckets"][bound] = merged["buckets"].get(bound, 0) + count
+        merged["sum"] += snapshot["sum"]
+        merged["count"] += snapshot["count"]
+    merged["sum"] = round(merged["sum"], 6)
+    return merged
+
+
+def collect_stage_snapshots() -> Dict[str, Dict[str, Any]]:
+    """Stage histograms summed over every process that published them."""
+    per_stage = {stage: [] for stage in INFERENCE_STAGES}
+
+    if getattr(settings, "AI_METRICS_DIR", None):
+        for _, snapshot in read_snapshots():
+            for stage, histogram in snapshot.get("stages", {}).items():
+                per_stage.setdefault(stage, []).append(histogram)
+    else:
+        for stage, histogram in get_stage_histograms().items():
+            per_stage[stage].append(histogram.snapshot())
+
+    return {
+        stage: merge_snapshots(snapshots)
+        for stage, snapshots in per_stage.items()
+        if snapshots
+    }
+
+
+def collect_model_registry_stats() -> Dict[int, Dict[str, Any]]:
+    """
+    Model residency by pid of every live process with a model registry.
+    Unlike histograms these are gauges, so exited processes are left out.
+    """
+    if not getattr(settings, "AI_METRICS_DIR", None):
+        get_stage_histograms()
+        if not _model_registry_stats:
+            return {}
+        return {os.getpid(): dict(_model_registry_stats)}
+
+    return {
+        pid: snapshot["model_registry"]
+        for pid, snapshot in read_snapshots()
+        if snapshot.get("model_registry") and is_process_alive(pid)
+    }
+
+
+def collect_batching_snapshots() -> Dict[str, Dict[str, Any]]:
+    """
+    Batch size and latency histograms summed over every process that batched
+    forward passes. Like the stage histograms they are cumulative, so exited
+    processes still count.
+    """
+    if getattr(settings, "AI_METRICS_DIR", None):
+        batching = [
+            snapshot["batching"]
+            for _, snapshot in read_snapshots()
+            if snapshot.get("batching")
+        ]
+    else:
+        get_stage_histograms()
+        batching = [dict(_batching_stats)] if _batching_stats else []
+
+    if not batching:
+        return {}
+    return {
+        histogram: merge_snapshots([stats[histogram] for stats in batching])
+        for histogram in ("batch_size", "latency")
+    }
+
+
+def collect_result_cache_stats() -> Dict[str, int]:
+    """Result cache counters summed over every process that used the cache."""
+    if getattr(settings, "AI_METRICS_DIR", None):
+        per_process = [
+            snapshot.get("result_cache", {}) for _, snapshot in read_snapshots()
+        ]
+    else:
+        get_stage_histograms()
+        per_process = [dict(_result_cache_stats)]
+
+    return {
+        counter: sum(stats.get(counter, 0) for stats in per_process)
+        for counter in RESULT_CACHE_COUNTERS
+    }
+
+
+def render_histogram(
+    lines: List[str], metric: str, labels: str, snapshot: Dict[str, Any]
+) -> None:
+    """Append the bucket, sum and count samples of one histogram."""
+    prefix = f"{labels}," if labels else ""
+    for bound, count in snapshot["buckets"].items():
+        lines.append(f'{metric}_bucket{{{prefix}le="{bound}"}} {count}')
+    suffix = f"{{{labels}}}" if labels else ""
+    lines.append(f"{metric}_sum{suffix} {snapshot['sum']}")
+    lines.append(f"{metric}_count{suffix} {snapshot['count']}")
+
+
+def render_prometheus(
+    stage_snapshots: Dict[str, Dict[str, Any]],
+    registry_stats: Optional[Dict[int, Dict[str, Any]]] = None,
+    batching_snapshots: Optional[Dict[str, Dict[str, Any]]] = None,
+    result_cache_stats: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Render stage histograms, the model residency of each process, the
+    batching histograms and the result cache counters in the Prometheus text
+    exposition format.
+    """
+    lines = [
+        f"# HELP {STAGE_METRIC} Time spent in each stage of MicroNet image analysis.",
+        f"# TYPE {STAGE_METRIC} histogram",
+    ]
+    for stage, snapshot in stage_snapshots.items():
+        render_histogram(lines, STAGE_METRIC, f'stage="{stage}"', snapshot)
+
+    if registry_stats:
+        gauges = [
+            ("budget_bytes", "gauge", "Memory budget of the model registry."),
+            ("resident_bytes", "gauge", "Memory held by resident models."),
+            ("loads", "counter", "Models loaded into the registry."),
+            ("evictions", "counter", "Models evicted to stay within the budget."),
+        ]
+        for name, metric_type, help_text in gauges:
+            metric = f"{REGISTRY_METRIC}_{name}"
+            if metric_type == "counter":
+                metric = f"{metric}_total"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {metric_type}")
+            for pid, stats in registry_stats.items():
+                lines.append(f'{metric}{{pid="{pid}"}} {stats[name]}')
+
+        metric = f"{REGISTRY_METRIC}_model_bytes"
+        lines.append(f"# HELP {metric} Memory held by each resident model.")
+        lines.append(f"# TYPE {metric} gauge")
+        for pid, stats in registry_stats.items():
+            for model in stats["models"]:
+                lines.append(
+                    f'{metric}{{pid="{pid}",model="{model["model_key"]}"}} '
+                    f'{model["bytes"]}'
+                )
+
+    if batching_snapshots:
+        histograms = [
+            (BATCH_SIZE_METRIC, "batch_size", "Inputs per batched forward pass."),
+            (
+                BATCH_LATENCY_METRIC,
+                "latency",
+                "Time from submitting an input to its batch finishing.",
+            ),
+        ]
+        for metric, histogram, help_text in histograms:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            render_histogram(lines, metric, "", batching_snapshots[histogram])
+
+    if result_cache_stats:
+        for counter in RESULT_CACHE_COUNTERS:
+            metric = f"{RESULT_CACHE_METRIC}_{counter}_total"
+            lines.append(f"# HELP {metric} Result cache {counter}.")
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {result_cache_stats[counter]}")
+        if "entries" in result_cache_stats:
+            metric = f"{RESULT_CACHE_METRIC}_entries"
+            lines.append(f"# HELP {metric} Cached inference results.")
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {result_cache_stats['entries']}")
+    return "\n".join(lines) + "\n"
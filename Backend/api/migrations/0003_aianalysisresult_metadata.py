@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0002_inferencecacheentry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="aianalysisresult",
+            name="ai_model_version",
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name="aianalysisresult",
+            name="metadata",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0003_aianalysisresult_metadata"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="diagnosticsession",
+            name="confidence_sum",
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name="diagnosticsession",
+            name="failed_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="diagnosticsession",
+            name="images_processed",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="diagnosticsession",
+            name="positive_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="diagnosticsession",
+            name="worst_class",
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name="diagnosticsession",
+            name="worst_severity",
+            field=models.IntegerField(default=-1),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0004_diagnosticsession_aggregates"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="diagnosticsession",
+            index=models.Index(fields=["-created_at"], name="session_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="diagnosticsession",
+            index=models.Index(
+                fields=["status", "disease_type", "-created_at"],
+                name="session_status_disease_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="diagnosticsession",
+            index=models.Index(
+                fields=["patient", "status", "-created_at"],
+                name="session_patient_status_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="microscopyimage",
+            index=models.Index(
+                fields=["session", "uploaded_at"], name="image_session_uploaded_idx"
+            ),
+        ),
+    ]
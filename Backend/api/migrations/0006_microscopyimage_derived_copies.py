@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0005_session_image_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="microscopyimage",
+            name="inference_image",
+            field=models.ImageField(
+                blank=True, upload_to="microscopy_images/inference/"
+            ),
+        ),
+        migrations.AddField(
+            model_name="microscopyimage",
+            name="thumbnail",
+            field=models.ImageField(
+                blank=True, upload_to="microscopy_images/thumbnails/"
+            ),
+        ),
+    ]
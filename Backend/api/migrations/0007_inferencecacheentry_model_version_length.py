@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0006_microscopyimage_derived_copies"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="inferencecacheentry",
+            name="model_version",
+            field=models.CharField(max_length=100),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0007_inferencecacheentry_model_version_length"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="aianalysisresult",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="diagnosticsession",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="microscopyimage",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
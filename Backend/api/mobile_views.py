@@ -6,14 +6,20 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.core.files.storage import default_storage
+import asyncio
 import uuid
 import logging
 
 # Import your models - adjust import path as needed
 from .models import DiagnosticSession, MicroscopyImage, AIAnalysisResult
 from .tasks import process_microscopy_image_micronet
+from . import response_cache, result_push
+from .async_mobile_views import get_user, not_authenticated
+from .uploads import get_rejected_uploads, prepare_image_upload
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +46,11 @@ def mobile_upload_image_micronet(request):
         session = get_object_or_404(DiagnosticSession, pk=session_id)
 
         if "image" not in request.FILES:
+            if get_rejected_uploads(request):
+                return Response(
+                    {"error": "Image file is too large"},
+                    status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                )
             return Response(
                 {"error": "No image file provided"}, status=status.HTTP_400_BAD_REQUEST
             )
@@ -52,17 +63,30 @@ def mobile_upload_image_micronet(request):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        try:
+            upload_metadata, inference_image, thumbnail = prepare_image_upload(
+                image_file
+            )
+        except ValueError:
+            return Response(
+                {"error": "Could not read the image. Please upload a valid image."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
         # Create image record
         image = MicroscopyImage.objects.create(
             session=session,
             image=image_file,
-            uploaded_by=request.user,
+            inference_image=inference_image,
+            thumbnail=thumbnail,
+            uploaded_by_name=request.user.get_username(),
             image_metadata={
                 "uploaded_via": "mobile_app_micronet",
                 "task_type": task_type,
                 "camera_settings": request.data.get("camera_settings", {}),
                 "file_size": image_file.size,
                 "content_type": image_file.content_type,
+                **upload_metadata,
             },
         )
 
@@ -96,68 +120,41 @@ def mobile_upload_image_micronet(request):
 def mobile_check_micronet_result(request, image_id):
     """Check MicroNet processing status and results."""
     try:
-        image = get_object_or_404(MicroscopyImage, pk=image_id)
 
-        try:
-            result = image.aianalysisresult
-            response_data = {
+        def build():
+            # Only finished analyses are cached, as they no longer change
+            result = AIAnalysisResult.objects.filter(image_id=image_id).first()
+            if result is None:
+                return None
+            data = {
                 "status": "completed",
-                "result": {
-                    "prediction": result.prediction,
-                    "confidence": result.confidence_score,
-                    "confidence_level": result.confidence_level,
-                    "processing_time": result.processing_time,
-                    "detection_regions": result.detection_regions,
-                    "framework": (
-                        result.metadata.get("framework", "NASA_MicroNet")
-                        if result.metadata
-                        else "NASA_MicroNet"
-                    ),
-                    "encoder": (
-                        result.metadata.get("encoder", "unknown")
-                        if result.metadata
-                        else "unknown"
-                    ),
-                    "task_type": (
-                        result.metadata.get("task_type", "classification")
-                        if result.metadata
-                        else "classification"
-                    ),
-                    "analysis_timestamp": result.created_at.isoformat(),
-                },
+                "result": result_push.serialize_result(result),
             }
+            return data, True, result.updated_at
 
-            # Add task-specific results
-            if result.metadata and result.metadata.get("task_type") == "classification":
-                response_data["result"]["all_probabilities"] = result.metadata.get(
-                    "all_probabilities", {}
-                )
-            elif result.metadata and result.metadata.get("task_type") == "segmentation":
-                response_data["result"]["class_percentages"] = result.metadata.get(
-                    "class_percentages", {}
-                )
-                response_data["result"]["abnormal_area_percentage"] = (
-                    result.metadata.get("abnormal_area_percentage", 0)
-                )
+        entry = response_cache.get_or_build(
+            response_cache.get_image_key(image_id), build
+        )
+        if entry is not None:
+            return response_cache.respond(request, entry)
 
-            return Response(response_data)
+        image = get_object_or_404(MicroscopyImage, pk=image_id)
 
-        except AIAnalysisResult.DoesNotExist:
-            # Check if processing failed
-            if image.session.status == "failed":
-                return Response(
-                    {
-                        "status": "failed",
-                        "message": "MicroNet processing failed. Please try uploading again.",
-                    }
-                )
-            else:
-                return Response(
-                    {
-                        "status": "processing",
-                        "message": "MicroNet analysis is still in progress",
-                    }
-                )
+        # Check if processing failed
+        if image.session.status == "failed":
+            return Response(
+                {
+                    "status": "failed",
+                    "message": "MicroNet processing failed. Please try uploading again.",
+                }
+            )
+        else:
+            return Response(
+                {
+                    "status": "processing",
+                    "message": "MicroNet analysis is still in progress",
+                }
+            )
 
     except Exception as e:
         logger.error(f"Failed to check MicroNet result for image {image_id}: {e}")
@@ -167,6 +164,62 @@ def mobile_check_micronet_result(request, image_id):
         )
 
 
+async def mobile_session_events(request, session_id):
+    """
+    Server-sent events stream of a session's MicroNet results, replacing
+    polling of mobile_check_micronet_result. Results already written are
+    sent on connect, then each new one as soon as the inference task stores
+    it. Serve it through the ASGI application (pathfinder.asgi) so idle
+    streams do not hold a worker thread.
+    """
+    # Same access as the polling endpoint it replaces (IsAuthenticated)
+    if await get_user(request) is None:
+        return not_authenticated()
+
+    if not result_push.is_enabled():
+        return JsonResponse({"error": "Result push is disabled"}, status=503)
+
+    session = await DiagnosticSession.objects.filter(pk=session_id).afirst()
+    if session is None:
+        return JsonResponse({"error": "Session not found"}, status=404)
+
+    response = StreamingHttpResponse(
+        stream_session_events(session), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # Don't let nginx buffer the stream
+    return response
+
+
+async def stream_session_events(session):
+    """Existing results of a session, then live ones, as SSE messages."""
+    heartbeat = getattr(settings, "AI_RESULT_STREAM_HEARTBEAT", 15)
+    loop = asyncio.get_running_loop()
+    # Streams end after a while; EventSource reconnects and resyncs
+    deadline = loop.time() + getattr(settings, "AI_RESULT_STREAM_TIMEOUT", 300)
+
+    async with result_push.SessionSubscription(session.id, heartbeat) as subscription:
+        # Ask EventSource to reconnect quickly once the stream times out
+        yield "retry: 3000\n\n"
+
+        sent = set()
+        existing = AIAnalysisResult.objects.filter(image__session=session).order_by(
+            "created_at"
+        )
+        async for result in existing:
+            event = result_push.build_event(result, session.status)
+            sent.add(event["image_id"])
+            yield result_push.format_sse(event)
+
+        while loop.time() < deadline:
+            event = await subscription.get_event()
+            if event is None:
+                yield ": keep-alive\n\n"
+            elif event["image_id"] not in sent:
+                sent.add(event["image_id"])
+                yield result_push.format_sse(event)
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def create_diagnostic_session(request):
@@ -186,16 +239,24 @@ def create_diagnostic_session(request):
         try:
             patient = Patient.objects.get(patient_id=patient_id)
         except Patient.DoesNotExist:
+            # Patients belong to a facility, so a new one needs it
+            facility_id = request.data.get("facility_id")
+            if not facility_id:
+                return Response(
+                    {"error": "facility_id is required for a new patient"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
             patient = Patient.objects.create(
                 patient_id=patient_id,
                 age=request.data.get("age", 0),
                 gender=request.data.get("gender", "unknown"),
+                facility_id=facility_id,
             )
 
         # Create diagnostic session
         session = DiagnosticSession.objects.create(
             patient=patient,
-            technician=request.user,
+            technician_name=request.user.get_username(),
             disease_type=disease_type,
             status="active",
         )
@@ -0,0 +1,173 @@
+# ==============================================================================
+# model_export.py - TorchScript / ONNX Export of MicroNet Models
+# ==============================================================================
+
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+import torch
+from django.conf import settings
+
+from .ai_inference import WARMUP_INPUT_SIZE, OnnxRuntimeModel, ends_in_softmax
+
+logger = logging.getLogger(__name__)
+
+EXPORT_SUFFIXES = {"torchscript": ".pt", "onnx": ".onnx"}
+
+# Inference backend name -> export format it runs
+BACKEND_FORMATS = {"torchscript": "torchscript", "onnxruntime": "onnx"}
+
+# Second input size segmentation exports are checked at, as tiled inference
+# runs them on tiles rather than the 224x224 export input
+SEGMENTATION_CHECK_SIZE = (256, 320)
+
+
+def get_export_path(model_key: str, export_format: str) -> Path:
+    return (
+        Path(settings.AI_EXPORT_PATH) / f"{model_key}{EXPORT_SUFFIXES[export_format]}"
+    )
+
+
+def get_report_path(model_key: str, export_format: str) -> Path:
+    return Path(settings.AI_EXPORT_PATH) / f"{model_key}.{export_format}.json"
+
+
+def read_export_report(model_key: str, export_format: str) -> Optional[Dict[str, Any]]:
+    path = get_report_path(model_key, export_format)
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def export_torchscript(
+    model: torch.nn.Module,
+    example_input: torch.Tensor,
+    path: Path,
+    task_type: str = "classification",
+):
+    """Trace and freeze a model into a TorchScript artifact."""
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example_input)
+        frozen = torch.jit.freeze(traced)
+    torch.jit.save(frozen, str(path))
+    return torch.jit.load(str(path), map_location="cpu")
+
+
+def export_onnx(
+    model: torch.nn.Module,
+    example_input: torch.Tensor,
+    path: Path,
+    task_type: str = "classification",
+):
+    """
+    Export a model to ONNX with a dynamic batch dimension, and for
+    segmentation dynamic height and width so it also runs on tiles.
+    """
+    axes = {0: "batch"}
+    if task_type == "segmentation":
+        axes.update({2: "height", 3: "width"})
+    torch.onnx.export(
+        model,
+        (example_input,),
+        str(path),
+        input_names=["input"],
+        output_names=["output"],
+        dynamic_axes={"input": axes, "output": axes},
+        external_data=False,
+    )
+    return OnnxRuntimeModel(path)
+
+
+EXPORTERS = {"torchscript": export_torchscript, "onnx": export_onnx}
+
+
+def mean_latency(model, example_input: torch.Tensor, runs: int) -> float:
+    """Mean seconds per forward pass after one warm-up run."""
+    with torch.no_grad():
+        model(example_input)
+        start_time = time.perf_counter()
+        for _ in range(runs):
+            model(example_input)
+    return (time.perf_counter() - start_time) / runs
+
+
+def check_equivalence(
+    reference, candidate, inputs: torch.Tensor, atol: float
+) -> Dict[str, Any]:
+    """Compare candidate outputs against the eager reference model."""
+    with torch.no_grad():
+        expected = reference(inputs)
+        actual = candidate(inputs).to(expected.device)
+
+    max_abs_diff = (expected - actual).abs().max().item()
+    prediction_agreement = (
+        (expected.argmax(dim=1) == actual.argmax(dim=1)).float().mean().item()
+    )
+    return {
+        "max_abs_diff": max_abs_diff,
+        "prediction_agreement": round(prediction_agreement, 4),
+        "equivalent": max_abs_diff <= atol,
+    }
+
+
+def export_model(
+    model_info: Dict[str, Any],
+    export_format: str,
+    atol: float = 1e-3,
+    runs: int = 10,
+) -> Dict[str, Any]:
+    """
+    Export an eager model, verify it against the eager outputs on a random
+    batch and write an export report next to the artifact.
+    """
+    model = model_info["model"].cpu().eval()
+    model_key = model_info["model_key"]
+    path = get_export_path(model_key, export_format)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    task_type = model_info.get("task_type", "classification")
+    example_input = torch.randn(WARMUP_INPUT_SIZE)
+    exported = EXPORTERS[export_format](model, example_input, path, task_type)
+
+    check_input = torch.randn((4,) + tuple(WARMUP_INPUT_SIZE[1:]))
+    report = check_equivalence(model, exported, check_input, atol)
+
+    if task_type == "segmentation":
+        tile_input = torch.randn((2, WARMUP_INPUT_SIZE[1]) + SEGMENTATION_CHECK_SIZE)
+        tile_report = check_equivalence(model, exported, tile_input, atol)
+        report = {
+            "max_abs_diff": max(report["max_abs_diff"], tile_report["max_abs_diff"]),
+            "prediction_agreement": min(
+                report["prediction_agreement"], tile_report["prediction_agreement"]
+            ),
+            "equivalent": report["equivalent"] and tile_report["equivalent"],
+        }
+
+    eager_latency = mean_latency(model, example_input, runs)
+    exported_latency = mean_latency(exported, example_input, runs)
+    report.update(
+        {
+            "model_key": model_key,
+            "format": export_format,
+            "task_type": task_type,
+            # Verified on inputs other than the export size
+            "dynamic_spatial": task_type == "segmentation",
+            "outputs_probabilities": ends_in_softmax(model),
+            "version": model_info["config"]["version"],
+            "encoder": model_info["config"]["encoder"],
+            "atol": atol,
+            "eager_latency": round(eager_latency, 4),
+            "exported_latency": round(exported_latency, 4),
+            "speedup": round(eager_latency / exported_latency, 2),
+        }
+    )
+
+    with open(get_report_path(model_key, export_format), "w") as f:
+        json.dump(report, f, indent=2)
+
+    logger.info(f"Exported {model_key} to {path}: {report}")
+    return report
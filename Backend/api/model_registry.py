@@ -0,0 +1,181 @@
+# ==============================================================================
+# model_registry.py - Memory-Budgeted LRU Registry of Loaded Models
+# ==============================================================================
+
+import ctypes
+import gc
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+
+def _tensor_bytes(value, seen: set) -> int:
+    """Bytes of the tensors in a state dict value, counting shared ones once."""
+    if isinstance(value, torch.Tensor):
+        key = (value.device, value.data_ptr())
+        if key in seen:
+            return 0
+        seen.add(key)
+        return value.numel() * value.element_size()
+    if isinstance(value, (tuple, list)):
+        # Packed weights of quantized modules, e.g. (weight, bias)
+        return sum(_tensor_bytes(item, seen) for item in value)
+    return 0
+
+
+def measure_model_bytes(model) -> int:
+    """
+    Memory held by a model's parameters and buffers, measured through its
+    state dict so the packed weights of quantized modules and TorchScript
+    modules are counted too. ONNX Runtime models are measured by the size
+    of their model file.
+    """
+    if isinstance(model, nn.Module):
+        seen = set()
+        return sum(_tensor_bytes(value, seen) for value in model.state_dict().values())
+
+    path = getattr(model, "path", None)
+    if path and os.path.exists(path):
+        return os.path.getsize(path)
+    return 0
+
+
+class ModelRegistry:
+    """
+    Loaded models by model key, kept within a memory budget: adding a model
+    that does not fit evicts the least recently used ones first. A budget of
+    zero disables eviction. A model larger than the whole budget is still
+    kept, alone, since the request needing it has to be served.
+    """
+
+    def __init__(self, budget_bytes: int = 0):
+        self.budget_bytes = budget_bytes
+        self.loads = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, model_key: str) -> bool:
+        with self._lock:
+            return model_key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    @property
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(entry["bytes"] for entry in self._entries.values())
+
+    def get(self, model_key: str) -> Optional[Dict[str, Any]]:
+        """Model info of a resident model, marking it most recently used."""
+        with self._lock:
+            entry = self._entries.get(model_key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(model_key)
+            entry["hits"] += 1
+            entry["last_used_at"] = time.time()
+            return entry["info"]
+
+    def add(
+        self, model_key: str, info: Dict[str, Any], size_bytes: Optional[int] = None
+    ) -> List[str]:
+        """Register a loaded model, returning the keys evicted to fit it."""
+        if size_bytes is None:
+            size_bytes = measure_model_bytes(info["model"])
+
+        evicted = []
+        with self._lock:
+            self._entries.pop(model_key, None)
+            resident = sum(entry["bytes"] for entry in self._entries.values())
+            while (
+                self.budget_bytes
+                and self._entries
+                and resident + size_bytes > self.budget_bytes
+            ):
+                evicted_key, entry = self._entries.popitem(last=False)
+                resident -= entry["bytes"]
+                evicted.append(evicted_key)
+
+            now = time.time()
+            self._entries[model_key] = {
+                "info": info,
+                "bytes": size_bytes,
+                "hits": 0,
+                "loaded_at": now,
+                "last_used_at": now,
+            }
+            self.loads += 1
+            self.evictions += len(evicted)
+
+        if self.budget_bytes and size_bytes > self.budget_bytes:
+            logger.warning(
+                f"Model {model_key} ({size_bytes / 2**20:.1f} MB) exceeds the "
+                f"model memory budget of {self.budget_bytes / 2**20:.1f} MB"
+            )
+        if evicted:
+            logger.info(f"Evicted models {evicted} to load {model_key}")
+            release_memory()
+        return evicted
+
+    def remove(self, model_key: str) -> bool:
+        with self._lock:
+            removed = self._entries.pop(model_key, None) is not None
+        if removed:
+            release_memory()
+        return removed
+
+    def items(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Model keys and infos of the resident models, without touching LRU order."""
+        with self._lock:
+            return [(key, entry["info"]) for key, entry in self._entries.items()]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Budget, residency and per-model usage, least recently used first."""
+        with self._lock:
+            models = [
+                {
+                    "model_key": model_key,
+                    "bytes": entry["bytes"],
+                    "hits": entry["hits"],
+                    "loaded_at": entry["loaded_at"],
+                    "last_used_at": entry["last_used_at"],
+                }
+                for model_key, entry in self._entries.items()
+            ]
+            return {
+                "budget_bytes": self.budget_bytes,
+                "resident_bytes": sum(model["bytes"] for model in models),
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "models": models,
+            }
+
+
+def release_memory() -> None:
+    """Return the memory of evicted models to the allocator and the device."""
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+def trim_heap() -> None:
+    """
+    Hand the free pages of the C heap back to the OS (glibc only), e.g.
+    those of models dropped after a failed build, so processes forked later
+    do not inherit them.
+    """
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
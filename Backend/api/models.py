@@ -1,4 +1,8 @@
 from django.db import models
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from typing import Any, Dict, Iterable, Optional
 import uuid
 
 
@@ -57,6 +61,84 @@ class DiagnosticSession(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
     created_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
+    # Last-Modified of the cached results payload; save(update_fields=...)
+    # and QuerySet.update() callers must set it themselves
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Running aggregates of the session's analyses, maintained by the
+    # inference tasks so a session summary never loads every result
+    images_processed = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    positive_count = models.PositiveIntegerField(default=0)
+    confidence_sum = models.FloatField(default=0.0)
+    worst_class = models.CharField(max_length=100, blank=True)
+    worst_severity = models.IntegerField(default=-1)
+
+    class Meta:
+        indexes = [
+            # Unfiltered listings, newest first (cursor pagination)
+            models.Index(fields=["-created_at"], name="session_created_idx"),
+            # Work queues filtered by status, optionally by disease type
+            models.Index(
+                fields=["status", "disease_type", "-created_at"],
+                name="session_status_disease_idx",
+            ),
+            # Per-patient (and through patients, per-facility) dashboards,
+            # e.g. requires_review sessions of a facility, newest first
+            models.Index(
+                fields=["patient", "status", "-created_at"],
+                name="session_patient_status_idx",
+            ),
+        ]
+
+    @property
+    def mean_confidence(self) -> Optional[float]:
+        """Mean confidence over the analyses that did not fail."""
+        analyzed = self.images_processed - self.failed_count
+        return round(self.confidence_sum / analyzed, 3) if analyzed else None
+
+    def add_result_aggregates(self, summaries: Iterable[Dict[str, Any]]) -> None:
+        """
+        Fold finished analyses into the session aggregates with one UPDATE
+        built from F() expressions, so concurrent tasks never lose each
+        other's counts. Call it in the transaction that inserts the results.
+        Each summary has confidence, class_name, severity, positive, failed.
+        """
+        processed = failed = positive = 0
+        confidence_sum = 0.0
+        worst = None
+        for summary in summaries:
+            processed += 1
+            if summary["failed"]:
+                failed += 1
+                continue
+            confidence_sum += summary["confidence"]
+            positive += int(summary["positive"])
+            if worst is None or summary["severity"] > worst["severity"]:
+                worst = summary
+
+        updates = {
+            "images_processed": F("images_processed") + processed,
+            "failed_count": F("failed_count") + failed,
+            "positive_count": F("positive_count") + positive,
+            "confidence_sum": F("confidence_sum") + confidence_sum,
+        }
+        if worst is not None:
+            # Both expressions read the row as it was before this UPDATE
+            updates["worst_class"] = Case(
+                When(
+                    worst_severity__lt=worst["severity"],
+                    then=Value(worst["class_name"]),
+                ),
+                default=F("worst_class"),
+            )
+            updates["worst_severity"] = Greatest(
+                F("worst_severity"), Value(worst["severity"])
+            )
+
+        DiagnosticSession.objects.filter(pk=self.pk).update(
+            updated_at=timezone.now(), **updates
+        )
 
 
 # ------------------------
@@ -68,9 +150,24 @@ class MicroscopyImage(models.Model):
         DiagnosticSession, related_name="images", on_delete=models.CASCADE
     )
     image = models.ImageField(upload_to="microscopy_images/")
+    # Derived at upload time: a copy at the classifier input size, so workers
+    # never decode the original for classification, and a preview thumbnail
+    inference_image = models.ImageField(
+        upload_to="microscopy_images/inference/", blank=True
+    )
+    thumbnail = models.ImageField(upload_to="microscopy_images/thumbnails/", blank=True)
     image_metadata = models.JSONField(default=dict)
     uploaded_by_name = models.CharField(max_length=255, blank=True, null=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Images of a session in upload order
+            models.Index(
+                fields=["session", "uploaded_at"], name="image_session_uploaded_idx"
+            ),
+        ]
 
 
 # ------------------------
@@ -101,21 +198,29 @@ class AIAnalysisResult(models.Model):
     ai_model = models.ForeignKey(
         AIModelMetadata, on_delete=models.SET_NULL, null=True, blank=True
     )
+    ai_model_version = models.CharField(max_length=100, blank=True)
     prediction = models.CharField(max_length=100)
     confidence_score = models.FloatField()
     confidence_level = models.CharField(max_length=10, choices=CONFIDENCE_LEVELS)
     detection_regions = models.JSONField(default=list)
     processing_time = models.FloatField()
     raw_output = models.JSONField(default=dict, blank=True)
+    # Framework, per-task outputs and per-stage timings of the analysis
+    metadata = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @staticmethod
+    def get_confidence_level(confidence_score: float) -> str:
+        if confidence_score >= 0.9:
+            return "high"
+        elif confidence_score >= 0.7:
+            return "medium"
+        return "low"
 
     def save(self, *args, **kwargs):
-        if self.confidence_score >= 0.9:
-            self.confidence_level = "high"
-        elif self.confidence_score >= 0.7:
-            self.confidence_level = "medium"
-        else:
-            self.confidence_level = "low"
+        # bulk_create skips save(), so bulk writers call this helper directly
+        self.confidence_level = self.get_confidence_level(self.confidence_score)
         super().save(*args, **kwargs)
 
 
@@ -129,3 +234,24 @@ class ExpertReview(models.Model):
     agrees_with_ai = models.BooleanField()
     notes = models.TextField(blank=True)
     reviewed_at = models.DateTimeField(auto_now_add=True)
+
+
+# ------------------------
+# Inference Result Cache
+# ------------------------
+class InferenceCacheEntry(models.Model):
+    content_hash = models.CharField(max_length=64)
+    model_key = models.CharField(max_length=100)
+    model_version = models.CharField(max_length=100)
+    results = models.JSONField(default=dict)
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["content_hash", "model_key", "model_version"],
+                name="unique_inference_cache_key",
+            )
+        ]
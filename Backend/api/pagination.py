@@ -0,0 +1,18 @@
+# ==============================================================================
+# pagination.py - Keyset Pagination for Large API Listings
+# ==============================================================================
+
+from rest_framework.pagination import CursorPagination
+
+
+class SessionCursorPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination over sessions, newest first. Each page is a
+    single indexed range query, with no COUNT(*) and no OFFSET scan, so its
+    cost does not grow with the number of sessions.
+    """
+
+    ordering = "-created_at"
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
@@ -0,0 +1,156 @@
+# ==============================================================================
+# quantization.py - INT8 Post-Training Quantization for CPU Inference
+# ==============================================================================
+
+import copy
+import logging
+import time
+from typing import Dict, List, Any
+
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_MODES = ("dynamic", "static")
+
+# Dynamic quantization only converts nn.Linear layers: the classifiers' final
+# fc layer, and none of the convolutional UNet segmentation models. Those are
+# only quantized by static mode.
+DYNAMIC_QUANTIZATION_TASKS = ("classification",)
+
+
+def load_calibration_inputs(preprocessor, limit: int = 32) -> List[torch.Tensor]:
+    """
+    Preprocessed tensors of the most recently uploaded microscopy images,
+    used to calibrate activation ranges for static quantization.
+    """
+    from .models import MicroscopyImage
+
+    inputs = []
+    for image_obj in MicroscopyImage.objects.order_by("-uploaded_at")[: limit * 2]:
+        try:
+            # Inputs are kept, so each needs its own tensor
+            input_tensor, _ = preprocessor.load(
+                image_obj.image.path, reuse_buffer=False
+            )
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping calibration image {image_obj.id}: {e}")
+            continue
+        inputs.append(input_tensor)
+        if len(inputs) >= limit:
+            break
+
+    return inputs
+
+
+def supports_quantization(mode: str, task_type: str) -> bool:
+    """Whether a quantization mode changes the models of a task at all."""
+    return mode != "dynamic" or task_type in DYNAMIC_QUANTIZATION_TASKS
+
+
+def quantize_dynamic(model: nn.Module) -> nn.Module:
+    """
+    INT8 weights with activations quantized on the fly. Only nn.Linear layers
+    are converted, convolutions are left in float.
+    """
+    return torch.ao.quantization.quantize_dynamic(
+        copy.deepcopy(model), {nn.Linear}, dtype=torch.qint8
+    )
+
+
+def quantize_static(
+    model: nn.Module, calibration_inputs: List[torch.Tensor], batch_size: int = 8
+) -> nn.Module:
+    """
+    INT8 weights and activations for the whole network using FX graph mode
+    post-training quantization, calibrated on real images.
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    qconfig_mapping = get_default_qconfig_mapping(torch.backends.quantized.engine)
+    example_inputs = (calibration_inputs[0].unsqueeze(0),)
+    prepared = prepare_fx(copy.deepcopy(model), qconfig_mapping, example_inputs)
+
+    with torch.no_grad():
+        for i in range(0, len(calibration_inputs), batch_size):
+            prepared(torch.stack(calibration_inputs[i : i + batch_size]))
+
+    return convert_fx(prepared)
+
+
+def quantize_model(
+    model: nn.Module,
+    mode: str,
+    calibration_inputs: List[torch.Tensor] = None,
+    task_type: str = "classification",
+) -> nn.Module:
+    """Quantize a float CPU model with the given mode."""
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode {mode}")
+    if not supports_quantization(mode, task_type):
+        raise ValueError(
+            f"Dynamic quantization does not quantize {task_type} models, "
+            f"use static mode"
+        )
+
+    model = model.cpu().eval()
+    if mode == "static":
+        if not calibration_inputs:
+            raise ValueError("Static quantization needs calibration inputs")
+        return quantize_static(model, calibration_inputs)
+
+    return quantize_dynamic(model)
+
+
+def model_size_mb(model: nn.Module) -> float:
+    """Size of a model's serialized state dict in megabytes."""
+    import io
+
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / (1024 * 1024)
+
+
+def accuracy_delta_report(
+    float_model: nn.Module,
+    quantized_model: nn.Module,
+    inputs: List[torch.Tensor],
+    task_type: str,
+) -> Dict[str, Any]:
+    """
+    Compare a quantized model against its float original on the same inputs:
+    prediction agreement, probability drift, latency and model size.
+    """
+    batch = torch.stack(inputs)
+
+    with torch.no_grad():
+        start_time = time.perf_counter()
+        float_out = float_model(batch)
+        float_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        quant_out = quantized_model(batch)
+        quant_time = time.perf_counter() - start_time
+
+    if task_type == "classification":
+        float_probs = torch.softmax(float_out, dim=1)
+        quant_probs = torch.softmax(quant_out, dim=1)
+    else:
+        float_probs, quant_probs = float_out, quant_out
+
+    agreement = (float_probs.argmax(dim=1) == quant_probs.argmax(dim=1)).float().mean()
+    prob_diff = (float_probs - quant_probs).abs()
+
+    return {
+        "samples": len(inputs),
+        "prediction_agreement": round(agreement.item(), 4),
+        "mean_probability_delta": round(prob_diff.mean().item(), 5),
+        "max_probability_delta": round(prob_diff.max().item(), 5),
+        "float_latency": round(float_time / len(inputs), 4),
+        "quantized_latency": round(quant_time / len(inputs), 4),
+        "speedup": round(float_time / quant_time, 2),
+        "float_size_mb": round(model_size_mb(float_model), 2),
+        "quantized_size_mb": round(model_size_mb(quantized_model), 2),
+    }
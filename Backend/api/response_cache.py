@@ -0,0 +1,203 @@
+# ==============================================================================
+# response_cache.py - Cached Result Payloads with Conditional Revalidation
+# ==============================================================================
+
+import hashlib
+import json
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .models import AIAnalysisResult, DiagnosticSession, ExpertReview, MicroscopyImage
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = "results"
+
+
+def is_enabled() -> bool:
+    return getattr(settings, "AI_RESPONSE_CACHE_ENABLED", False)
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def get_image_key(image_id) -> str:
+    return f"micronet:response:image:{image_id}"
+
+
+def get_session_key(session_id) -> str:
+    return f"micronet:response:session:{session_id}"
+
+
+def make_entry(
+    data: Dict[str, Any], last_modified: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """
+    Cache entry of a payload with its ETag, a hash of the payload, and the
+    timestamp of the last write to the rows it was built from.
+    """
+    body = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder)
+    return {
+        "data": data,
+        "etag": f'"{hashlib.md5(body.encode()).hexdigest()}"',
+        "last_modified": int(last_modified.timestamp()) if last_modified else None,
+    }
+
+
+def get_or_build(
+    key: str,
+    build: Callable[[], Optional[Tuple[Dict[str, Any], bool, Optional[datetime]]]],
+) -> Optional[Dict[str, Any]]:
+    """
+    Cached entry under key, else an entry for the (data, final,
+    last_modified) returned by build. Only final payloads, which no longer
+    change without a write from this process, are stored: with a
+    per-process cache the invalidations sent by Celery workers never reach
+    the web process. build returns None when there is nothing to respond
+    with.
+    """
+    if is_enabled():
+        try:
+            entry = get_cache().get(key)
+        except Exception as e:
+            logger.warning(f"Response cache read failed for {key}: {e}")
+            entry = None
+        if entry is not None:
+            return entry
+
+    built = build()
+    if built is None:
+        return None
+
+    data, final, last_modified = built
+    entry = make_entry(data, last_modified)
+    if final and is_enabled():
+        try:
+            get_cache().set(key, entry)
+        except Exception as e:
+            logger.warning(f"Response cache write failed for {key}: {e}")
+    return entry
+
+
+async def aget_or_build(
+    key: str,
+    build: Callable[
+        [], Awaitable[Optional[Tuple[Dict[str, Any], bool, Optional[datetime]]]]
+    ],
+) -> Optional[Dict[str, Any]]:
+    """get_or_build() for async views, with an async build."""
+    if is_enabled():
+        try:
+            entry = await get_cache().aget(key)
+        except Exception as e:
+            logger.warning(f"Response cache read failed for {key}: {e}")
+            entry = None
+        if entry is not None:
+            return entry
+
+    built = await build()
+    if built is None:
+        return None
+
+    data, final, last_modified = built
+    entry = make_entry(data, last_modified)
+    if final and is_enabled():
+        try:
+            await get_cache().aset(key, entry)
+        except Exception as e:
+            logger.warning(f"Response cache write failed for {key}: {e}")
+    return entry
+
+
+def respond(request, entry: Dict[str, Any], response_class=Response):
+    """
+    Response for a cache entry carrying its ETag and Last-Modified, or 304
+    Not Modified when the client's validators still match. If-None-Match
+    takes precedence over If-Modified-Since, whose one-second resolution
+    cannot tell apart writes landing in the same second. Plain Django views
+    pass JsonResponse as the response class.
+    """
+    response = response_class(entry["data"])
+    response["ETag"] = entry["etag"]
+    last_modified = entry.get("last_modified")
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = "private, no-cache"
+    return get_conditional_response(
+        request, etag=entry["etag"], last_modified=last_modified, response=response
+    )
+
+
+def invalidate(session_ids: Iterable = (), image_ids: Iterable = ()) -> None:
+    """
+    Drop the cached payloads of sessions and images once the current
+    transaction commits, so a concurrent request cannot cache the rows as
+    they were before it.
+    """
+    if not is_enabled():
+        return
+
+    keys = [get_session_key(session_id) for session_id in session_ids] + [
+        get_image_key(image_id) for image_id in image_ids
+    ]
+    if not keys:
+        return
+
+    def delete_keys():
+        try:
+            get_cache().delete_many(keys)
+        except Exception as e:
+            logger.warning(f"Response cache invalidation failed for {keys}: {e}")
+
+    transaction.on_commit(delete_keys)
+
+
+# ------------------------
+# Invalidation on writes. bulk_create() and QuerySet.update() send no
+# signals, so their callers invalidate explicitly.
+# ------------------------
+@receiver([post_save, post_delete], sender=AIAnalysisResult)
+def invalidate_analysis_result(sender, instance, **kwargs):
+    try:
+        session_id = instance.image.session_id
+    except ObjectDoesNotExist:
+        # Cascade from a deleted image, which invalidates the session itself
+        session_id = None
+    invalidate(
+        session_ids=[session_id] if session_id else [], image_ids=[instance.image_id]
+    )
+
+
+@receiver([post_save, post_delete], sender=ExpertReview)
+def invalidate_expert_review(sender, instance, **kwargs):
+    row = (
+        AIAnalysisResult.objects.filter(pk=instance.analysis_id)
+        .values_list("image_id", "image__session_id")
+        .first()
+    )
+    if row:
+        image_id, session_id = row
+        invalidate(session_ids=[session_id], image_ids=[image_id])
+
+
+@receiver([post_save, post_delete], sender=MicroscopyImage)
+def invalidate_image(sender, instance, **kwargs):
+    invalidate(session_ids=[instance.session_id], image_ids=[instance.pk])
+
+
+@receiver([post_save, post_delete], sender=DiagnosticSession)
+def invalidate_session(sender, instance, **kwargs):
+    invalidate(session_ids=[instance.pk])
@@ -0,0 +1,108 @@
+# ==============================================================================
+# result_cache.py - Content-Hash Cache for MicroNet Inference Results
+# ==============================================================================
+
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Optional
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import F
+from django.utils import timezone
+
+from .metrics import collect_result_cache_stats, set_result_cache_stats
+from .models import InferenceCacheEntry
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def _count(counter: str, amount: int = 1) -> None:
+    with _stats_lock:
+        _stats[counter] += amount
+        stats = dict(_stats)
+    # Published for the scrape endpoint, which runs in another process
+    set_result_cache_stats(stats)
+
+
+def is_enabled() -> bool:
+    return getattr(settings, "AI_RESULT_CACHE_ENABLED", True)
+
+
+def hash_file(path: str) -> str:
+    """SHA-256 of a file's content, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_cached_result(
+    content_hash: str, model_key: str, model_version: str
+) -> Optional[Dict[str, Any]]:
+    """Return cached prediction results, or None on a miss."""
+    entry = InferenceCacheEntry.objects.filter(
+        content_hash=content_hash, model_key=model_key, model_version=model_version
+    ).first()
+
+    if entry is None:
+        _count("misses")
+        return None
+
+    InferenceCacheEntry.objects.filter(pk=entry.pk).update(
+        hit_count=F("hit_count") + 1, last_used_at=timezone.now()
+    )
+    _count("hits")
+    return entry.results
+
+
+def store_result(
+    content_hash: str, model_key: str, model_version: str, results: Dict[str, Any]
+) -> None:
+    """Cache prediction results and evict least recently used entries."""
+    try:
+        InferenceCacheEntry.objects.create(
+            content_hash=content_hash,
+            model_key=model_key,
+            model_version=model_version,
+            results=results,
+        )
+    except IntegrityError:
+        # Another worker cached the same image first
+        return
+
+    evict_least_recently_used()
+
+
+def evict_least_recently_used() -> int:
+    """Trim the cache down to AI_RESULT_CACHE_MAX_ENTRIES entries."""
+    max_entries = getattr(settings, "AI_RESULT_CACHE_MAX_ENTRIES", 10000)
+    excess = InferenceCacheEntry.objects.count() - max_entries
+    if excess <= 0:
+        return 0
+
+    stale_ids = list(
+        InferenceCacheEntry.objects.order_by("last_used_at").values_list(
+            "id", flat=True
+        )[:excess]
+    )
+    deleted, _ = InferenceCacheEntry.objects.filter(id__in=stale_ids).delete()
+    _count("evictions", deleted)
+    logger.info(f"Evicted {deleted} inference cache entries")
+    return deleted
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Hit/miss/eviction counters of all worker processes plus the cache size."""
+    stats = collect_result_cache_stats()
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+    stats["entries"] = InferenceCacheEntry.objects.count()
+    return stats
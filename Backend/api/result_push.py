@@ -0,0 +1,124 @@
+# ==============================================================================
+# result_push.py - Push Delivery of Finished Analyses over Redis Pub/Sub
+# ==============================================================================
+
+import json
+import logging
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_redis_client = None
+
+
+def is_enabled() -> bool:
+    return getattr(settings, "AI_RESULT_PUSH_ENABLED", False)
+
+
+def get_channel(session_id) -> str:
+    """Pub/sub channel carrying the finished analyses of one session."""
+    return f"micronet:session:{session_id}"
+
+
+def serialize_result(result) -> Dict[str, Any]:
+    """Client-facing payload of an AIAnalysisResult."""
+    metadata = result.metadata or {}
+    task_type = metadata.get("task_type", "classification")
+    data = {
+        "prediction": result.prediction,
+        "confidence": result.confidence_score,
+        "confidence_level": result.confidence_level,
+        "processing_time": result.processing_time,
+        "detection_regions": result.detection_regions,
+        "framework": metadata.get("framework", "NASA_MicroNet"),
+        "encoder": metadata.get("encoder", "unknown"),
+        "task_type": task_type,
+        "analysis_timestamp": result.created_at.isoformat(),
+    }
+
+    # Add task-specific results
+    if task_type == "classification":
+        data["all_probabilities"] = metadata.get("all_probabilities", {})
+    elif task_type == "segmentation":
+        data["class_percentages"] = metadata.get("class_percentages", {})
+        data["abnormal_area_percentage"] = metadata.get("abnormal_area_percentage", 0)
+
+    return data
+
+
+def build_event(result, session_status: str) -> Dict[str, Any]:
+    return {
+        "image_id": str(result.image_id),
+        "session_status": session_status,
+        "result": serialize_result(result),
+    }
+
+
+def get_redis_client():
+    global _redis_client
+    if _redis_client is None:
+        import redis
+
+        _redis_client = redis.Redis.from_url(
+            settings.AI_RESULT_PUSH_REDIS_URL, socket_timeout=2
+        )
+    return _redis_client
+
+
+def publish_results(session_id, results, session_status: str) -> None:
+    """
+    Notify subscribers of a session that analyses were written. Delivery is
+    best effort: a failed publish is logged and never fails the task, since
+    the results are already in the database for the initial sync.
+    """
+    if not is_enabled():
+        return
+
+    try:
+        # One round trip for all results of a batch
+        pipeline = get_redis_client().pipeline(transaction=False)
+        channel = get_channel(session_id)
+        for result in results:
+            pipeline.publish(channel, json.dumps(build_event(result, session_status)))
+        pipeline.execute()
+    except Exception as e:
+        logger.warning(f"Could not push results of session {session_id}: {e}")
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Encode an event as a server-sent events message."""
+    return f"event: result\nid: {event['image_id']}\ndata: {json.dumps(event)}\n\n"
+
+
+class SessionSubscription:
+    """
+    Async context manager subscribed to a session's channel on entry, so
+    callers can read existing results afterwards without missing any
+    published in between.
+    """
+
+    def __init__(self, session_id, heartbeat: float):
+        self.session_id = session_id
+        self.heartbeat = heartbeat
+
+    async def __aenter__(self):
+        import redis.asyncio as aioredis
+
+        self.client = aioredis.Redis.from_url(settings.AI_RESULT_PUSH_REDIS_URL)
+        self.pubsub = self.client.pubsub()
+        await self.pubsub.subscribe(get_channel(self.session_id))
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.pubsub.unsubscribe()
+        await self.pubsub.aclose()
+        await self.client.aclose()
+
+    async def get_event(self) -> Optional[Dict[str, Any]]:
+        """Next published event, or None after heartbeat seconds without one."""
+        message = await self.pubsub.get_message(
+            ignore_subscribe_messages=True, timeout=self.heartbeat
+        )
+        return json.loads(message["data"]) if message else None
@@ -51,12 +51,13 @@ class MicroscopyImageSerializer(serializers.ModelSerializer):
         fields = [
             "id",
             "image",
+            "thumbnail",
             "image_metadata",
             "uploaded_at",
-            "uploaded_by",
+            "uploaded_by_name",
             "ai_result",
         ]
-        read_only_fields = ["uploaded_at"]
+        read_only_fields = ["thumbnail", "uploaded_at"]
 
 
 # serializers.py
@@ -92,19 +93,76 @@ class PatientSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
+class SessionSummarySerializer(serializers.ModelSerializer):
+    """Session-level diagnosis read from the incrementally kept aggregates."""
+
+    mean_confidence = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = DiagnosticSession
+        fields = [
+            "id",
+            "disease_type",
+            "status",
+            "images_processed",
+            "failed_count",
+            "positive_count",
+            "mean_confidence",
+            "worst_class",
+        ]
+
+
+class DiagnosticSessionListSerializer(serializers.ModelSerializer):
+    """
+    Compact session representation for listings: the patient and the
+    session aggregates, without per-image payloads.
+    """
+
+    patient = PatientSerializer(read_only=True)
+    mean_confidence = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = DiagnosticSession
+        fields = [
+            "id",
+            "patient",
+            "technician_name",
+            "disease_type",
+            "status",
+            "created_at",
+            "completed_at",
+            "images_processed",
+            "positive_count",
+            "mean_confidence",
+            "worst_class",
+        ]
+
+
 class DiagnosticSessionSerializer(serializers.ModelSerializer):
     images = MicroscopyImageSerializer(many=True, read_only=True)
     patient = PatientSerializer(read_only=True)
+    mean_confidence = serializers.FloatField(read_only=True)
 
     class Meta:
         model = DiagnosticSession
         fields = [
             "id",
             "patient",
-            "technician",
+            "technician_name",
             "disease_type",
             "status",
             "created_at",
             "completed_at",
+            "images_processed",
+            "failed_count",
+            "positive_count",
+            "mean_confidence",
+            "worst_class",
             "images",
         ]
+        read_only_fields = [
+            "images_processed",
+            "failed_count",
+            "positive_count",
+            "worst_class",
+        ]
@@ -3,13 +3,118 @@
 # ==============================================================================
 
 from celery import shared_task
+from django.db import transaction
 from django.utils import timezone
+from typing import Any, Dict, List, Tuple
 import time
 import logging
 
+from . import result_push
+
 logger = logging.getLogger(__name__)
 
 
+def analyze_image(
+    image_obj, disease_type: str, task_type: str
+) -> Tuple[Dict[str, Any], bool]:
+    """
+    Run MicroNet on one stored image, reusing the cached prediction for
+    duplicate uploads. Returns the results and whether they were cached.
+    """
+    from .inference_client import predict_image, get_model_identity
+    from . import result_cache
+
+    # Duplicate uploads of the same image reuse the cached prediction
+    cache_key = None
+    results = None
+    if result_cache.is_enabled():
+        model_key, model_version = get_model_identity(disease_type, task_type)
+        # Uploads are hashed while streamed to disk; older images are not
+        metadata = image_obj.image_metadata
+        content_hash = isinstance(metadata, dict) and metadata.get("content_hash")
+        if not content_hash:
+            content_hash = result_cache.hash_file(image_obj.image.path)
+        cache_key = (content_hash, model_key, model_version)
+        results = result_cache.get_cached_result(*cache_key)
+
+    cache_hit = results is not None
+    if cache_hit:
+        logger.info(f"Reusing cached MicroNet result for image {image_obj.id}")
+    else:
+        # Classification only needs the inference-ready copy made at upload
+        image_path = image_obj.image.path
+        if task_type == "classification" and image_obj.inference_image:
+            image_path = image_obj.inference_image.path
+
+        # Run AI prediction with MicroNet, on the inference server if configured
+        results = predict_image(disease_type, image_path, task_type)
+        if cache_key and "error" not in results:
+            # Store under the version that actually produced the result
+            content_hash, model_key, model_version = cache_key
+            result_cache.store_result(
+                content_hash,
+                model_key,
+                results.get("model_version", model_version),
+                results,
+            )
+
+    return results, cache_hit
+
+
+def build_analysis_result(
+    image_obj, results: Dict[str, Any], cache_hit: bool, task_type: str
+):
+    """Unsaved AIAnalysisResult for the MicroNet results of one image."""
+    from .models import AIAnalysisResult
+
+    # Prepare metadata
+    metadata = {
+        "framework": "NASA_MicroNet",
+        "encoder": results.get("encoder", "unknown"),
+        "task_type": task_type,
+        "detection_count": len(results.get("detection_regions", [])),
+        "cache_hit": cache_hit,
+        # Cached results carry the timings of the run that produced them
+        "stage_timings": {} if cache_hit else results.get("stage_timings", {}),
+    }
+
+    # Add task-specific metadata
+    if task_type == "classification":
+        metadata["all_probabilities"] = results.get("all_probabilities", {})
+    else:  # segmentation
+        metadata["class_percentages"] = results.get("class_percentages", {})
+        metadata["abnormal_area_percentage"] = results.get(
+            "abnormal_area_percentage", 0
+        )
+
+    confidence = results.get("confidence", 0.0)
+    return AIAnalysisResult(
+        image=image_obj,
+        ai_model_version=results.get("model_version", "micronet_v1.1"),
+        prediction=results.get("prediction", "Unknown"),
+        confidence_score=confidence,
+        confidence_level=AIAnalysisResult.get_confidence_level(confidence),
+        detection_regions=results.get("detection_regions", []),
+        processing_time=results.get("processing_time", 0.0),
+        metadata=metadata,
+    )
+
+
+def get_session_status(results: Dict[str, Any]) -> str:
+    """Session status implied by the MicroNet results of one image."""
+    # Determine confidence level
+    confidence = results.get("confidence", 0.0)
+    confidence_level = (
+        "high" if confidence > 0.8 else "medium" if confidence > 0.6 else "low"
+    )
+
+    if "Error" in results.get("prediction", ""):
+        return "failed"
+    elif confidence_level == "low":
+        return "requires_review"
+    return "completed"
+
+
 @shared_task
 def process_microscopy_image_micronet(image_id: str, task_type: str = "classification"):
     """
@@ -17,7 +122,8 @@ def process_microscopy_image_micronet(image_id: str, task_type: str = "classific
     """
     try:
         from .models import MicroscopyImage, AIAnalysisResult, DiagnosticSession
-        from .ai_inference import predict_image
+        from .ai_inference import summarize_prediction
+        from .metrics import observe_stage_timings, time_stage
 
         # Get image record
         image_obj = MicroscopyImage.objects.get(id=image_id)
@@ -28,54 +134,34 @@ def process_microscopy_image_micronet(image_id: str, task_type: str = "classific
         # Determine disease type from session
         disease_type = getattr(session, "disease_type", "parasite")
 
-        # Run AI prediction with MicroNet
-        results = predict_image(disease_type, image_obj.image.path, task_type)
-
-        # Determine confidence level
-        confidence = results.get("confidence", 0.0)
-        confidence_level = (
-            "high" if confidence > 0.8 else "medium" if confidence > 0.6 else "low"
+        results, cache_hit = analyze_image(image_obj, disease_type, task_type)
+        analysis_result = build_analysis_result(
+            image_obj, results, cache_hit, task_type
         )
 
-        # Prepare metadata
-        metadata = {
-            "framework": "NASA_MicroNet",
-            "encoder": results.get("encoder", "unknown"),
-            "task_type": task_type,
-            "detection_count": len(results.get("detection_regions", [])),
-        }
+        db_timings = {}
+        with time_stage(db_timings, "db_write"), transaction.atomic():
+            # Save AI analysis result
+            analysis_result.save()
+            session.add_result_aggregates([summarize_prediction(results)])
 
-        # Add task-specific metadata
-        if task_type == "classification":
-            metadata["all_probabilities"] = results.get("all_probabilities", {})
-        else:  # segmentation
-            metadata["class_percentages"] = results.get("class_percentages", {})
-            metadata["abnormal_area_percentage"] = results.get(
-                "abnormal_area_percentage", 0
-            )
+            # Update session status based on results; saving only these
+            # fields keeps the aggregates written by concurrent tasks
+            session.status = get_session_status(results)
+            if session.status == "completed":
+                session.completed_at = timezone.now()
 
-        # Save AI analysis result
-        analysis_result = AIAnalysisResult.objects.create(
-            image=image_obj,
-            ai_model_version=results.get("model_version", "micronet_v1.1"),
-            prediction=results.get("prediction", "Unknown"),
-            confidence_score=confidence,
-            confidence_level=confidence_level,
-            detection_regions=results.get("detection_regions", []),
-            processing_time=results.get("processing_time", 0.0),
-            metadata=metadata,
-        )
+            session.save(update_fields=["status", "completed_at", "updated_at"])
 
-        # Update session status based on results
-        if "Error" in results.get("prediction", ""):
-            session.status = "failed"
-        elif confidence_level == "low":
-            session.status = "requires_review"
-        else:
-            session.status = "completed"
-            session.completed_at = timezone.now()
+        # The write time is only known once the row exists
+        observe_stage_timings(db_timings)
+        metadata = analysis_result.metadata
+        metadata["stage_timings"]["db_write"] = round(db_timings["db_write"], 4)
+        AIAnalysisResult.objects.filter(pk=analysis_result.pk).update(
+            metadata=metadata, updated_at=timezone.now()
+        )
 
-        session.save()
+        result_push.publish_results(session.id, [analysis_result], session.status)
 
         logger.info(
             f"Successfully processed image {image_id}: {results.get('prediction')}"
@@ -85,7 +171,7 @@ def process_microscopy_image_micronet(image_id: str, task_type: str = "classific
             "status": "success",
             "image_id": image_id,
             "prediction": results.get("prediction"),
-            "confidence": confidence,
+            "confidence": results.get("confidence", 0.0),
             "task_type": task_type,
             "analysis_id": str(analysis_result.id),
         }
@@ -98,8 +184,105 @@ def process_microscopy_image_micronet(image_id: str, task_type: str = "classific
             image_obj = MicroscopyImage.objects.get(id=image_id)
             session = image_obj.session
             session.status = "failed"
-            session.save()
+            session.save(update_fields=["status", "updated_at"])
         except:
             pass
 
         return {"status": "error", "image_id": image_id, "error": str(e)}
+
+
+@shared_task
+def process_microscopy_image_batch(
+    image_ids: List[str], task_type: str = "classification"
+):
+    """
+    Async task to process a batch upload of one session in a single pass:
+    every image is analysed in turn, all results are written with one bulk
+    insert and the session status is updated once.
+    """
+    from .models import MicroscopyImage, AIAnalysisResult, DiagnosticSession
+    from .ai_inference import summarize_prediction
+    from .metrics import observe_stage_timings, time_stage
+    from . import response_cache
+
+    session = None
+    try:
+        # Images that already have a result (e.g. on retry) are skipped
+        images = list(
+            MicroscopyImage.objects.select_related("session").filter(
+                id__in=image_ids, aianalysisresult__isnull=True
+            )
+        )
+        if not images:
+            return {"status": "success", "processed": 0, "task_type": task_type}
+
+        session = images[0].session
+        disease_type = getattr(session, "disease_type", "parasite")
+        logger.info(
+            f"Processing batch of {len(images)} images for session {session.id} "
+            f"with MicroNet ({task_type})"
+        )
+
+        analysis_results = []
+        summaries = []
+        statuses = []
+        for image_obj in images:
+            try:
+                results, cache_hit = analyze_image(image_obj, disease_type, task_type)
+            except Exception as e:
+                # One unreadable image must not fail the rest of the batch
+                logger.error(f"Failed to process image {image_obj.id}: {e}")
+                results, cache_hit = {"prediction": "Error", "error": str(e)}, False
+
+            analysis_results.append(
+                build_analysis_result(image_obj, results, cache_hit, task_type)
+            )
+            summaries.append(summarize_prediction(results))
+            statuses.append(get_session_status(results))
+
+        db_timings = {}
+        with time_stage(db_timings, "db_write"), transaction.atomic():
+            AIAnalysisResult.objects.bulk_create(analysis_results)
+            session.add_result_aggregates(summaries)
+            # bulk_create sends no post_save; the session save below does
+            response_cache.invalidate(
+                image_ids=[result.image_id for result in analysis_results]
+            )
+
+            # The session needs review as soon as one image does
+            if all(status == "failed" for status in statuses):
+                session.status = "failed"
+            elif any(status != "completed" for status in statuses):
+                session.status = "requires_review"
+            else:
+                session.status = "completed"
+                session.completed_at = timezone.now()
+            session.save(update_fields=["status", "completed_at", "updated_at"])
+
+        observe_stage_timings(db_timings)
+        result_push.publish_results(session.id, analysis_results, session.status)
+        logger.info(
+            f"Successfully processed batch of {len(images)} images for session "
+            f"{session.id} in {db_timings['db_write']:.3f}s of DB writes"
+        )
+
+        return {
+            "status": "success",
+            "session_id": str(session.id),
+            "processed": len(analysis_results),
+            "task_type": task_type,
+            "predictions": {
+                str(result.image_id): result.prediction for result in analysis_results
+            },
+        }
+
+    except Exception as e:
+        logger.error(f"Failed to process image batch {image_ids}: {e}")
+
+        if session is not None:
+            DiagnosticSession.objects.filter(pk=session.pk).update(
+                status="failed", updated_at=timezone.now()
+            )
+            response_cache.invalidate(session_ids=[session.pk])
+
+        return {"status": "error", "image_ids": image_ids, "error": str(e)}
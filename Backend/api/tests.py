@@ -0,0 +1,1440 @@
+# ==============================================================================
+# tests.py - Regression Tests for the Session and Result Endpoints
+# ==============================================================================
+
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+import cv2
+import numpy as np
+import pretrained_microscopy_models as pmm
+import torch
+import torch.nn as nn
+import torchvision.transforms as transforms
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from . import response_cache, result_cache
+from .ai_inference import (
+    IMAGENET_MEAN,
+    IMAGENET_STD,
+    INPUT_SIZE,
+    InferenceBatcher,
+    MODEL_CONFIGS,
+    MicroscopyModelManager,
+    OnnxRuntimeModel,
+    ends_in_softmax,
+    get_model_identity,
+    microscopy_model_manager,
+)
+from .cpu_threads import plan_worker_threads
+from .inference_client import InferenceClient, InferenceServerError
+from .inference_server import InferenceServer
+from . import metrics
+from .metrics import (
+    collect_batching_snapshots,
+    collect_result_cache_stats,
+    collect_stage_snapshots,
+    observe_stage_timings,
+    render_prometheus,
+)
+from .model_export import export_model, get_report_path, read_export_report
+from .mobile_views import mobile_check_micronet_result
+from .tasks import process_microscopy_image_batch, process_microscopy_image_micronet
+from .model_registry import ModelRegistry, measure_model_bytes
+from .preprocessing import ImagePreprocessor
+from .uploads import get_content_hash, prepare_image_upload
+from .weight_store import WeightStore, WeightStoreError
+from .models import (
+    AIAnalysisResult,
+    DiagnosticSession,
+    ExpertReview,
+    HealthFacility,
+    InferenceCacheEntry,
+    MicroscopyImage,
+    Patient,
+)
+
+
+class DiagnosticSessionQueryCountTests(TestCase):
+    """The session endpoints must not issue queries per session or image."""
+
+    def create_sessions(self, count: int, images_per_session: int = 2):
+        sessions = []
+        for i in range(count):
+            facility = HealthFacility.objects.create(
+                name=f"Clinic {i}", location="Windhoek", facility_type="clinic"
+            )
+            patient = Patient.objects.create(
+                patient_id=f"P-{DiagnosticSession.objects.count()}-{i}",
+                age=30,
+                gender="F",
+                facility=facility,
+            )
+            session = DiagnosticSession.objects.create(
+                patient=patient, disease_type="parasites", status="completed"
+            )
+            for j in range(images_per_session):
+                image = MicroscopyImage.objects.create(
+                    session=session, image=f"microscopy_images/{i}_{j}.png"
+                )
+                AIAnalysisResult.objects.create(
+                    image=image,
+                    prediction="Normal",
+                    confidence_score=0.95,
+                    processing_time=0.1,
+                )
+            sessions.append(session)
+        return sessions
+
+    def test_list_query_count_does_not_grow_with_sessions(self):
+        self.create_sessions(3)
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/sessions/")
+        self.assertEqual(len(response.json()["results"]), 3)
+
+        self.create_sessions(20)
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/sessions/")
+        self.assertEqual(len(response.json()["results"]), 23)
+
+    def test_list_is_compact_and_cursor_paginated(self):
+        self.create_sessions(5)
+
+        response = self.client.get("/api/sessions/", {"page_size": 2})
+        page = response.json()
+        self.assertEqual(len(page["results"]), 2)
+        self.assertNotIn("images", page["results"][0])
+        self.assertEqual(
+            page["results"][0]["patient"]["facility"]["location"], "Windhoek"
+        )
+
+        seen = [session["id"] for session in page["results"]]
+        while page["next"]:
+            with self.assertNumQueries(1):
+                page = self.client.get(page["next"]).json()
+            seen.extend(session["id"] for session in page["results"])
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_detail_query_count_does_not_grow_with_images(self):
+        small, large = self.create_sessions(1, 1) + self.create_sessions(1, 10)
+
+        # Session with patient and facility, then images, then results
+        # (results without an AI model row skip the ai_model prefetch)
+        with self.assertNumQueries(3):
+            response = self.client.get(f"/api/sessions/{small.id}/")
+        self.assertEqual(len(response.json()["images"]), 1)
+
+        with self.assertNumQueries(3):
+            response = self.client.get(f"/api/sessions/{large.id}/")
+        self.assertEqual(len(response.json()["images"]), 10)
+
+
+class SessionIndexTests(TestCase):
+    """The hot session and image queries are planned on their indexes."""
+
+    def assertUsesIndex(self, queryset, index_name):
+        self.assertIn(index_name, queryset.explain())
+
+    def test_queries_use_indexes(self):
+        sessions = DiagnosticSession.objects.all()
+        self.assertUsesIndex(
+            sessions.order_by("-created_at")[:50], "session_created_idx"
+        )
+        self.assertUsesIndex(
+            sessions.filter(
+                status="requires_review", disease_type="tuberculosis"
+            ).order_by("-created_at")[:50],
+            "session_status_disease_idx",
+        )
+        self.assertUsesIndex(
+            sessions.filter(patient_id=uuid.uuid4(), status="completed").order_by(
+                "-created_at"
+            ),
+            "session_patient_status_idx",
+        )
+        self.assertUsesIndex(
+            MicroscopyImage.objects.filter(session_id=uuid.uuid4()).order_by(
+                "uploaded_at"
+            ),
+            "image_session_uploaded_idx",
+        )
+
+
+class ResultResponseCacheTests(TestCase):
+    """Result payloads are cached, revalidated and dropped on writes."""
+
+    def setUp(self):
+        response_cache.get_cache().clear()
+        facility = HealthFacility.objects.create(
+            name="Clinic", location="Windhoek", facility_type="clinic"
+        )
+        patient = Patient.objects.create(
+            patient_id="P-1", age=30, gender="F", facility=facility
+        )
+        self.session = DiagnosticSession.objects.create(
+            patient=patient, disease_type="parasites", status="processing"
+        )
+        self.image = MicroscopyImage.objects.create(
+            session=self.session, image="microscopy_images/1.png"
+        )
+        self.url = f"/api/sessions/{self.session.id}/results/"
+
+    def create_result(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            return AIAnalysisResult.objects.create(
+                image=image,
+                prediction="Normal",
+                confidence_score=0.95,
+                processing_time=0.1,
+            )
+
+    def check_result(self, **headers):
+        request = APIRequestFactory().get("/", headers=headers)
+        force_authenticate(request, user=User(username="technician"))
+        return mobile_check_micronet_result(request, image_id=self.image.id)
+
+    def test_session_results_revalidate_and_invalidate(self):
+        self.create_result(self.image)
+        response = self.client.get(self.url)
+        etag = response["ETag"]
+        self.session.refresh_from_db()
+        self.assertEqual(
+            response["Last-Modified"],
+            http_date(self.session.updated_at.timestamp()),
+        )
+        # Still processing: not cached, as workers' invalidations never
+        # reach the per-process cache of the web process
+        self.assertIsNone(
+            response_cache.get_cache().get(
+                response_cache.get_session_key(self.session.id)
+            )
+        )
+
+        # A status-only change, as in the batch failure path, moves
+        # Last-Modified on, and is seen through the ETag even within the
+        # same second, as If-None-Match takes precedence
+        last_modified = response["Last-Modified"]
+        DiagnosticSession.objects.filter(pk=self.session.pk).update(
+            status="failed", updated_at=timezone.now() + timedelta(seconds=2)
+        )
+        response = self.client.get(
+            self.url,
+            headers={"If-None-Match": etag, "If-Modified-Since": last_modified},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "failed")
+        self.assertNotEqual(response["Last-Modified"], last_modified)
+        response = self.client.get(
+            self.url, headers={"If-Modified-Since": last_modified}
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            self.url, headers={"If-Modified-Since": http_date(time.time() + 60)}
+        )
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.session.status = "completed"
+            self.session.save(update_fields=["status"])
+        etag = self.client.get(self.url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+        second_image = MicroscopyImage.objects.create(
+            session=self.session, image="microscopy_images/2.png"
+        )
+        self.create_result(second_image)
+        response = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.json()["images"]), 2)
+
+    def test_mobile_result_cached_only_once_finished(self):
+        response = self.check_result()
+        self.assertEqual(response.data["status"], "processing")
+        self.assertNotIn("ETag", response)
+
+        result = self.create_result(self.image)
+        response = self.check_result()
+        self.assertEqual(response.data["status"], "completed")
+        etag = response["ETag"]
+        self.assertEqual(
+            response["Last-Modified"], http_date(result.updated_at.timestamp())
+        )
+        response = self.check_result(**{"If-Modified-Since": response["Last-Modified"]})
+        self.assertEqual(response.status_code, 304)
+
+        with self.assertNumQueries(0):
+            response = self.check_result(**{"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ExpertReview.objects.create(
+                analysis=result, expert_diagnosis="Normal", agrees_with_ai=True
+            )
+        self.assertIsNone(
+            response_cache.get_cache().get(response_cache.get_image_key(self.image.id))
+        )
+
+
+def make_png_upload(name: str) -> SimpleUploadedFile:
+    _, png = cv2.imencode(".png", np.zeros((300, 400, 3), dtype=np.uint8))
+    return SimpleUploadedFile(name, png.tobytes(), content_type="image/png")
+
+
+class BatchUploadTests(TestCase):
+    """Batch uploads enqueue one task, which survives failing images."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        facility = HealthFacility.objects.create(
+            name="Clinic", location="Windhoek", facility_type="clinic"
+        )
+        patient = Patient.objects.create(
+            patient_id="P-1", age=30, gender="F", facility=facility
+        )
+        self.session = DiagnosticSession.objects.create(
+            patient=patient, disease_type="malaria", status="active"
+        )
+
+    def upload_batch(self, count: int):
+        with mock.patch(
+            "api.views.process_microscopy_image_batch.delay",
+            return_value=mock.Mock(id="task-1"),
+        ) as delay:
+            response = self.client.post(
+                f"/api/sessions/{self.session.id}/upload_batch/",
+                {
+                    "images": [make_png_upload(f"{i}.png") for i in range(count)],
+                    "task_type": "segmentation",
+                },
+            )
+        self.assertEqual(response.status_code, 201)
+        return response.json()["image_ids"], delay
+
+    def test_upload_enqueues_every_image_once(self):
+        image_ids, delay = self.upload_batch(3)
+        delay.assert_called_once_with(image_ids, "segmentation")
+        self.assertEqual(
+            sorted(image_ids),
+            sorted(str(pk) for pk in self.session.images.values_list("pk", flat=True)),
+        )
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, "processing")
+
+    def test_failing_image_does_not_fail_the_batch(self):
+        image_ids, _ = self.upload_batch(3)
+
+        def analyze(image_obj, disease_type, task_type):
+            if str(image_obj.id) == image_ids[1]:
+                raise ValueError("unreadable image")
+            return {"prediction": "Normal", "confidence": 0.95}, False
+
+        with mock.patch("api.tasks.analyze_image", side_effect=analyze), mock.patch(
+            "api.tasks.result_push.publish_results"
+        ) as publish:
+            result = process_microscopy_image_batch(image_ids, "segmentation")
+        publish.assert_called_once()
+
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(result["predictions"][image_ids[1]], "Error")
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, "requires_review")
+        self.assertEqual(
+            (self.session.images_processed, self.session.failed_count), (3, 1)
+        )
+
+    def test_failed_write_marks_the_session_failed(self):
+        image_ids, _ = self.upload_batch(2)
+
+        with mock.patch(
+            "api.tasks.analyze_image",
+            return_value=({"prediction": "Normal", "confidence": 0.95}, False),
+        ), mock.patch.object(
+            DiagnosticSession,
+            "add_result_aggregates",
+            side_effect=DatabaseError("database is locked"),
+        ):
+            result = process_microscopy_image_batch(image_ids, "segmentation")
+
+        self.assertEqual(result["status"], "error")
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.status, "failed")
+        # The results were rolled back with the aggregates, so a retry
+        # analyses every image again
+        self.assertFalse(
+            AIAnalysisResult.objects.filter(image__session=self.session).exists()
+        )
+
+
+def make_noise_png(height: int, width: int) -> bytes:
+    """PNG of random pixels, which compresses poorly and so spans chunks."""
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    return cv2.imencode(".png", image)[1].tobytes()
+
+
+class ImageUploadTests(TestCase):
+    """Uploads are hashed while streamed, size limited and get derived copies."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        facility = HealthFacility.objects.create(
+            name="Clinic", location="Windhoek", facility_type="clinic"
+        )
+        patient = Patient.objects.create(
+            patient_id="P-1", age=30, gender="F", facility=facility
+        )
+        self.session = DiagnosticSession.objects.create(
+            patient=patient, disease_type="malaria", status="active"
+        )
+
+    def post(self, action, files):
+        with mock.patch(
+            "api.views.process_microscopy_image_micronet.delay"
+        ) as delay, mock.patch(
+            "api.views.process_microscopy_image_batch.delay",
+            return_value=mock.Mock(id="task-1"),
+        ) as batch_delay:
+            response = self.client.post(
+                f"/api/sessions/{self.session.id}/{action}/", files
+            )
+        return response, delay.call_count + batch_delay.call_count
+
+    def test_upload_is_hashed_while_streamed(self):
+        content = make_noise_png(300, 400)
+        self.assertGreater(len(content), 3 * 64 * 1024)  # several chunks
+        upload = SimpleUploadedFile("cells.png", content, content_type="image/png")
+
+        with mock.patch(
+            "api.views.prepare_image_upload", wraps=prepare_image_upload
+        ) as prepare:
+            response, _ = self.post("upload_image", {"image": upload})
+        self.assertEqual(response.status_code, 201)
+
+        content_hash = hashlib.sha256(content).hexdigest()
+        streamed_file = prepare.call_args.args[0]
+        self.assertEqual(streamed_file.content_hash, content_hash)
+        image = MicroscopyImage.objects.get(pk=response.json()["image_id"])
+        self.assertEqual(
+            image.image_metadata,
+            {"content_hash": content_hash, "width": 400, "height": 300},
+        )
+        # Files that were not streamed through the handler are hashed on demand
+        self.assertEqual(
+            get_content_hash(SimpleUploadedFile("a.png", content)), content_hash
+        )
+
+    def test_derived_inference_copy_and_thumbnail(self):
+        content = make_noise_png(300, 400)
+        response, _ = self.post(
+            "upload_image",
+            {
+                "image": SimpleUploadedFile(
+                    "cells.png", content, content_type="image/png"
+                )
+            },
+        )
+        image = MicroscopyImage.objects.get(pk=response.json()["image_id"])
+
+        # The copy classifies exactly like the original, as it is already
+        # resized the way ImagePreprocessor would and stored losslessly
+        original = cv2.imdecode(np.frombuffer(content, np.uint8), cv2.IMREAD_COLOR)
+        inference_copy = cv2.imread(image.inference_image.path, cv2.IMREAD_COLOR)
+        self.assertEqual(inference_copy.shape[:2], INPUT_SIZE)
+        np.testing.assert_array_equal(
+            inference_copy,
+            cv2.resize(original, INPUT_SIZE[::-1], interpolation=cv2.INTER_AREA),
+        )
+        preprocessor = ImagePreprocessor(INPUT_SIZE, IMAGENET_MEAN, IMAGENET_STD)
+        torch.testing.assert_close(
+            preprocessor.load(image.inference_image.path, reuse_buffer=False)[0],
+            preprocessor.load(image.image.path, reuse_buffer=False)[0],
+        )
+
+        thumbnail = cv2.imread(image.thumbnail.path, cv2.IMREAD_COLOR)
+        self.assertEqual(thumbnail.shape[:2], (192, 256))
+
+    @override_settings(AI_UPLOAD_MAX_FILE_SIZE=100 * 1024)
+    def test_oversize_uploads_are_rejected(self):
+        big = make_noise_png(300, 400)
+        response, enqueued = self.post(
+            "upload_image",
+            {"image": SimpleUploadedFile("big.png", big, content_type="image/png")},
+        )
+        self.assertEqual(response.status_code, 413)
+
+        # The batch names the rejected files and stores none of the others
+        response, batch_enqueued = self.post(
+            "upload_batch",
+            {
+                "images": [
+                    make_png_upload("small.png"),
+                    SimpleUploadedFile("big.png", big, content_type="image/png"),
+                ]
+            },
+        )
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json()["files"], ["big.png"])
+        self.assertEqual((enqueued, batch_enqueued), (0, 0))
+        self.assertFalse(MicroscopyImage.objects.exists())
+
+
+class SessionAggregateTests(TestCase):
+    """Incremental session aggregates match the ones rebuilt from results."""
+
+    AGGREGATES = (
+        "images_processed",
+        "failed_count",
+        "positive_count",
+        "confidence_sum",
+        "worst_class",
+        "worst_severity",
+    )
+
+    def setUp(self):
+        facility = HealthFacility.objects.create(
+            name="Clinic", location="Windhoek", facility_type="clinic"
+        )
+        patient = Patient.objects.create(
+            patient_id="P-1", age=30, gender="F", facility=facility
+        )
+        self.session = DiagnosticSession.objects.create(
+            patient=patient, disease_type="malaria", status="processing"
+        )
+
+    def get_aggregates(self):
+        self.session.refresh_from_db()
+        return {field: getattr(self.session, field) for field in self.AGGREGATES}
+
+    def test_incremental_aggregates_match_rebuild(self):
+        # The most severe class comes before a milder one, and one image fails
+        predictions = [
+            ("Suspicious", 0.65),
+            ("Malaria_Infected", 0.8),
+            ("Normal", 0.9),
+            ("Normal", 0.95),
+            None,
+        ]
+        images = [
+            MicroscopyImage.objects.create(
+                session=self.session, image=f"microscopy_images/{i}.png"
+            )
+            for i in range(len(predictions))
+        ]
+        results_by_image = dict(zip((str(image.id) for image in images), predictions))
+
+        def analyze(image_obj, disease_type, task_type):
+            prediction = results_by_image[str(image_obj.id)]
+            if prediction is None:
+                raise ValueError("unreadable image")
+            return {"prediction": prediction[0], "confidence": prediction[1]}, False
+
+        with mock.patch("api.tasks.analyze_image", side_effect=analyze), mock.patch(
+            "api.tasks.result_push.publish_results"
+        ):
+            for image in images[:3]:
+                process_microscopy_image_micronet(str(image.id))
+            process_microscopy_image_batch([str(image.id) for image in images[3:]])
+
+        aggregates = self.get_aggregates()
+        self.assertEqual(
+            aggregates,
+            {
+                "images_processed": 5,
+                "failed_count": 1,
+                "positive_count": 1,
+                "confidence_sum": mock.ANY,
+                "worst_class": "Malaria_Infected",
+                "worst_severity": 2,
+            },
+        )
+        self.assertAlmostEqual(aggregates["confidence_sum"], 3.3)
+
+        call_command(
+            "rebuild_session_aggregates",
+            session_ids=[str(self.session.id)],
+            stdout=StringIO(),
+        )
+        rebuilt = self.get_aggregates()
+        self.assertAlmostEqual(
+            rebuilt.pop("confidence_sum"), aggregates.pop("confidence_sum")
+        )
+        self.assertEqual(rebuilt, aggregates)
+
+
+@override_settings(AI_RESULT_CACHE_MAX_ENTRIES=2)
+class InferenceResultCacheTests(TestCase):
+    """Predictions are reused per content hash and model version."""
+
+    def setUp(self):
+        metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(metrics_dir.cleanup)
+        metrics_settings = override_settings(AI_METRICS_DIR=metrics_dir.name)
+        metrics_settings.enable()
+        self.addCleanup(metrics_settings.disable)
+        stats = mock.patch.dict(result_cache._stats, hits=0, misses=0, evictions=0)
+        stats.start()
+        self.addCleanup(stats.stop)
+
+    def test_hits_misses_eviction_and_model_version(self):
+        get = result_cache.get_cached_result
+        self.assertIsNone(get("a", "malaria_classification", "v1"))
+        result_cache.store_result("a", "malaria_classification", "v1", {"n": 1})
+        self.assertEqual(get("a", "malaria_classification", "v1"), {"n": 1})
+        # A new model version does not reuse the old predictions
+        self.assertIsNone(get("a", "malaria_classification", "v2"))
+
+        result_cache.store_result("b", "malaria_classification", "v1", {"n": 2})
+        InferenceCacheEntry.objects.filter(content_hash="a").update(
+            last_used_at=InferenceCacheEntry.objects.get(content_hash="b").last_used_at
+            + timedelta(seconds=1)
+        )
+        result_cache.store_result("c", "malaria_classification", "v1", {"n": 3})
+        self.assertEqual(
+            sorted(InferenceCacheEntry.objects.values_list("content_hash", flat=True)),
+            ["a", "c"],
+        )
+
+        # Counted for the scrape endpoint, which runs in another process
+        stats = result_cache.get_cache_stats()
+        self.assertEqual(
+            (stats["hits"], stats["misses"], stats["evictions"]), (1, 2, 1)
+        )
+        self.assertEqual(stats["entries"], 2)
+        response = self.client.get("/api/metrics/")
+        self.assertIn(b"micronet_result_cache_hits_total 1", response.content)
+
+    @override_settings(
+        AI_SEGMENTATION_MODE="tiled",
+        AI_TILE_STREAMING=True,
+        AI_TILE_WINDOW="gaussian",
+        AI_MODEL_QUANTIZATION={"malaria_segmentation": "static"},
+    )
+    def test_cache_key_includes_quantization_and_tiling(self):
+        with mock.patch.object(microscopy_model_manager, "device", torch.device("cpu")):
+            model_key, version = get_model_identity("malaria", "segmentation")
+            with override_settings(AI_TILE_STRIDE=128):
+                _, other_version = get_model_identity("malaria", "segmentation")
+        self.assertEqual(model_key, "malaria_segmentation")
+        self.assertEqual(version, "micronet_v1.1+int8-static+tiled512s256-gaussian")
+
+        # Fits the cache key, and the result version it is copied to
+        max_length = InferenceCacheEntry._meta.get_field("model_version").max_length
+        self.assertEqual(
+            max_length, AIAnalysisResult._meta.get_field("ai_model_version").max_length
+        )
+        self.assertLessEqual(len(version), max_length)
+
+        result_cache.store_result("a", model_key, version, {"n": 1})
+        entry = InferenceCacheEntry.objects.get()
+        entry.full_clean()
+        self.assertEqual(
+            result_cache.get_cached_result("a", model_key, version), {"n": 1}
+        )
+        # Other tiling gives other predictions, so it must not reuse these
+        self.assertIsNone(result_cache.get_cached_result("a", model_key, other_version))
+
+
+@override_settings(AI_RESULT_CACHE_ENABLED=False)
+class StageMetricsTests(TestCase):
+    """Stage timings reach the stored results and the metrics export."""
+
+    STAGES = {"load", "decode", "preprocess", "forward", "postprocess", "db_write"}
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.metrics_dir = os.path.join(tmp_dir.name, "metrics")
+        tmp_settings = override_settings(
+            MEDIA_ROOT=tmp_dir.name, AI_METRICS_DIR=self.metrics_dir
+        )
+        tmp_settings.enable()
+        self.addCleanup(tmp_settings.disable)
+        # Nothing inherited from other tests; the first read publishes this
+        # process's histograms to the new directory
+        metrics.get_stage_histograms()
+        for patcher in (
+            mock.patch.dict(metrics._inherited, clear=True),
+            mock.patch.dict(
+                metrics._process, dirty=True, exported_at=0.0, flush_timer=None
+            ),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.cancel_flush_timer)
+
+        facility = HealthFacility.objects.create(
+            name="Clinic", location="Windhoek", facility_type="clinic"
+        )
+        patient = Patient.objects.create(
+            patient_id="P-1", age=30, gender="F", facility=facility
+        )
+        self.session = DiagnosticSession.objects.create(
+            patient=patient, disease_type="malaria", status="processing"
+        )
+        self.image = MicroscopyImage.objects.create(
+            session=self.session, image=make_png_upload("cells.png")
+        )
+
+    def cancel_flush_timer(self):
+        timer = metrics._process["flush_timer"]
+        if timer is not None:
+            timer.cancel()
+
+    def analyze(self):
+        torch.manual_seed(0)
+        model = nn.Sequential(nn.AdaptiveAvgPool2d(1), nn.Flatten(), nn.Linear(3, 3))
+        model_info = {
+            "model_key": "malaria_classification",
+            "model": model.eval(),
+            "config": MODEL_CONFIGS["malaria_classification"],
+            "task_type": "classification",
+            "model_version": "micronet_v1.1",
+        }
+        with mock.patch.object(
+            microscopy_model_manager, "load_model", return_value=model_info
+        ), mock.patch.object(microscopy_model_manager, "batcher", None), mock.patch(
+            "api.tasks.result_push.publish_results"
+        ):
+            result = process_microscopy_image_micronet(str(self.image.id))
+        self.assertEqual(result["status"], "success")
+        return AIAnalysisResult.objects.get(image=self.image)
+
+    def test_stage_timings_in_results_and_export(self):
+        before = collect_stage_snapshots()
+        analysis = self.analyze()
+        self.assertNotEqual(analysis.prediction, "Error")
+        self.assertEqual(set(analysis.metadata["stage_timings"]), self.STAGES)
+
+        after = collect_stage_snapshots()
+        for stage in self.STAGES:
+            self.assertEqual(after[stage]["count"] - before[stage]["count"], 1)
+        response = self.client.get("/api/metrics/")
+        self.assertIn(
+            f'micronet_inference_stage_seconds_count{{stage="db_write"}} '
+            f'{after["db_write"]["count"]}',
+            response.content.decode(),
+        )
+
+    def test_unwritable_metrics_dir_is_only_logged(self):
+        with override_settings(AI_METRICS_DIR=__file__), self.assertLogs(
+            "api.metrics", "WARNING"
+        ):
+            analysis = self.analyze()
+        self.assertNotEqual(analysis.prediction, "Error")
+        self.session.refresh_from_db()
+        self.assertNotEqual(self.session.status, "failed")
+
+    @override_settings(AI_METRICS_EXPORT_INTERVAL=60)
+    def test_exports_are_throttled(self):
+        observe_stage_timings({"forward": 0.1})
+        path = glob.glob(os.path.join(self.metrics_dir, "*.json"))[0]
+        written = os.stat(path).st_mtime_ns
+
+        observe_stage_timings({"forward": 0.1})
+        self.assertEqual(os.stat(path).st_mtime_ns, written)
+        self.assertIsNotNone(metrics._process["flush_timer"])
+
+        # Reading flushes this process's pending observations
+        forward = collect_stage_snapshots()["forward"]
+        with open(path) as f:
+            self.assertEqual(json.load(f)["stages"]["forward"], forward)
+
+    def test_files_of_exited_processes_are_folded(self):
+        exited = subprocess.Popen(["true"])
+        exited.wait()
+        os.makedirs(self.metrics_dir)
+        dead_path = os.path.join(self.metrics_dir, f"{exited.pid}-dead.json")
+        with open(dead_path, "w") as f:
+            json.dump(
+                {
+                    "stages": {
+                        "forward": {"buckets": {"+Inf": 5}, "sum": 1.0, "count": 5}
+                    },
+                    "result_cache": {"hits": 2, "misses": 0, "evictions": 0},
+                },
+                f,
+            )
+
+        for _ in range(2):
+            self.assertEqual(
+                collect_stage_snapshots()["forward"]["count"],
+                metrics.get_stage_histograms()["forward"].count + 5,
+            )
+            self.assertEqual(
+                collect_result_cache_stats()["hits"],
+                metrics._result_cache_stats.get("hits", 0) + 2,
+            )
+            self.assertFalse(os.path.exists(dead_path))
+
+
+class AsyncMobileViewsTests(TestCase):
+    """The async mobile endpoints behave like their sync counterparts."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        response_cache.get_cache().clear()
+
+        self.user = User.objects.create_user("technician")
+        self.facility = HealthFacility.objects.create(
+            name="Clinic", location="Windhoek", facility_type="clinic"
+        )
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.post(
+            "/api/mobile/async/create-session/", {"patient_id": "P-1"}
+        )
+        self.assertEqual(response.status_code, 403)
+
+        # The result stream is protected like the polling endpoint
+        response = await self.async_client.get(
+            f"/api/mobile/session-events/{uuid.uuid4()}/"
+        )
+        self.assertEqual(response.status_code, 403)
+
+    async def test_create_session_upload_and_result(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post(
+            "/api/mobile/async/create-session/",
+            {"patient_id": "P-1", "age": 30, "gender": "F"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.post(
+            "/api/mobile/async/create-session/",
+            {"patient_id": "P-1", "facility_id": str(self.facility.id)},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        session_id = response.json()["session_id"]
+
+        _, png = cv2.imencode(".png", np.zeros((300, 400, 3), dtype=np.uint8))
+        upload = SimpleUploadedFile(
+            "cells.png", png.tobytes(), content_type="image/png"
+        )
+        with mock.patch(
+            "api.async_mobile_views.process_microscopy_image_micronet.delay",
+            return_value=mock.Mock(id="task-1"),
+        ) as delay:
+            response = await self.async_client.post(
+                "/api/mobile/async/upload-micronet/",
+                {"session_id": session_id, "image": upload},
+            )
+        self.assertEqual(response.status_code, 201)
+        image_id = response.json()["image_id"]
+        delay.assert_called_once_with(image_id, "classification")
+
+        image = await MicroscopyImage.objects.aget(pk=image_id)
+        self.assertTrue(os.path.exists(image.image.path))
+        self.assertTrue(os.path.exists(image.thumbnail.path))
+        self.assertEqual(image.image_metadata["width"], 400)
+        self.assertEqual(image.uploaded_by_name, "technician")
+
+        url = f"/api/mobile/async/result-micronet/{image_id}/"
+        response = await self.async_client.get(url)
+        self.assertEqual(response.json()["status"], "processing")
+
+        await AIAnalysisResult.objects.acreate(
+            image=image, prediction="Normal", confidence_score=0.95, processing_time=0.1
+        )
+        response = await self.async_client.get(url)
+        self.assertEqual(response.json()["result"]["prediction"], "Normal")
+        response = await self.async_client.get(
+            url, headers={"If-None-Match": response["ETag"]}
+        )
+        self.assertEqual(response.status_code, 304)
+
+
+class ImagePreprocessorTests(SimpleTestCase):
+    """The NumPy pipeline reproduces the torchvision transform it replaced."""
+
+    def setUp(self):
+        self.preprocessor = ImagePreprocessor(INPUT_SIZE, IMAGENET_MEAN, IMAGENET_STD)
+        self.transform = transforms.Compose(
+            [
+                transforms.Resize(INPUT_SIZE),
+                transforms.ToTensor(),
+                transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD),
+            ]
+        )
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+
+    def compare(self, image):
+        path = os.path.join(self.tmp_dir, "image.png")
+        cv2.imwrite(path, cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+        actual, decoded = self.preprocessor.load(path, reuse_buffer=False)
+        np.testing.assert_array_equal(decoded, image)
+        expected = self.transform(Image.open(path).convert("RGB"))
+        return (actual - expected).abs().max().item()
+
+    def test_matches_torchvision_at_input_size(self):
+        rng = np.random.default_rng(0)
+        image = rng.integers(0, 256, INPUT_SIZE + (3,), dtype=np.uint8)
+        self.assertLess(self.compare(image), 1e-6)
+
+    def test_area_resize_stays_close_to_torchvision(self):
+        # Area and bilinear interpolation differ, but not on smooth content
+        y, x = np.mgrid[:448, :672]
+        image = np.stack(
+            [x * 255 // 672, y * 255 // 448, (x + y) * 127 // 1120], axis=2
+        ).astype(np.uint8)
+        self.assertLess(self.compare(image), 0.02)
+
+    def test_shared_buffer_is_reused(self):
+        image = np.zeros(INPUT_SIZE + (3,), dtype=np.uint8)
+        first = self.preprocessor.to_tensor(image)
+        second = self.preprocessor.to_tensor(image + 1)
+        self.assertEqual(first.data_ptr(), second.data_ptr())
+        fresh = self.preprocessor.to_tensor(image, reuse_buffer=False)
+        self.assertNotEqual(fresh.data_ptr(), first.data_ptr())
+
+
+class ModelRegistryTests(SimpleTestCase):
+    """Models beyond the memory budget are evicted least recently used first."""
+
+    def add_model(self, registry, model_key, out_features):
+        model = nn.Linear(256, out_features, bias=False)
+        return registry.add(model_key, {"model": model})
+
+    def test_measures_parameters_and_buffers_once(self):
+        model = nn.Sequential(nn.Linear(10, 10), nn.BatchNorm1d(10))
+        model.append(model[0])  # shared module is counted once
+        # Linear and affine weights, running stats, int64 batch counter
+        self.assertEqual(measure_model_bytes(model), (110 + 20 + 20) * 4 + 8)
+
+    def test_evicts_least_recently_used(self):
+        registry = ModelRegistry(budget_bytes=3 * 256 * 100 * 4)
+        self.add_model(registry, "a", 100)
+        self.add_model(registry, "b", 100)
+        self.add_model(registry, "c", 100)
+        registry.get("a")
+
+        self.assertEqual(self.add_model(registry, "d", 100), ["b"])
+        self.assertEqual(self.add_model(registry, "e", 200), ["c", "a"])
+        stats = registry.get_stats()
+        self.assertEqual([model["model_key"] for model in stats["models"]], ["d", "e"])
+        self.assertEqual(stats["evictions"], 3)
+        self.assertLessEqual(stats["resident_bytes"], registry.budget_bytes)
+
+    def test_oversized_model_is_kept_alone(self):
+        registry = ModelRegistry(budget_bytes=256 * 100 * 4)
+        self.add_model(registry, "a", 100)
+        self.assertEqual(self.add_model(registry, "big", 500), ["a"])
+        self.assertIn("big", registry)
+
+
+class WeightStoreTests(SimpleTestCase):
+    """Weights come from the local store and are checked against their hash."""
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.store = WeightStore(tmp_dir.name)
+        self.state_dict = nn.Linear(4, 2).state_dict()
+
+    def test_cache_hit_skips_the_download(self):
+        self.store.add_state_dict("test/linear", self.state_dict, source="test")
+        fetch = mock.Mock()
+        with mock.patch("api.ai_inference.get_weight_store", return_value=self.store):
+            state_dict = MicroscopyModelManager().load_weights("test/linear", fetch)
+
+        fetch.assert_not_called()
+        self.assertEqual(state_dict.keys(), self.state_dict.keys())
+        for key, value in self.state_dict.items():
+            self.assertTrue(torch.equal(state_dict[key], value))
+
+    def test_checksum_mismatch_is_rejected(self):
+        sha256 = self.store.add_state_dict("test/linear", self.state_dict)
+        with open(self.store.object_path(sha256), "ab") as f:
+            f.write(b"corrupt")
+
+        # A fresh store has not verified the object in this process yet
+        store = WeightStore(self.store.root)
+        with self.assertRaisesRegex(WeightStoreError, "Checksum mismatch"):
+            store.load_state_dict("test/linear")
+        self.assertEqual(store.verify(), {"test/linear": False})
+
+    @override_settings(AI_WEIGHTS_OFFLINE=True)
+    def test_missing_weights_offline_raise(self):
+        fetch = mock.Mock()
+        with mock.patch("api.ai_inference.get_weight_store", return_value=self.store):
+            with self.assertRaisesRegex(WeightStoreError, "downloads are disabled"):
+                MicroscopyModelManager().load_weights("test/missing", fetch)
+        fetch.assert_not_called()
+
+    @override_settings(AI_WEIGHTS_OFFLINE=False)
+    def test_missing_weights_online_are_fetched(self):
+        fetch = mock.Mock(return_value=self.state_dict)
+        with mock.patch("api.ai_inference.get_weight_store", return_value=self.store):
+            state_dict = MicroscopyModelManager().load_weights("test/missing", fetch)
+        self.assertIs(state_dict, self.state_dict)
+        fetch.assert_called_once_with()
+
+
+class BatchRecorder(nn.Module):
+    """Identity model recording the size of every batch it runs."""
+
+    def __init__(self):
+        super().__init__()
+        self.batch_sizes = []
+
+    def forward(self, inputs):
+        self.batch_sizes.append(len(inputs))
+        return inputs * 2
+
+
+class InferenceBatcherTests(SimpleTestCase):
+    """Concurrent submits are batched up to the size limit or the wait time."""
+
+    def setUp(self):
+        metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(metrics_dir.cleanup)
+        metrics_settings = override_settings(AI_METRICS_DIR=metrics_dir.name)
+        metrics_settings.enable()
+        self.addCleanup(metrics_settings.disable)
+
+    def test_batches_by_size_and_max_wait(self):
+        model = BatchRecorder()
+        batcher = InferenceBatcher(
+            torch.device("cpu"), max_batch_size=4, max_wait_time=0.2
+        )
+        outputs = {}
+
+        def submit(i):
+            outputs[i] = batcher.submit("model", model, torch.full((3,), float(i)))
+
+        threads = [threading.Thread(target=submit, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(model.batch_sizes, [4])
+        self.assertTrue(all(outputs[i][0, 0] == 2 * i for i in range(4)))
+
+        # A lone request waits for company until max_wait_time, then runs
+        start_time = time.perf_counter()
+        batcher.submit("model", model, torch.zeros(3))
+        self.assertGreaterEqual(time.perf_counter() - start_time, 0.2)
+        self.assertEqual(model.batch_sizes, [4, 1])
+
+        # Published to the metrics snapshots for the scrape endpoint, right
+        # after the callers are woken
+        deadline = time.perf_counter() + 5
+        snapshots = collect_batching_snapshots()
+        while snapshots["batch_size"]["count"] < 2 and time.perf_counter() < deadline:
+            time.sleep(0.01)
+            snapshots = collect_batching_snapshots()
+        self.assertEqual(snapshots["batch_size"]["count"], 2)
+        self.assertEqual(snapshots["batch_size"]["sum"], 5)
+        self.assertEqual(snapshots["batch_size"]["buckets"]["1"], 1)
+        self.assertEqual(snapshots["latency"]["count"], 5)
+        self.assertIn(
+            'micronet_batch_size_bucket{le="4"} 2',
+            render_prometheus({}, batching_snapshots=snapshots),
+        )
+
+    def test_unwritable_metrics_dir_does_not_block_callers(self):
+        model = BatchRecorder()
+        batcher = InferenceBatcher(torch.device("cpu"), max_wait_time=0.01)
+        with override_settings(AI_METRICS_DIR=__file__):
+            output = batcher.submit("model", model, torch.ones(3))
+            # The dispatcher thread survived and still serves requests
+            output = batcher.submit("model", model, torch.ones(3))
+        self.assertEqual(output[0, 0], 2)
+        self.assertEqual(model.batch_sizes, [1, 1])
+
+
+class BrightRegionLogits(nn.Module):
+    """Logits favouring background except where the input is bright."""
+
+    def forward(self, inputs):
+        bright = (inputs[:, :1] > 1.0).float()
+        return torch.cat([torch.full_like(bright, 2.0), 1.0 + 3.0 * bright], dim=1)
+
+
+class SoftmaxHeadSegmenter(nn.Module):
+    """BrightRegionLogits behind a softmax head like pmm's multi-class UNets."""
+
+    def __init__(self):
+        super().__init__()
+        self.logits = BrightRegionLogits()
+        self.segmentation_head = nn.Sequential(nn.Identity(), nn.Softmax(dim=1))
+
+    def forward(self, inputs):
+        return self.segmentation_head(self.logits(inputs))
+
+
+class TiledSegmentationTests(SimpleTestCase):
+    """Tiled segmentation takes the most probable class of the model logits."""
+
+    def segment(self, image, **tile_settings):
+        model_info = {
+            "model": BrightRegionLogits(),
+            "config": MODEL_CONFIGS["general_segmentation"],
+        }
+        with override_settings(AI_TILE_SIZE=128, AI_TILE_STRIDE=64, **tile_settings):
+            mask = microscopy_model_manager.segment_tiled(model_info, image)
+        self.assertEqual(mask.shape, image.shape[:2])
+        return microscopy_model_manager.analyze_segmentation_mask(
+            mask, model_info["config"]
+        )
+
+    def tile_predictor(self, model):
+        model_info = {
+            "model": model,
+            "config": MODEL_CONFIGS["general_segmentation"],
+            "outputs_probabilities": ends_in_softmax(model),
+        }
+        with mock.patch(
+            "pretrained_microscopy_models.segmentation_training.segmentation_models_inference"
+        ) as inference:
+            microscopy_model_manager.segment_tiled(model_info, np.zeros((8, 8, 3)))
+        return inference.call_args.args[1]
+
+    def test_softmax_is_applied_once(self):
+        pmm_unet = pmm.segmentation_training.create_segmentation_model(
+            "Unet", "resnet18", None, classes=3
+        )
+        self.assertTrue(ends_in_softmax(pmm_unet))
+        self.assertFalse(ends_in_softmax(BrightRegionLogits()))
+
+        tiles = torch.rand(2, 3, 16, 16) * 2
+        expected = torch.softmax(BrightRegionLogits()(tiles), dim=1)
+        for model in (BrightRegionLogits(), SoftmaxHeadSegmenter()):
+            predict = self.tile_predictor(model)
+            torch.testing.assert_close(predict(tiles), expected)
+
+    def test_blank_and_bright_regions(self):
+        image = np.zeros((300, 400, 3), dtype=np.uint8)
+        for streaming in (False, True):
+            analysis = self.segment(image, AI_TILE_STREAMING=streaming)
+            self.assertEqual(analysis["prediction"], "Normal")
+
+            image_with_region = image.copy()
+            image_with_region[100:200, 100:300] = 255
+            analysis = self.segment(image_with_region, AI_TILE_STREAMING=streaming)
+            self.assertEqual(analysis["prediction"], "Abnormal_Region Detected")
+            self.assertAlmostEqual(
+                analysis["class_percentages"]["Abnormal_Region"], 100 / 6, delta=0.5
+            )
+
+    @override_settings(AI_SEGMENTATION_MODE="tiled", AI_TILE_STREAMING=False)
+    def test_tiling_is_part_of_the_model_version(self):
+        self.assertEqual(
+            get_model_identity("general", "segmentation")[1],
+            "micronet_v1.1+tiled512s256",
+        )
+        self.assertEqual(
+            get_model_identity("general", "classification")[1], "micronet_v1.1"
+        )
+
+
+class TileStitchingTests(SimpleTestCase):
+    """
+    Tiles stitched into the preallocated output match an untiled forward
+    pass, which a per-pixel model makes exact for any correct stitching.
+    """
+
+    def setUp(self):
+        torch.manual_seed(0)
+        self.model = nn.Sequential(nn.Conv2d(3, 3, 1), nn.Sigmoid()).eval()
+        rng = np.random.default_rng(0)
+        self.image = rng.integers(0, 256, (150, 230, 3), dtype=np.uint8)
+
+    def normalize(self, image):
+        return image.astype(np.float32) / 255.0 - 0.5
+
+    def reference_scores(self):
+        inputs = torch.from_numpy(self.normalize(self.image).transpose(2, 0, 1))
+        with torch.no_grad():
+            return self.model(inputs[None])[0].numpy().transpose(1, 2, 0)
+
+    def infer(self, **kwargs):
+        return pmm.segmentation_training.segmentation_models_inference(
+            self.image,
+            self.model,
+            self.normalize,
+            device=torch.device("cpu"),
+            batch_size=5,
+            patch_size=64,
+            stride_size=32,
+            num_classes=3,
+            **kwargs,
+        )
+
+    def test_class_ids_match_untiled_forward(self):
+        class_ids = self.infer(return_class_ids=True)
+        self.assertEqual(class_ids.dtype, np.uint8)
+        np.testing.assert_array_equal(class_ids, self.reference_scores().argmax(axis=2))
+
+    def test_masks_match_untiled_forward(self):
+        scores = self.reference_scores()
+        np.testing.assert_array_equal(self.infer(), scores[:, :, 1:].round() > 0)
+        np.testing.assert_array_equal(
+            self.infer(probabilities=[0.3, 0.6]),
+            np.stack([scores[:, :, 1] > 0.3, scores[:, :, 2] > 0.6], axis=2),
+        )
+
+    def test_memory_mapped_output(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "scores.npy")
+            class_ids = self.infer(output_path=path, return_class_ids=True)
+            self.assertTrue(os.path.exists(path))
+        np.testing.assert_array_equal(class_ids, self.reference_scores().argmax(axis=2))
+
+    def test_streaming_blends_to_the_untiled_forward(self):
+        # Blending identical overlapping predictions leaves them unchanged
+        scores = self.reference_scores()
+        for window in ("cosine", "gaussian"):
+            class_ids = self.infer(streaming=True, window=window, return_class_ids=True)
+            np.testing.assert_array_equal(class_ids, scores.argmax(axis=2))
+            np.testing.assert_array_equal(
+                self.infer(streaming=True, window=window, probabilities=[0.3, 0.6]),
+                np.stack([scores[:, :, 1] > 0.3, scores[:, :, 2] > 0.6], axis=2),
+            )
+
+    def test_streaming_between_memory_mapped_arrays(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            image_path = os.path.join(tmp_dir, "image.npy")
+            np.save(image_path, self.image)
+            self.image = np.load(image_path, mmap_mode="r")
+            output_path = os.path.join(tmp_dir, "class_ids.npy")
+            class_ids = self.infer(
+                streaming=True, output_path=output_path, return_class_ids=True
+            )
+            self.assertIsInstance(class_ids, np.memmap)
+            self.image = np.asarray(self.image)
+            np.testing.assert_array_equal(
+                class_ids, self.reference_scores().argmax(axis=2)
+            )
+            del class_ids
+
+
+class ModelExportTests(SimpleTestCase):
+    """Exported models match eager outputs and are picked by the backend."""
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        settings_override = override_settings(AI_EXPORT_PATH=tmp_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        torch.manual_seed(0)
+        model = nn.Sequential(
+            nn.Conv2d(3, 8, 3, padding=1), nn.ReLU(), nn.Conv2d(8, 2, 1)
+        ).eval()
+        self.config = {"version": "test_v1", "encoder": "tiny", "num_classes": 2}
+        self.model_info = {
+            "model_key": "test_segmentation",
+            "model": model,
+            "config": self.config,
+            "task_type": "segmentation",
+        }
+
+    def test_onnx_segmentation_round_trip(self):
+        report = export_model(self.model_info, "onnx", runs=1)
+        self.assertTrue(report["equivalent"])
+        self.assertTrue(report["dynamic_spatial"])
+
+        manager = MicroscopyModelManager()
+        with override_settings(AI_SEGMENTATION_MODE="tiled"):
+            exported = manager.load_exported_model(
+                "test_segmentation", "onnxruntime", self.config, "segmentation"
+            )
+        self.assertIsInstance(exported, OnnxRuntimeModel)
+
+        # Runs on tiles of any size, not only the 224x224 export input
+        tiles = torch.randn(3, 3, 96, 160)
+        with torch.no_grad():
+            expected = self.model_info["model"](tiles)
+        torch.testing.assert_close(exported(tiles), expected, atol=1e-4, rtol=1e-4)
+
+    def test_stale_or_fixed_size_exports_fall_back_to_eager(self):
+        export_model(self.model_info, "onnx", runs=1)
+        manager = MicroscopyModelManager()
+
+        newer = dict(self.config, version="test_v2")
+        self.assertIsNone(
+            manager.load_exported_model(
+                "test_segmentation", "onnxruntime", newer, "segmentation"
+            )
+        )
+
+        # Reports written before exports had dynamic height and width
+        report_path = get_report_path("test_segmentation", "onnx")
+        report = read_export_report("test_segmentation", "onnx")
+        del report["dynamic_spatial"]
+        report_path.write_text(json.dumps(report))
+        with override_settings(AI_SEGMENTATION_MODE="tiled"):
+            self.assertIsNone(
+                manager.load_exported_model(
+                    "test_segmentation", "onnxruntime", self.config, "segmentation"
+                )
+            )
+        with override_settings(AI_SEGMENTATION_MODE="resize"):
+            self.assertIsNotNone(
+                manager.load_exported_model(
+                    "test_segmentation", "onnxruntime", self.config, "segmentation"
+                )
+            )
+
+
+class QuantizationModeTests(SimpleTestCase):
+    """Models are only tagged as quantized when the mode converts them."""
+
+    @override_settings(
+        AI_MODEL_QUANTIZATION={
+            "malaria_classification": "dynamic",
+            "malaria_segmentation": "dynamic",
+            "general_segmentation": "static",
+        }
+    )
+    def test_dynamic_mode_leaves_segmentation_models_untagged(self):
+        self.assertEqual(
+            get_model_identity("malaria", "classification")[1],
+            "micronet_v1.1+int8-dynamic",
+        )
+        self.assertEqual(
+            get_model_identity("malaria", "segmentation")[1], "micronet_v1.1"
+        )
+        self.assertEqual(
+            get_model_identity("general", "segmentation")[1],
+            "micronet_v1.1+int8-static",
+        )
+
+
+class ModelPreloadTests(SimpleTestCase):
+    """Preloading stops at the memory budget instead of evicting models."""
+
+    @override_settings(AI_MODEL_MEMORY_BUDGET_MB=2.5 * 9472 * 4 / 2**20)
+    def test_preload_respects_the_budget(self):
+        manager = MicroscopyModelManager()
+        targets = manager.get_preload_targets()
+        self.assertGreater(len(targets), 3)
+
+        # 9472 float parameters each, so two and a half fit the budget
+        with mock.patch.object(
+            manager,
+            "build_eager_model",
+            side_effect=lambda config, task_type: nn.Conv2d(3, 64, 7).eval(),
+        ) as build:
+            load_stats = manager.preload_models()
+
+        self.assertEqual(build.call_count, 3)
+        self.assertEqual(len(load_stats), 3)
+        stats = manager.models.get_stats()
+        self.assertEqual(stats["evictions"], 1)
+        self.assertLessEqual(stats["resident_bytes"], stats["budget_bytes"])
+
+
+class WorkerThreadPlanTests(SimpleTestCase):
+    """Pool processes split the CPUs instead of each using all of them."""
+
+    def test_cpus_are_divided_between_workers(self):
+        cpus = [0, 1, 2, 3, 4, 5, 6, 7]
+        plans = [plan_worker_threads(i, 4, cpus) for i in range(4)]
+        self.assertEqual([plan["threads"] for plan in plans], [2, 2, 2, 2])
+        self.assertEqual(plans[3]["cpus"], [6, 7])
+
+        # More workers than CPUs: one thread each, slices wrap around
+        self.assertEqual(plan_worker_threads(5, 4, [0, 1, 2, 3])["cpus"], [1])
+        # An explicit thread count is kept
+        self.assertEqual(plan_worker_threads(0, 4, cpus, threads=8)["threads"], 8)
+
+
+class FakeModelManager:
+    """Stands in for MicroscopyModelManager, echoing predict requests."""
+
+    def __init__(self):
+        self.batcher = self
+        self.models = ModelRegistry()
+        self.requests = []
+
+    def predict_image(self, disease_type, image_path, task_type):
+        self.requests.append((disease_type, image_path, task_type))
+        if not os.path.exists(image_path):
+            return {"prediction": "Error", "error": "missing image"}
+        return {"prediction": "Normal", "confidence": 0.9}
+
+    def get_stats(self):
+        return {"batch_size": {"sum": 0, "count": 0}}
+
+
+class InferenceServerTests(SimpleTestCase):
+    """Predictions round-trip over the inference server's Unix socket."""
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.socket_path = os.path.join(tmp_dir.name, "inference.sock")
+        self.manager = FakeModelManager()
+        self.server = InferenceServer(self.socket_path, self.manager)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.client = InferenceClient(self.socket_path, timeout=5)
+        self.addCleanup(self.client.close)
+
+    def test_predict_and_stats(self):
+        result = self.client.call(
+            "predict",
+            disease_type="malaria",
+            image_path=__file__,
+            task_type="classification",
+        )
+        self.assertEqual(result, {"prediction": "Normal", "confidence": 0.9})
+        self.client.call("predict", disease_type="malaria", image_path="/missing.png")
+
+        stats = self.client.call("stats")
+        self.assertEqual((stats["requests"], stats["failures"]), (2, 1))
+        self.assertEqual(self.manager.requests[1][2], "classification")
+
+    def test_errors_are_raised_and_connection_reused(self):
+        with self.assertRaises(InferenceServerError):
+            self.client.call("reload")
+        self.assertEqual(self.client.call("ping"), "pong")
+
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.assertFalse(os.path.exists(self.socket_path))
+        with self.assertRaises(InferenceServerError):
+            self.client.call("ping")
@@ -0,0 +1,147 @@
+# ==============================================================================
+# uploads.py - Streaming, Size-Limited Image Uploads with Derived Copies
+# ==============================================================================
+
+import hashlib
+import logging
+import os
+from typing import Any, Dict, List, Tuple
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+
+logger = logging.getLogger(__name__)
+
+# Height and width of the inference-ready copy: the classifier input size
+# (ai_inference.INPUT_SIZE), repeated so web processes need not import torch
+INFERENCE_COPY_SIZE = (224, 224)
+
+THUMBNAIL_JPEG_QUALITY = 85
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams every uploaded file to a temporary file in chunks while computing
+    its SHA-256, so the content hash is known without reading the file again.
+    Files larger than AI_UPLOAD_MAX_FILE_SIZE are dropped as they arrive and
+    reported by get_rejected_uploads().
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_size = getattr(settings, "AI_UPLOAD_MAX_FILE_SIZE", 50 * 1024 * 1024)
+        self.rejected = []
+
+    def new_file(self, field_name, file_name, content_type, content_length, *args):
+        # The temporary file is created first so SkipFile only discards it
+        super().new_file(field_name, file_name, content_type, content_length, *args)
+        self.digest = hashlib.sha256()
+        self.received = 0
+        if content_length is not None and content_length > self.max_size:
+            self.reject()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self.reject()
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded_file = super().file_complete(file_size)
+        uploaded_file.content_hash = self.digest.hexdigest()
+        return uploaded_file
+
+    def reject(self):
+        logger.warning(
+            f"Rejected upload {self.file_name}: larger than {self.max_size} bytes"
+        )
+        self.rejected.append(self.file_name)
+        raise SkipFile()
+
+
+def get_rejected_uploads(request) -> List[str]:
+    """Names of the files of a request dropped for exceeding the size limit."""
+    return [
+        file_name
+        for handler in request.upload_handlers
+        if isinstance(handler, HashingUploadHandler)
+        for file_name in handler.rejected
+    ]
+
+
+def decode_upload(uploaded_file) -> np.ndarray:
+    """Decode an uploaded image into a BGR uint8 array."""
+    if hasattr(uploaded_file, "temporary_file_path"):
+        image = cv2.imread(uploaded_file.temporary_file_path(), cv2.IMREAD_COLOR)
+    else:
+        uploaded_file.seek(0)
+        data = np.frombuffer(uploaded_file.read(), dtype=np.uint8)
+        uploaded_file.seek(0)
+        image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+    if image is None:
+        raise ValueError(f"Could not decode image {uploaded_file.name}")
+    return image
+
+
+def get_content_hash(uploaded_file) -> str:
+    """SHA-256 of an upload, computed while streaming when possible."""
+    content_hash = getattr(uploaded_file, "content_hash", None)
+    if content_hash is None:
+        digest = hashlib.sha256()
+        for chunk in uploaded_file.chunks():
+            digest.update(chunk)
+        content_hash = digest.hexdigest()
+    return content_hash
+
+
+def prepare_image_upload(
+    uploaded_file,
+) -> Tuple[Dict[str, Any], ContentFile, ContentFile]:
+    """
+    Decode an upload once and derive everything later stages need from it:
+    metadata (content hash, dimensions), an inference-ready copy at the
+    classifier input size and a thumbnail. Raises ValueError when the file
+    is not a decodable image.
+    """
+    image = decode_upload(uploaded_file)
+    height, width = image.shape[:2]
+    stem = os.path.splitext(os.path.basename(uploaded_file.name))[0]
+
+    # Same interpolation as ImagePreprocessor.resize, stored losslessly, so
+    # classifying the copy gives exactly the result of the original
+    input_height, input_width = INFERENCE_COPY_SIZE
+    inference_image = cv2.resize(
+        image, (input_width, input_height), interpolation=cv2.INTER_AREA
+    )
+    ok, inference_png = cv2.imencode(".png", inference_image)
+    if not ok:
+        raise ValueError(f"Could not encode inference copy of {uploaded_file.name}")
+
+    thumbnail_size = getattr(settings, "AI_UPLOAD_THUMBNAIL_SIZE", 256)
+    scale = min(1.0, thumbnail_size / max(height, width))
+    thumbnail = cv2.resize(
+        image,
+        (max(1, round(width * scale)), max(1, round(height * scale))),
+        interpolation=cv2.INTER_AREA,
+    )
+    ok, thumbnail_jpeg = cv2.imencode(
+        ".jpg", thumbnail, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_JPEG_QUALITY]
+    )
+    if not ok:
+        raise ValueError(f"Could not encode thumbnail of {uploaded_file.name}")
+
+    metadata = {
+        "content_hash": get_content_hash(uploaded_file),
+        "width": width,
+        "height": height,
+    }
+    return (
+        metadata,
+        ContentFile(inference_png.tobytes(), name=f"{stem}.png"),
+        ContentFile(thumbnail_jpeg.tobytes(), name=f"{stem}.jpg"),
+    )
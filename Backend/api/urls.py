@@ -4,10 +4,16 @@
 
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import DiagnosticSessionViewSet, PatientViewSet
+from .views import DiagnosticSessionViewSet, PatientViewSet, inference_metrics
+from .async_mobile_views import (
+    async_check_micronet_result,
+    async_create_diagnostic_session,
+    async_upload_image_micronet,
+)
 from .mobile_views import (
     mobile_upload_image_micronet,
     mobile_check_micronet_result,
+    mobile_session_events,
     create_diagnostic_session,
     mobile_upload_image,  # Legacy
     mobile_check_result,  # Legacy
@@ -31,7 +37,29 @@ urlpatterns = [
         mobile_check_micronet_result,
         name="mobile_result_micronet",
     ),
+    path(
+        "mobile/session-events/<uuid:session_id>/",
+        mobile_session_events,
+        name="mobile_session_events",
+    ),
     path("mobile/create-session/", create_diagnostic_session, name="create_session"),
+    # Async versions of the mobile endpoints, for the ASGI application
+    path(
+        "mobile/async/upload-micronet/",
+        async_upload_image_micronet,
+        name="async_mobile_upload_micronet",
+    ),
+    path(
+        "mobile/async/result-micronet/<uuid:image_id>/",
+        async_check_micronet_result,
+        name="async_mobile_result_micronet",
+    ),
+    path(
+        "mobile/async/create-session/",
+        async_create_diagnostic_session,
+        name="async_create_session",
+    ),
+    path("metrics/", inference_metrics, name="inference_metrics"),
     # Legacy endpoints (for backward compatibility)
     path("mobile/upload-image/", mobile_upload_image, name="mobile_upload_image"),
     path(
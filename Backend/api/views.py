@@ -5,12 +5,25 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.http import HttpResponse, HttpResponseForbidden
+from django.conf import settings
 from django.shortcuts import get_object_or_404
 from django.db import transaction
-from .tasks import process_microscopy_image_micronet
+from . import response_cache, result_cache
+from .metrics import (
+    collect_batching_snapshots,
+    collect_model_registry_stats,
+    collect_stage_snapshots,
+    render_prometheus,
+)
+from .pagination import SessionCursorPagination
+from .tasks import process_microscopy_image_micronet, process_microscopy_image_batch
+from .uploads import get_rejected_uploads, prepare_image_upload
 from .models import DiagnosticSession, MicroscopyImage, Patient
 from .serializers import (
     DiagnosticSessionSerializer,
+    DiagnosticSessionListSerializer,
+    SessionSummarySerializer,
     PatientSerializer,
     MicroscopyImageSerializer,
 )
@@ -18,14 +31,32 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Session statuses no inference task moves on from
+FINAL_SESSION_STATUSES = ("completed", "failed", "requires_review")
+
+# Addresses allowed to scrape metrics without a staff login
+LOCAL_ADDRESSES = ("127.0.0.1", "::1")
+
 
 class DiagnosticSessionViewSet(viewsets.ModelViewSet):
     """ViewSet for managing diagnostic sessions."""
 
-    queryset = DiagnosticSession.objects.select_related(
-        "patient", "technician"
-    ).prefetch_related("images__aianalysisresult")
+    queryset = DiagnosticSession.objects.select_related("patient__facility")
     serializer_class = DiagnosticSessionSerializer
+    pagination_class = SessionCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Listings leave out per-image payloads, so only detail views
+        # need the images and their results
+        if self.action != "list":
+            queryset = queryset.prefetch_related("images__aianalysisresult__ai_model")
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == "list":
+            return DiagnosticSessionListSerializer
+        return super().get_serializer_class()
 
     def perform_create(self, serializer):
         """Automatically save without needing a logged-in user."""
@@ -38,23 +69,44 @@ class DiagnosticSessionViewSet(viewsets.ModelViewSet):
         session = get_object_or_404(DiagnosticSession, pk=pk)
 
         if "image" not in request.FILES:
+            if get_rejected_uploads(request):
+                return Response(
+                    {"error": "Image is too large"},
+                    status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                )
             return Response(
                 {"error": "No image provided"}, status=status.HTTP_400_BAD_REQUEST
             )
 
+        image_file = request.FILES["image"]
+        try:
+            upload_metadata, inference_image, thumbnail = prepare_image_upload(
+                image_file
+            )
+        except ValueError:
+            return Response(
+                {"error": "Could not decode image"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        metadata = request.data.get("metadata", {})
+        if not isinstance(metadata, dict):
+            # Multipart requests carry client metadata as a plain string
+            metadata = {"metadata": metadata}
+
         # Create image record without requiring a user
         image = MicroscopyImage.objects.create(
             session=session,
-            image=request.FILES["image"],
-            image_metadata=request.data.get("metadata", {}),
-            uploaded_by=None,  # No authentication needed
+            image=image_file,
+            inference_image=inference_image,
+            thumbnail=thumbnail,
+            image_metadata={**metadata, **upload_metadata},
         )
 
         task_type = request.data.get("task_type", "classification")
         process_microscopy_image_micronet.delay(str(image.id), task_type)
 
         session.status = "processing"
-        session.save(update_fields=["status"])
+        session.save(update_fields=["status", "updated_at"])
 
         return Response(
             {
@@ -67,19 +119,156 @@ class DiagnosticSessionViewSet(viewsets.ModelViewSet):
             status=status.HTTP_201_CREATED,
         )
 
+    @action(detail=True, methods=["post"])
+    def upload_batch(self, request, pk=None):
+        """
+        Upload many microscopy images (repeated "images" fields) into one
+        session and analyse all of them with a single batched task.
+        """
+        session = get_object_or_404(DiagnosticSession, pk=pk)
+
+        image_files = request.FILES.getlist("images")
+        rejected_files = get_rejected_uploads(request)
+        if rejected_files:
+            return Response(
+                {"error": "Images are too large", "files": rejected_files},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+        if not image_files:
+            return Response(
+                {"error": "No images provided"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        max_images = getattr(settings, "AI_BATCH_UPLOAD_MAX_IMAGES", 200)
+        if len(image_files) > max_images:
+            return Response(
+                {"error": f"At most {max_images} images can be uploaded at once"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        invalid_files = [
+            image_file.name
+            for image_file in image_files
+            if not (image_file.content_type or "").startswith("image/")
+        ]
+        if invalid_files:
+            return Response(
+                {"error": "Invalid file type, expected images", "files": invalid_files},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        task_type = request.data.get("task_type", "classification")
+        if task_type not in ["classification", "segmentation"]:
+            return Response(
+                {"error": 'task_type must be "classification" or "segmentation"'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        images = []
+        undecodable_files = []
+        for image_file in image_files:
+            try:
+                upload_metadata, inference_image, thumbnail = prepare_image_upload(
+                    image_file
+                )
+            except ValueError:
+                undecodable_files.append(image_file.name)
+                continue
+            images.append(
+                MicroscopyImage(
+                    session=session,
+                    image=image_file,
+                    inference_image=inference_image,
+                    thumbnail=thumbnail,
+                    image_metadata={
+                        "uploaded_via": "batch_upload",
+                        "task_type": task_type,
+                        "file_size": image_file.size,
+                        "content_type": image_file.content_type,
+                        **upload_metadata,
+                    },
+                )
+            )
+        if undecodable_files:
+            return Response(
+                {"error": "Could not decode images", "files": undecodable_files},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        with transaction.atomic():
+            # Files are written to storage as each row is prepared for insert
+            MicroscopyImage.objects.bulk_create(images)
+            session.status = "processing"
+            session.save(update_fields=["status", "updated_at"])
+
+        image_ids = [str(image.id) for image in images]
+        task = process_microscopy_image_batch.delay(image_ids, task_type)
+
+        return Response(
+            {
+                "message": f"{len(images)} images uploaded successfully",
+                "image_ids": image_ids,
+                "task_id": task.id,
+                "status": "processing",
+                "framework": "NASA_MicroNet",
+                "task_type": task_type,
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+    @action(detail=True, methods=["get"])
+    def summary(self, request, pk=None):
+        """Session-level diagnosis without loading any image or result."""
+        session = get_object_or_404(DiagnosticSession, pk=pk)
+        return Response(SessionSummarySerializer(session).data)
+
     @action(detail=True, methods=["get"])
     def results(self, request, pk=None):
         """Retrieve complete analysis results for a session."""
-        session = get_object_or_404(
-            DiagnosticSession.objects.prefetch_related("images__aianalysisresult"),
-            pk=pk,
-        )
-        serializer = self.get_serializer(session)
-        return Response(serializer.data)
+
+        def build():
+            session = get_object_or_404(self.get_queryset(), pk=pk)
+            # Cached only once the analysis is over, as the updates that
+            # follow come from Celery workers (like the mobile result check)
+            images = session.images.all()
+            final = session.status in FINAL_SESSION_STATUSES and all(
+                hasattr(image, "aianalysisresult") for image in images
+            )
+            last_modified = max(
+                [session.updated_at]
+                + [image.updated_at for image in images]
+                + [
+                    image.aianalysisresult.updated_at
+                    for image in images
+                    if hasattr(image, "aianalysisresult")
+                ]
+            )
+            return self.get_serializer(session).data, final, last_modified
+
+        entry = response_cache.get_or_build(response_cache.get_session_key(pk), build)
+        return response_cache.respond(request, entry)
 
 
 class PatientViewSet(viewsets.ModelViewSet):
     """ViewSet for managing patients."""
 
-    queryset = Patient.objects.all()
+    queryset = Patient.objects.select_related("facility")
     serializer_class = PatientSerializer
+
+
+def inference_metrics(request):
+    """Inference, batching and result cache metrics for a local Prometheus scrape."""
+    if request.META.get("REMOTE_ADDR") not in LOCAL_ADDRESSES and not (
+        request.user.is_authenticated and request.user.is_staff
+    ):
+        return HttpResponseForbidden()
+
+    return HttpResponse(
+        render_prometheus(
+            collect_stage_snapshots(),
+            collect_model_registry_stats(),
+            collect_batching_snapshots(),
+            result_cache.get_cache_stats(),
+        ),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
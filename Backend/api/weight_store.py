@@ -0,0 +1,153 @@
+# ==============================================================================
+# weight_store.py - Local Content-Addressed Store for Pretrained Weights
+# ==============================================================================
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+import torch
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class WeightStoreError(Exception):
+    """Raised when weights are missing, corrupt or must not be downloaded."""
+
+
+class WeightStore:
+    """
+    Pretrained state dicts stored on local disk by SHA-256 of their content.
+
+    Layout::
+
+        <root>/manifest.json          name -> {sha256, size, source, added_at}
+        <root>/objects/<sha256>.pt    state dict saved with torch.save
+
+    Names identify what the weights are, e.g. ``micronet/resnet50`` or
+    ``torchvision-imagenet/resnet18``. Objects are checked against their
+    checksum once per process and loaded memory-mapped, so tensors stay
+    backed by the page cache instead of being copied into process memory.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.objects_dir = self.root / "objects"
+        self.manifest_path = self.root / "manifest.json"
+        self._verified = set()
+        self._lock = threading.Lock()
+
+    def read_manifest(self) -> Dict[str, Dict[str, Any]]:
+        if not self.manifest_path.exists():
+            return {}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest: Dict[str, Dict[str, Any]]) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def object_path(self, sha256: str) -> Path:
+        return self.objects_dir / f"{sha256}.pt"
+
+    def has(self, name: str) -> bool:
+        return name in self.read_manifest()
+
+    def get_path(self, name: str) -> Optional[Path]:
+        """Path of the verified object stored under name, or None."""
+        entry = self.read_manifest().get(name)
+        if entry is None:
+            return None
+
+        path = self.object_path(entry["sha256"])
+        if not path.exists():
+            raise WeightStoreError(f"Weight object for {name} is missing: {path}")
+
+        with self._lock:
+            if entry["sha256"] not in self._verified:
+                checksum = file_sha256(path)
+                if checksum != entry["sha256"]:
+                    raise WeightStoreError(
+                        f"Checksum mismatch for {name}: expected "
+                        f"{entry['sha256']}, got {checksum}"
+                    )
+                self._verified.add(entry["sha256"])
+
+        return path
+
+    def load_state_dict(self, name: str) -> Optional[Dict[str, torch.Tensor]]:
+        """Memory-map the state dict stored under name, or None if absent."""
+        path = self.get_path(name)
+        if path is None:
+            return None
+        return torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+
+    def add_state_dict(
+        self, name: str, state_dict: Dict[str, torch.Tensor], source: str = ""
+    ) -> str:
+        """Store a state dict under name and return its checksum."""
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+
+        fd, tmp_name = tempfile.mkstemp(dir=self.objects_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            state_dict = {k: v.detach().cpu() for k, v in state_dict.items()}
+            torch.save(state_dict, tmp_name)
+            sha256 = file_sha256(tmp_name)
+            os.replace(tmp_name, self.object_path(sha256))
+        finally:
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
+
+        with self._lock:
+            manifest = self.read_manifest()
+            manifest[name] = {
+                "sha256": sha256,
+                "size": self.object_path(sha256).stat().st_size,
+                "source": source,
+                "added_at": timezone.now().isoformat(),
+            }
+            self._write_manifest(manifest)
+            self._verified.add(sha256)
+
+        logger.info(f"Stored weights {name} ({sha256[:12]})")
+        return sha256
+
+    def verify(self) -> Dict[str, bool]:
+        """Recompute the checksum of every stored object."""
+        results = {}
+        for name, entry in self.read_manifest().items():
+            path = self.object_path(entry["sha256"])
+            results[name] = path.exists() and file_sha256(path) == entry["sha256"]
+        return results
+
+
+def file_sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+_weight_store = None
+
+
+def get_weight_store() -> WeightStore:
+    """Weight store configured by AI_WEIGHT_STORE_PATH."""
+    global _weight_store
+    if _weight_store is None:
+        _weight_store = WeightStore(settings.AI_WEIGHT_STORE_PATH)
+    return _weight_store
@@ -0,0 +1,409 @@
+# ==============================================================================
+# bench_async_endpoints.py - Slow Mobile Uploads: Sync WSGI vs Async ASGI
+# ==============================================================================
+#
+# Serves the mobile endpoints two ways against a fresh SQLite database:
+#
+#   sync   the DRF views under a WSGI server with a fixed pool of threads,
+#          like a gunicorn gthread worker (--threads)
+#   async  the async views under uvicorn, one process
+#
+# For each level, that many clients upload an image at once, trickling the
+# request body over --upload-seconds like a phone on a poor connection. While
+# they do, a probe client keeps checking a finished result. Reports the
+# uploads completed and their duration, and the probe's latency: with the
+# sync server every slow upload holds one of the threads for its whole
+# transfer, so probes queue once the uploads outnumber the threads.
+#
+#   python benchmarks/bench_async_endpoints.py
+#   python benchmarks/bench_async_endpoints.py --uploads 4 16 64 --threads 4
+
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+MODES = ["sync", "async"]
+
+ENDPOINTS = {
+    "sync": {
+        "upload": "/api/mobile/upload-micronet/",
+        "result": "/api/mobile/result-micronet/{image_id}/",
+    },
+    "async": {
+        "upload": "/api/mobile/async/upload-micronet/",
+        "result": "/api/mobile/async/result-micronet/{image_id}/",
+    },
+}
+
+# Seconds a request may take before it counts as failed
+REQUEST_TIMEOUT = 120
+
+
+def setup_django(tmp_dir):
+    os.environ["DATABASE_PATH"] = os.path.join(tmp_dir, "bench.sqlite3")
+    os.environ["DATABASE_PROFILE"] = "production"
+    os.environ["DATABASE_ENGINE"] = "sqlite"
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pathfinder.settings")
+    import django
+
+    django.setup()
+
+    from django.conf import settings
+    from django.test import override_settings
+
+    # Session authentication for the DRF views (the project configures
+    # none), a scratch media root and an in-memory broker, so uploads can
+    # queue their analysis task without Redis
+    override_settings(
+        MEDIA_ROOT=os.path.join(tmp_dir, "media"),
+        REST_FRAMEWORK={
+            **settings.REST_FRAMEWORK,
+            "DEFAULT_AUTHENTICATION_CLASSES": [
+                "rest_framework.authentication.SessionAuthentication"
+            ],
+        },
+        CELERY_BROKER_URL="memory://",
+        CELERY_RESULT_BACKEND="cache+memory://",
+    ).enable()
+
+
+def prepare_database():
+    """Migrate and create a logged-in technician and a finished analysis."""
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY
+    from django.contrib.auth import SESSION_KEY
+    from django.contrib.auth.models import User
+    from django.contrib.sessions.backends.db import SessionStore
+    from django.core.management import call_command
+
+    from api.models import (
+        AIAnalysisResult,
+        DiagnosticSession,
+        HealthFacility,
+        MicroscopyImage,
+        Patient,
+    )
+
+    call_command("migrate", verbosity=0)
+    user = User.objects.create_user("technician", password=secrets.token_hex(8))
+    facility = HealthFacility.objects.create(
+        name="Bench Clinic", location="Windhoek", facility_type="clinic"
+    )
+    patient = Patient.objects.create(
+        patient_id="P-1", age=30, gender="F", facility=facility
+    )
+    session = DiagnosticSession.objects.create(
+        patient=patient, disease_type="malaria", status="completed"
+    )
+    image = MicroscopyImage.objects.create(
+        session=session, image="microscopy_images/bench.png"
+    )
+    AIAnalysisResult.objects.create(
+        image=image, prediction="Normal", confidence_score=0.95, processing_time=0.1
+    )
+
+    login = SessionStore()
+    login[SESSION_KEY] = str(user.pk)
+    login[BACKEND_SESSION_KEY] = "django.contrib.auth.backends.ModelBackend"
+    login[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    login.create()
+    return {
+        "session_id": str(session.id),
+        "image_id": str(image.id),
+        "sessionid": login.session_key,
+    }
+
+
+# ------------------------
+# Servers
+# ------------------------
+def serve_wsgi(port, threads):
+    from socketserver import BaseServer
+    from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+    from django.core.wsgi import get_wsgi_application
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    class PooledWSGIServer(WSGIServer):
+        """Each connection is served start to end by one of `threads` threads."""
+
+        pool = ThreadPoolExecutor(max_workers=threads)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self.process_request_thread, request, client_address)
+
+        def process_request_thread(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    PooledWSGIServer.request_queue_size = 1024
+    server = PooledWSGIServer(("127.0.0.1", port), QuietHandler)
+    server.set_app(get_wsgi_application())
+    BaseServer.serve_forever(server)
+
+
+def serve_asgi(port):
+    import uvicorn
+
+    from django.core.asgi import get_asgi_application
+
+    uvicorn.run(
+        get_asgi_application(),
+        port=port,
+        log_level="warning",
+        lifespan="off",
+        access_log=False,
+    )
+
+
+def start_server(mode, port, args, tmp_dir):
+    command = [
+        sys.executable,
+        os.path.abspath(__file__),
+        "--serve",
+        mode,
+        str(port),
+        "--tmp-dir",
+        tmp_dir,
+        "--threads",
+        str(args.threads),
+    ]
+    server = subprocess.Popen(command, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"{mode} server did not start")
+
+
+# ------------------------
+# Clients
+# ------------------------
+async def http_request(
+    port, method, path, cookies, body=b"", content_type=None, trickle=0.0
+):
+    """One HTTP/1.1 request; the body is spread evenly over trickle seconds."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        headers = [
+            f"{method} {path} HTTP/1.1",
+            f"Host: 127.0.0.1:{port}",
+            "Connection: close",
+            f"Cookie: {cookies['header']}",
+            f"X-CSRFToken: {cookies['csrftoken']}",
+            f"Content-Length: {len(body)}",
+        ]
+        if content_type:
+            headers.append(f"Content-Type: {content_type}")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode())
+
+        chunk_size = 8192
+        chunks = [body[i : i + chunk_size] for i in range(0, len(body), chunk_size)]
+        for chunk in chunks:
+            writer.write(chunk)
+            await writer.drain()
+            if trickle:
+                await asyncio.sleep(trickle / len(chunks))
+
+        response = await reader.read()
+        return int(response.split(b" ", 2)[1])
+    finally:
+        writer.close()
+
+
+def build_multipart(fields, image_bytes):
+    boundary = secrets.token_hex(16)
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"'
+            f"\r\n\r\n{value}\r\n".encode()
+        )
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="image"; '
+        f'filename="cells.png"\r\nContent-Type: image/png\r\n\r\n'.encode()
+        + image_bytes
+        + b"\r\n"
+    )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+async def timed(coroutine):
+    start_time = time.perf_counter()
+    try:
+        status = await asyncio.wait_for(coroutine, REQUEST_TIMEOUT)
+    except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+        status = None
+    return status, time.perf_counter() - start_time
+
+
+async def run_level(mode, port, uploads, args, fixtures, image_bytes):
+    endpoints = ENDPOINTS[mode]
+    body, content_type = build_multipart(
+        {"session_id": fixtures["session_id"], "task_type": "classification"},
+        image_bytes,
+    )
+    result_path = endpoints["result"].format(image_id=fixtures["image_id"])
+
+    upload_tasks = [
+        asyncio.create_task(
+            timed(
+                http_request(
+                    port,
+                    "POST",
+                    endpoints["upload"],
+                    fixtures["cookies"],
+                    body,
+                    content_type,
+                    trickle=args.upload_seconds,
+                )
+            )
+        )
+        for _ in range(uploads)
+    ]
+
+    # Probe a fast endpoint while the uploads are in flight
+    probes = []
+    while not all(task.done() for task in upload_tasks):
+        probes.append(
+            await timed(http_request(port, "GET", result_path, fixtures["cookies"]))
+        )
+        await asyncio.sleep(0.1)
+    upload_results = [task.result() for task in upload_tasks]
+
+    upload_times = sorted(
+        seconds for status, seconds in upload_results if status == 201
+    )
+    probe_times = sorted(seconds for status, seconds in probes if status == 200)
+    return {
+        "uploads_ok": len(upload_times),
+        "upload_p50_s": percentile(upload_times, 0.5),
+        "upload_max_s": upload_times[-1] if upload_times else None,
+        "probes": len(probes),
+        "probe_p50_ms": scale(percentile(probe_times, 0.5), 1000),
+        "probe_p99_ms": scale(percentile(probe_times, 0.99), 1000),
+        "probe_failures": len(probes) - len(probe_times),
+    }
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def scale(value, factor):
+    return None if value is None else value * factor
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_image(size):
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+    return cv2.imencode(".png", cv2.GaussianBlur(image, (5, 5), 0))[1].tobytes()
+
+
+def format_value(value, spec):
+    return "-" if value is None else format(value, spec)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--uploads", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument(
+        "--threads", type=int, default=4, help="Threads of the sync WSGI server."
+    )
+    parser.add_argument("--upload-seconds", type=float, default=5.0)
+    parser.add_argument("--image-size", type=int, default=256)
+    parser.add_argument("--output", help="Also write the results as JSON here.")
+    parser.add_argument("--serve", nargs=2, help=argparse.SUPPRESS)
+    parser.add_argument("--tmp-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        mode, port = args.serve
+        setup_django(args.tmp_dir)
+        if mode == "sync":
+            serve_wsgi(int(port), args.threads)
+        else:
+            serve_asgi(int(port))
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        setup_django(tmp_dir)
+        fixtures = prepare_database()
+        csrftoken = secrets.token_hex(16)
+        fixtures["cookies"] = {
+            "csrftoken": csrftoken,
+            "header": f"sessionid={fixtures['sessionid']}; csrftoken={csrftoken}",
+        }
+        image_bytes = make_image(args.image_size)
+
+        for mode in args.modes:
+            port = free_port()
+            server = start_server(mode, port, args, tmp_dir)
+            try:
+                for uploads in args.uploads:
+                    results[f"{mode}/{uploads}"] = asyncio.run(
+                        run_level(mode, port, uploads, args, fixtures, image_bytes)
+                    )
+            finally:
+                server.terminate()
+                server.wait()
+
+    print(
+        f"{len(image_bytes) // 1024} KB uploads over {args.upload_seconds:.0f}s, "
+        f"sync server with {args.threads} threads\n"
+        f"{'mode':<6} {'uploads':>7} {'ok':>4} {'upl p50 s':>10} {'upl max s':>10} "
+        f"{'probes':>7} {'probe p50 ms':>13} {'probe p99 ms':>13} {'failed':>7}"
+    )
+    for key, row in results.items():
+        mode, uploads = key.split("/")
+        print(
+            f"{mode:<6} {uploads:>7} {row['uploads_ok']:>4} "
+            f"{format_value(row['upload_p50_s'], '.2f'):>10} "
+            f"{format_value(row['upload_max_s'], '.2f'):>10} {row['probes']:>7} "
+            f"{format_value(row['probe_p50_ms'], '.1f'):>13} "
+            f"{format_value(row['probe_p99_ms'], '.1f'):>13} "
+            f"{row['probe_failures']:>7}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
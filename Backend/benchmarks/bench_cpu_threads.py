@@ -0,0 +1,149 @@
+# ==============================================================================
+# bench_cpu_threads.py - Images per Second over Workers x Torch Threads
+# ==============================================================================
+#
+# Runs a grid of worker process counts and per-worker torch thread counts,
+# each worker loading the model that serves --disease-type/--task-type and
+# analysing a synthetic image in a loop with predict_image, all at once like
+# a busy prefork pool. Thread settings:
+#
+#   default  torch left alone: every worker sizes its pool to the machine
+#   auto     configure_worker_threads' equal share of the available CPUs
+#   <n>      n intra-op threads per worker
+#
+#   python benchmarks/bench_cpu_threads.py
+#   python benchmarks/bench_cpu_threads.py --workers 1 2 4 8 --threads default auto 1 2
+#   python benchmarks/bench_cpu_threads.py --affinity
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def worker(index, workers, threads, args, image_path, ready, queue):
+    if threads != "default":
+        os.environ["AI_TORCH_THREADS"] = "0" if threads == "auto" else threads
+        os.environ["AI_CPU_AFFINITY"] = "true" if args.affinity else "false"
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pathfinder.settings")
+    import django
+
+    django.setup()
+    import torch
+
+    from api import ai_inference
+    from api.cpu_threads import configure_worker_threads
+
+    if threads != "default":
+        configure_worker_threads(index, workers)
+    manager = ai_inference.microscopy_model_manager
+    manager.warm_up_model(manager.load_model(args.disease_type, args.task_type))
+    ai_inference.predict_image(args.disease_type, image_path, args.task_type)
+
+    # The clock starts once every worker has loaded and warmed up its model
+    ready.wait()
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + args.duration
+    while time.perf_counter() < deadline:
+        start_time = time.perf_counter()
+        results = ai_inference.predict_image(
+            args.disease_type, image_path, args.task_type
+        )
+        if "error" in results:
+            errors += 1
+        else:
+            latencies.append(time.perf_counter() - start_time)
+
+    queue.put((torch.get_num_threads(), latencies, errors))
+
+
+def run_case(workers, threads, args, image_path):
+    context = multiprocessing.get_context("spawn")
+    ready = context.Barrier(workers + 1)
+    queue = context.Queue()
+    processes = [
+        context.Process(
+            target=worker,
+            args=(i, workers, threads, args, image_path, ready, queue),
+        )
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    ready.wait()
+    outcomes = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    latencies = sorted(latency for _, values, _ in outcomes for latency in values)
+    return {
+        "torch_threads": [num_threads for num_threads, _, _ in outcomes],
+        "images_per_second": len(latencies) / args.duration,
+        "p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else None,
+        "errors": sum(errors for _, _, errors in outcomes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument(
+        "--threads", nargs="+", default=["default", "auto", "1", "2", "4"]
+    )
+    parser.add_argument("--affinity", action="store_true")
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--disease-type", default="malaria")
+    parser.add_argument(
+        "--task-type",
+        default="segmentation",
+        choices=["classification", "segmentation"],
+    )
+    parser.add_argument("--image-size", type=int, default=512)
+    parser.add_argument("--output", help="Also write the results as JSON here.")
+    args = parser.parse_args()
+
+    import cv2
+    import numpy as np
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        image_path = os.path.join(tmp_dir, "sample.png")
+        rng = np.random.default_rng(0)
+        image = rng.integers(0, 256, (args.image_size, args.image_size, 3))
+        cv2.imwrite(image_path, cv2.GaussianBlur(image.astype(np.uint8), (5, 5), 0))
+
+        for workers in args.workers:
+            for threads in args.threads:
+                results[f"{workers}/{threads}"] = run_case(
+                    workers, threads, args, image_path
+                )
+
+    print(
+        f"{args.task_type}, {args.image_size}px, {os.cpu_count()} CPUs, "
+        f"affinity {'on' if args.affinity else 'off'}\n"
+        f"{'workers':>7} {'threads':>8} {'torch':>6} {'img/s':>8} "
+        f"{'p50 ms':>9} {'errors':>7}"
+    )
+    for key, row in results.items():
+        workers, threads = key.split("/")
+        p50 = "-" if row["p50_ms"] is None else f"{row['p50_ms']:.1f}"
+        print(
+            f"{workers:>7} {threads:>8} {max(row['torch_threads']):>6} "
+            f"{row['images_per_second']:>8.1f} {p50:>9} {row['errors']:>7}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+# ==============================================================================
+# bench_db_concurrency.py - Concurrent Result Writes and API Reads on SQLite
+# ==============================================================================
+#
+# Runs writer processes doing what a finished Celery task does (insert an
+# image and its AIAnalysisResult, update the session aggregates and status
+# in one transaction) alongside reader processes doing what the session
+# endpoints do, against a fresh SQLite database under each DATABASE_PROFILE.
+# Reports throughput, latency percentiles and "database is locked" errors.
+#
+#   python benchmarks/bench_db_concurrency.py
+#   python benchmarks/bench_db_concurrency.py --writers 8 --readers 8 --duration 20
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+PROFILES = ["development", "production"]
+
+
+def setup_django(database_path, profile):
+    os.environ["DATABASE_PATH"] = database_path
+    os.environ["DATABASE_PROFILE"] = profile
+    os.environ["DATABASE_ENGINE"] = "sqlite"
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pathfinder.settings")
+
+    import django
+
+    django.setup()
+
+
+def prepare_database(database_path, profile, sessions):
+    """Migrate and seed a fresh database (run in its own process)."""
+    setup_django(database_path, profile)
+    from django.core.management import call_command
+
+    from api.models import DiagnosticSession, HealthFacility, Patient
+
+    call_command("migrate", verbosity=0)
+    facility = HealthFacility.objects.create(
+        name="Bench Clinic", location="Windhoek", facility_type="clinic"
+    )
+    patients = Patient.objects.bulk_create(
+        Patient(patient_id=f"P{i}", age=30, gender="F", facility=facility)
+        for i in range(sessions)
+    )
+    DiagnosticSession.objects.bulk_create(
+        DiagnosticSession(
+            patient=patient, disease_type="parasites", status="processing"
+        )
+        for patient in patients
+    )
+
+
+def write_result(session_ids, rng):
+    """The database work of process_microscopy_image_micronet for one image."""
+    from django.db import transaction
+
+    from api.ai_inference import summarize_prediction
+    from api.models import AIAnalysisResult, DiagnosticSession, MicroscopyImage
+
+    results = {"prediction": "Normal", "confidence": rng.uniform(0.5, 1.0)}
+    with transaction.atomic():
+        session = DiagnosticSession.objects.get(pk=rng.choice(session_ids))
+        image = MicroscopyImage.objects.create(
+            session=session, image="microscopy_images/bench.png"
+        )
+        AIAnalysisResult.objects.create(
+            image=image,
+            prediction=results["prediction"],
+            confidence_score=results["confidence"],
+            processing_time=0.1,
+            metadata={"framework": "NASA_MicroNet"},
+        )
+        session.add_result_aggregates([summarize_prediction(results)])
+        session.status = "completed"
+        session.save(update_fields=["status", "completed_at"])
+
+
+def read_sessions(session_ids, rng):
+    """A session list page followed by one session's results."""
+    from api.models import AIAnalysisResult, DiagnosticSession
+
+    list(
+        DiagnosticSession.objects.select_related("patient__facility").order_by(
+            "-created_at"
+        )[:50]
+    )
+    list(AIAnalysisResult.objects.filter(image__session_id=rng.choice(session_ids)))
+
+
+def worker(role, database_path, profile, ready, duration, queue, seed_value):
+    setup_django(database_path, profile)
+    from django.db import OperationalError, close_old_connections
+
+    # Imported up front: api.ai_inference pulls in torch
+    import api.ai_inference  # noqa: F401
+    from api.models import DiagnosticSession
+
+    rng = random.Random(seed_value)
+    session_ids = list(DiagnosticSession.objects.values_list("pk", flat=True))
+    operation = write_result if role == "writer" else read_sessions
+
+    latencies = []
+    errors = 0
+    # The clock starts once every worker has imported Django and the models
+    ready.wait()
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start_time = time.perf_counter()
+        try:
+            operation(session_ids, rng)
+            latencies.append(time.perf_counter() - start_time)
+        except OperationalError:
+            # "database is locked" once the busy timeout runs out
+            errors += 1
+        # What Django does at the end of every request and Celery task
+        close_old_connections()
+
+    queue.put((role, latencies, errors))
+
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_profile(profile, args, tmp_dir):
+    context = multiprocessing.get_context("spawn")
+    database_path = os.path.join(tmp_dir, f"{profile}.sqlite3")
+
+    setup = context.Process(
+        target=prepare_database, args=(database_path, profile, args.sessions)
+    )
+    setup.start()
+    setup.join()
+
+    roles = ["writer"] * args.writers + ["reader"] * args.readers
+    ready = context.Barrier(len(roles) + 1)
+    queue = context.Queue()
+    processes = [
+        context.Process(
+            target=worker,
+            args=(role, database_path, profile, ready, args.duration, queue, i),
+        )
+        for i, role in enumerate(roles)
+    ]
+    for process in processes:
+        process.start()
+
+    ready.wait()
+
+    summary = {}
+    outcomes = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    for role in ("writer", "reader"):
+        latencies = [
+            latency for r, values, _ in outcomes if r == role for latency in values
+        ]
+        summary[role] = {
+            "ops_per_second": len(latencies) / args.duration,
+            "p50_ms": percentile(latencies, 0.5) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "max_ms": max(latencies, default=float("nan")) * 1000,
+            "errors": sum(errors for r, _, errors in outcomes if r == role),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--profiles", nargs="+", default=PROFILES, choices=PROFILES)
+    parser.add_argument("--output", help="Also write the results as JSON here.")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for profile in args.profiles:
+            results[profile] = run_profile(profile, args, tmp_dir)
+
+    print(
+        f"{args.writers} writers, {args.readers} readers, {args.duration:.0f}s\n"
+        f"{'profile':<12} {'role':<7} {'ops/s':>8} {'p50 ms':>8} "
+        f"{'p99 ms':>9} {'max ms':>9} {'errors':>7}"
+    )
+    for profile, summary in results.items():
+        for role, row in summary.items():
+            print(
+                f"{profile:<12} {role:<7} {row['ops_per_second']:>8.1f} "
+                f"{row['p50_ms']:>8.2f} {row['p99_ms']:>9.2f} "
+                f"{row['max_ms']:>9.2f} {row['errors']:>7}"
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+# ==============================================================================
+# bench_db_indexes.py - Hot Query Timings Before and After the API Indexes
+# ==============================================================================
+#
+# Seeds a throwaway SQLite database with facilities, patients, sessions,
+# images and results (1M sessions by default) on the current schema, times
+# the hot queries of the API without the composite indexes, creates them as
+# the index migration does and times them again.
+#
+#   python benchmarks/bench_db_indexes.py
+#   python benchmarks/bench_db_indexes.py --sessions 100000 --explain
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Migration adding the composite indexes
+INDEX_MIGRATION = "0005_session_image_indexes"
+
+STATUS_WEIGHTS = {
+    "completed": 80,
+    "requires_review": 8,
+    "processing": 5,
+    "pending": 4,
+    "failed": 3,
+}
+DISEASE_TYPES = [
+    "tuberculosis",
+    "parasites",
+    "schistosomiasis",
+    "fungal",
+    "blood_abnormalities",
+]
+
+
+def configure_django(database_path):
+    import django
+    from django.conf import settings
+
+    import pathfinder.settings as project_settings
+
+    options = {
+        name: getattr(project_settings, name)
+        for name in dir(project_settings)
+        if name.isupper()
+    }
+    options["DATABASES"] = {
+        "default": {"ENGINE": "django.db.backends.sqlite3", "NAME": database_path}
+    }
+    options["LOGGING_CONFIG"] = None
+    settings.configure(**options)
+    django.setup()
+
+
+def seed(sessions, images_per_session, facilities, patients_per_facility, seed_value):
+    """Bulk insert synthetic rows with raw executemany, in one transaction."""
+    from django.db import connection, transaction
+
+    from api.models import (
+        AIAnalysisResult,
+        DiagnosticSession,
+        HealthFacility,
+        MicroscopyImage,
+        Patient,
+    )
+
+    rng = random.Random(seed_value)
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    statuses = list(STATUS_WEIGHTS)
+    status_weights = list(STATUS_WEIGHTS.values())
+
+    def table(model):
+        return connection.ops.quote_name(model._meta.db_table)
+
+    def insert(cursor, model, columns, rows):
+        placeholders = ", ".join(["%s"] * len(columns))
+        cursor.executemany(
+            f"INSERT INTO {table(model)} ({', '.join(columns)}) "
+            f"VALUES ({placeholders})",
+            rows,
+        )
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        insert(
+            cursor,
+            HealthFacility,
+            ["id", "name", "location", "facility_type", "created_at"],
+            [
+                (i + 1, f"Clinic {i}", "Region", "clinic", start)
+                for i in range(facilities)
+            ],
+        )
+
+        patient_count = facilities * patients_per_facility
+        insert(
+            cursor,
+            Patient,
+            ["id", "patient_id", "age", "gender", "facility_id", "created_at"],
+            [
+                (uuid.uuid4().hex, f"P{i}", 30, "F", i % facilities + 1, start)
+                for i in range(patient_count)
+            ],
+        )
+        cursor.execute(f"SELECT id FROM {table(Patient)}")
+        patient_ids = [row[0] for row in cursor.fetchall()]
+
+        chunk = 50000
+        result_id = 0
+        for offset in range(0, sessions, chunk):
+            session_rows, image_rows, result_rows = [], [], []
+            for i in range(offset, min(offset + chunk, sessions)):
+                session_id = uuid.uuid4().hex
+                created_at = start + timedelta(seconds=i * 30 + rng.randint(0, 29))
+                session_rows.append(
+                    (
+                        session_id,
+                        rng.choice(patient_ids),
+                        rng.choice(DISEASE_TYPES),
+                        rng.choices(statuses, status_weights)[0],
+                        created_at,
+                        0,
+                        0,
+                        0,
+                        0.0,
+                        "",
+                        -1,
+                        created_at,
+                    )
+                )
+                for j in range(images_per_session):
+                    image_id = uuid.uuid4().hex
+                    uploaded_at = created_at + timedelta(seconds=j)
+                    image_rows.append(
+                        (image_id, session_id, f"microscopy_images/{i}_{j}.png", "{}")
+                        + (uploaded_at, "", "", uploaded_at)
+                    )
+                    result_id += 1
+                    result_rows.append(
+                        (result_id, image_id, "", "Normal", 0.9, "high")
+                        + ("[]", 0.1, "{}", "{}", uploaded_at, uploaded_at)
+                    )
+
+            insert(
+                cursor,
+                DiagnosticSession,
+                [
+                    "id",
+                    "patient_id",
+                    "disease_type",
+                    "status",
+                    "created_at",
+                    "images_processed",
+                    "failed_count",
+                    "positive_count",
+                    "confidence_sum",
+                    "worst_class",
+                    "worst_severity",
+                    "updated_at",
+                ],
+                session_rows,
+            )
+            insert(
+                cursor,
+                MicroscopyImage,
+                [
+                    "id",
+                    "session_id",
+                    "image",
+                    "image_metadata",
+                    "uploaded_at",
+                    "inference_image",
+                    "thumbnail",
+                    "updated_at",
+                ],
+                image_rows,
+            )
+            insert(
+                cursor,
+                AIAnalysisResult,
+                [
+                    "id",
+                    "image_id",
+                    "ai_model_version",
+                    "prediction",
+                    "confidence_score",
+                    "confidence_level",
+                    "detection_regions",
+                    "processing_time",
+                    "raw_output",
+                    "metadata",
+                    "created_at",
+                    "updated_at",
+                ],
+                result_rows,
+            )
+
+        cursor.execute("ANALYZE")
+
+
+def get_migration_indexes():
+    """(model, index) pairs added by the index migration."""
+    from django.apps import apps
+    from django.db import connection
+    from django.db.migrations.loader import MigrationLoader
+
+    migration = MigrationLoader(connection).get_migration("api", INDEX_MIGRATION)
+    return [
+        (apps.get_model("api", operation.model_name), operation.index)
+        for operation in migration.operations
+    ]
+
+
+def drop_indexes(indexes):
+    from django.db import connection
+
+    with connection.schema_editor() as schema_editor:
+        for model, index in indexes:
+            schema_editor.remove_index(model, index)
+
+
+def create_indexes(indexes):
+    from django.db import connection
+
+    with connection.schema_editor() as schema_editor:
+        for model, index in indexes:
+            schema_editor.add_index(model, index)
+        # Refresh the planner statistics for the new indexes
+        schema_editor.execute("ANALYZE")
+
+
+def hot_queries():
+    """(name, queryset factory) pairs mirroring the API's access patterns."""
+    from django.db.models import Count
+
+    from api.models import AIAnalysisResult, DiagnosticSession, MicroscopyImage
+
+    sample_session = DiagnosticSession.objects.order_by("created_at").values_list(
+        "pk", flat=True
+    )[DiagnosticSession.objects.count() // 2]
+    sample_image = MicroscopyImage.objects.filter(session_id=sample_session).first()
+
+    return [
+        (
+            "list newest first",
+            lambda: DiagnosticSession.objects.order_by("-created_at")[:51],
+        ),
+        (
+            "status newest first",
+            lambda: DiagnosticSession.objects.filter(status="requires_review").order_by(
+                "-created_at"
+            )[:50],
+        ),
+        (
+            "status + disease newest first",
+            lambda: DiagnosticSession.objects.filter(
+                status="requires_review", disease_type="tuberculosis"
+            ).order_by("-created_at")[:50],
+        ),
+        (
+            "facility review queue",
+            lambda: DiagnosticSession.objects.filter(
+                status="requires_review", patient__facility_id=7
+            ).order_by("-created_at")[:50],
+        ),
+        (
+            "sessions per status",
+            lambda: DiagnosticSession.objects.values("status").annotate(
+                total=Count("id")
+            ),
+        ),
+        (
+            "images of a session",
+            lambda: MicroscopyImage.objects.filter(session_id=sample_session).order_by(
+                "uploaded_at"
+            ),
+        ),
+        (
+            "result of an image",
+            lambda: AIAnalysisResult.objects.filter(image=sample_image),
+        ),
+    ]
+
+
+def time_queries(queries, repeats, explain):
+    from django.db import connection
+
+    timings = {}
+    for name, make_queryset in queries:
+        samples = []
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            list(make_queryset())
+            samples.append(time.perf_counter() - start_time)
+        timings[name] = statistics.median(samples) * 1000
+
+        if explain:
+            sql, params = make_queryset().query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+                plan = "; ".join(row[-1] for row in cursor.fetchall())
+            print(f"  {name}: {plan}")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=1_000_000)
+    parser.add_argument("--images-per-session", type=int, default=1)
+    parser.add_argument("--facilities", type=int, default=50)
+    parser.add_argument("--patients-per-facility", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--explain", action="store_true")
+    parser.add_argument("--output", help="Also write the timings as JSON here.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        configure_django(os.path.join(tmp_dir, "bench.sqlite3"))
+        from django.core.management import call_command
+
+        # The queries run through the current models, so the schema stays
+        # current and only the indexes of the index migration are dropped
+        call_command("migrate", verbosity=0)
+        indexes = get_migration_indexes()
+        drop_indexes(indexes)
+
+        start_time = time.perf_counter()
+        seed(
+            args.sessions,
+            args.images_per_session,
+            args.facilities,
+            args.patients_per_facility,
+            args.seed,
+        )
+        print(
+            f"Seeded {args.sessions} sessions x {args.images_per_session} images "
+            f"in {time.perf_counter() - start_time:.1f}s"
+        )
+        queries = hot_queries()
+
+        if args.explain:
+            print("Before indexes:")
+        before = time_queries(queries, args.repeats, args.explain)
+
+        start_time = time.perf_counter()
+        create_indexes(indexes)
+        print(f"Built indexes in {time.perf_counter() - start_time:.1f}s")
+
+        if args.explain:
+            print("After indexes:")
+        after = time_queries(queries, args.repeats, args.explain)
+
+    print(f"\n{'query':<32} {'before (ms)':>12} {'after (ms)':>11} {'speedup':>8}")
+    for name in before:
+        print(
+            f"{name:<32} {before[name]:>12.2f} {after[name]:>11.2f} "
+            f"{before[name] / after[name]:>7.1f}x"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"before": before, "after": after}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
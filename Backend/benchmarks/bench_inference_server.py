@@ -0,0 +1,223 @@
+# ==============================================================================
+# bench_inference_server.py - Load Test of the MicroNet Inference Server
+# ==============================================================================
+#
+# Starts `manage.py run_inference_server` on a temporary socket and drives it
+# with closed-loop client threads (each sends its next request as soon as the
+# previous one returns, like busy Celery workers) on a synthetic microscopy
+# image. Reports requests per second, latency percentiles, errors and the
+# mean batch size the server formed. --modes in-process runs the same load
+# against the models inside the benchmark process instead, i.e. without the
+# server, for comparison.
+#
+#   python benchmarks/bench_inference_server.py
+#   python benchmarks/bench_inference_server.py --clients 1 4 16 --duration 30
+#   python benchmarks/bench_inference_server.py --task-type classification --threads 2
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+MODES = ["server", "in-process"]
+
+# Seconds to wait for the server to load its models and listen
+STARTUP_TIMEOUT = 300
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pathfinder.settings")
+    import django
+
+    django.setup()
+
+
+def write_image(path, size, seed=0):
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    image = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+    cv2.imwrite(path, cv2.GaussianBlur(image, (5, 5), 0))
+
+
+def start_server(socket_path, args):
+    command = [
+        sys.executable,
+        os.path.join(BACKEND_DIR, "manage.py"),
+        "run_inference_server",
+        "--socket",
+        socket_path,
+        "--threads",
+        str(args.threads),
+    ]
+    server = subprocess.Popen(
+        command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    from api.inference_client import InferenceClient, InferenceServerError
+
+    client = InferenceClient(socket_path, timeout=args.timeout)
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Inference server exited with {server.returncode}")
+        try:
+            client.call("ping")
+            return server, client
+        except InferenceServerError:
+            time.sleep(0.5)
+
+    server.terminate()
+    raise RuntimeError("Inference server did not start in time")
+
+
+def run_load(predict, clients, duration):
+    """Closed-loop load from client threads; returns latencies and errors."""
+    start = threading.Barrier(clients + 1)
+    latencies = [[] for _ in range(clients)]
+    errors = [0] * clients
+
+    def client_loop(index):
+        start.wait()
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            request_start = time.perf_counter()
+            try:
+                results = predict()
+                if "error" in results:
+                    errors[index] += 1
+                    continue
+            except Exception:
+                errors[index] += 1
+                continue
+            latencies[index].append(time.perf_counter() - request_start)
+
+    threads = [threading.Thread(target=client_loop, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    for thread in threads:
+        thread.join()
+
+    return [latency for values in latencies for latency in values], sum(errors)
+
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(latencies, errors, duration, batching=None):
+    row = {
+        "requests_per_second": len(latencies) / duration,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "errors": errors,
+    }
+    if batching is not None:
+        row["mean_batch_size"] = batching["sum"] / max(batching["count"], 1)
+    return row
+
+
+def batch_delta(before, after):
+    return {
+        "sum": after["sum"] - before["sum"],
+        "count": after["count"] - before["count"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument(
+        "--task-type",
+        default="segmentation",
+        choices=["classification", "segmentation"],
+    )
+    parser.add_argument("--disease-type", default="malaria")
+    parser.add_argument("--image-size", type=int, default=512)
+    parser.add_argument(
+        "--threads", type=int, default=0, help="Server torch threads, 0 = default."
+    )
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--output", help="Also write the results as JSON here.")
+    args = parser.parse_args()
+
+    setup_django()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        image_path = os.path.join(tmp_dir, "sample.png")
+        write_image(image_path, args.image_size)
+
+        if "server" in args.modes:
+            server, client = start_server(os.path.join(tmp_dir, "infer.sock"), args)
+            try:
+
+                def predict():
+                    return client.call(
+                        "predict",
+                        disease_type=args.disease_type,
+                        image_path=image_path,
+                        task_type=args.task_type,
+                    )
+
+                predict()  # First request pays for loading and warm-up
+                for clients in args.clients:
+                    before = client.call("stats")["batching"]["batch_size"]
+                    latencies, errors = run_load(predict, clients, args.duration)
+                    after = client.call("stats")["batching"]["batch_size"]
+                    results[f"server/{clients}"] = summarize(
+                        latencies, errors, args.duration, batch_delta(before, after)
+                    )
+            finally:
+                server.terminate()
+                server.wait()
+
+        if "in-process" in args.modes:
+            from api import ai_inference
+
+            def predict():
+                return ai_inference.predict_image(
+                    args.disease_type, image_path, args.task_type
+                )
+
+            predict()
+            for clients in args.clients:
+                latencies, errors = run_load(predict, clients, args.duration)
+                results[f"in-process/{clients}"] = summarize(
+                    latencies, errors, args.duration
+                )
+
+    print(
+        f"{args.task_type}, {args.image_size}px, {args.duration:.0f}s per level\n"
+        f"{'mode':<11} {'clients':>7} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9} "
+        f"{'errors':>7} {'batch':>6}"
+    )
+    for key, row in results.items():
+        mode, clients = key.split("/")
+        batch = row.get("mean_batch_size")
+        print(
+            f"{mode:<11} {clients:>7} {row['requests_per_second']:>8.1f} "
+            f"{row['p50_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['errors']:>7} "
+            f"{'-' if batch is None else f'{batch:.2f}':>6}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# ==============================================================================
+# bench_mask_analysis.py - Wall Time of Segmentation Mask Analysis
+# ==============================================================================
+#
+# Times analyze_segmentation_mask on synthetic class-id masks of growing size
+# against the previous per-class np.unique + findContours implementation,
+# and checks that both return the same percentages and detection regions.
+# Masks mix large filled cells, rings and optional salt-and-pepper noise;
+# noise adds thousands of tiny contours that OpenCV still has to trace.
+#
+#   python benchmarks/bench_mask_analysis.py
+#   python benchmarks/bench_mask_analysis.py --sizes 4096 --noise 0.1
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pathfinder.settings")
+
+CONFIG = {
+    "num_classes": 3,
+    "class_names": ["Background", "Blood_Cell", "Parasite"],
+    "confidence_threshold": 0.6,
+    "version": "benchmark",
+}
+
+
+def reference_regions(mask, class_names):
+    """Class percentages and regions as computed before vectorization."""
+    unique_classes, counts = np.unique(mask, return_counts=True)
+    class_percentages = {}
+    detection_regions = []
+
+    for class_id, count in zip(unique_classes, counts):
+        if class_id < len(class_names):
+            percentage = (count / mask.size) * 100
+            class_percentages[class_names[class_id]] = round(percentage, 2)
+
+            if class_id > 0:
+                class_mask = (mask == class_id).astype(np.uint8)
+                contours, _ = cv2.findContours(
+                    class_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+                )
+                for contour in contours:
+                    if cv2.contourArea(contour) > 100:
+                        x, y, w, h = cv2.boundingRect(contour)
+                        detection_regions.append([x, y, x + w, y + h])
+
+    return class_percentages, detection_regions
+
+
+def synthetic_mask(size, noise, rng):
+    """Cells (class 1) with parasites (class 2) inside, rings and noise."""
+    mask = np.zeros((size, size), dtype=np.uint8)
+    cells = size * size // 4000
+    for _ in range(cells):
+        center = tuple(int(v) for v in rng.integers(0, size, 2))
+        radius = int(rng.integers(8, 40))
+        thickness = -1 if rng.random() < 0.8 else 2
+        cv2.circle(mask, center, radius, 1, thickness)
+        if rng.random() < 0.2:
+            cv2.circle(mask, center, radius // 3, 2, -1)
+
+    if noise:
+        speckle = rng.random((size, size)) < noise
+        mask[speckle] = rng.integers(0, 3, int(speckle.sum()), dtype=np.uint8)
+    return mask
+
+
+def best_time(function, repeats):
+    timings = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start_time)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024, 2048, 4096])
+    parser.add_argument("--noise", type=float, default=0.02)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import django
+
+    django.setup()
+    from api.ai_inference import microscopy_model_manager
+
+    rng = np.random.default_rng(args.seed)
+    print(
+        f"{'size':>6} {'regions':>8} {'reference (s)':>14} "
+        f"{'vectorized (s)':>15} {'speedup':>8} {'identical':>10}"
+    )
+    for size in args.sizes:
+        mask = synthetic_mask(size, args.noise, rng)
+
+        reference_time, expected = best_time(
+            lambda: reference_regions(mask, CONFIG["class_names"]), args.repeats
+        )
+        vectorized_time, analysis = best_time(
+            lambda: microscopy_model_manager.analyze_segmentation_mask(mask, CONFIG),
+            args.repeats,
+        )
+        actual = (analysis["class_percentages"], analysis["detection_regions"])
+
+        print(
+            f"{size:>6} {len(expected[1]):>8} {reference_time:>14.4f} "
+            f"{vectorized_time:>15.4f} {reference_time / vectorized_time:>7.1f}x "
+            f"{str(actual == expected):>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# ==============================================================================
+# bench_shared_weights.py - Per-Worker Memory of Forked Inference Workers
+# ==============================================================================
+#
+# Mimics a Celery prefork pool: a parent process sets up Django, optionally
+# loads the models for sharing (AI_SHARE_MODEL_WEIGHTS), then forks workers
+# that preload the models as worker_process_init does and run forward passes
+# like tasks would. With every worker still alive, each reports its RSS, PSS
+# (shared pages split between the processes mapping them) and USS (pages
+# only it maps) from /proc/<pid>/smaps_rollup. Every case runs in a fresh
+# parent process. Linux only.
+#
+#   python benchmarks/bench_shared_weights.py
+#   python benchmarks/bench_shared_weights.py --concurrency 1 4 8 --requests 20
+
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+MODES = ["per-worker", "shared"]
+
+# Seconds for every worker to preload and serve before giving up on the case
+WORKER_TIMEOUT = 900
+
+
+def read_memory(pid="self"):
+    """RSS, PSS and USS in MB of a process."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss_mb": fields["Rss"],
+        "pss_mb": fields["Pss"],
+        "uss_mb": fields["Private_Clean"] + fields["Private_Dirty"],
+    }
+
+
+def pool_worker(requests, measured, done, queue):
+    """What a prefork child does: preload, serve, and here report memory."""
+    import torch
+
+    from api import ai_inference
+
+    ai_inference.preload_models()
+    manager = ai_inference.microscopy_model_manager
+    for _ in range(requests):
+        for _, model_info in manager.models.items():
+            manager.run_model(
+                model_info, torch.rand(ai_inference.WARMUP_INPUT_SIZE[1:])
+            )
+
+    # Measure only once every sibling is up, as PSS depends on them
+    try:
+        measured.wait()
+    except threading.BrokenBarrierError:
+        return
+    queue.put(read_memory())
+    done.wait()
+
+
+def run_case(mode, concurrency, requests):
+    """Parent of one pool: returns the memory of the parent and each worker."""
+    os.environ["AI_SHARE_MODEL_WEIGHTS"] = "true" if mode == "shared" else "false"
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pathfinder.settings")
+    import django
+
+    django.setup()
+    from django.conf import settings
+
+    if settings.AI_SHARE_MODEL_WEIGHTS:
+        from api.ai_inference import share_models_before_fork
+
+        share_models_before_fork()
+    else:
+        # Tasks import the inference module in the parent either way
+        import api.ai_inference  # noqa: F401
+
+    context = multiprocessing.get_context("fork")
+    measured = context.Barrier(concurrency + 1)
+    done = context.Barrier(concurrency + 1)
+    queue = context.Queue()
+    workers = [
+        context.Process(target=pool_worker, args=(requests, measured, done, queue))
+        for _ in range(concurrency)
+    ]
+    for process in workers:
+        process.start()
+
+    try:
+        measured.wait(timeout=WORKER_TIMEOUT)
+    except threading.BrokenBarrierError:
+        # A worker died before measuring, typically killed by the OOM killer
+        for process in workers:
+            process.terminate()
+            process.join()
+        exit_codes = [process.exitcode for process in workers]
+        return {"error": f"workers did not all start, exit codes {exit_codes}"}
+
+    worker_memory = [queue.get() for _ in workers]
+    parent_memory = read_memory()
+    done.wait()
+    for process in workers:
+        process.join()
+
+    return {"parent": parent_memory, "workers": worker_memory}
+
+
+def summarize(case):
+    workers = case["workers"]
+    count = len(workers)
+    return {
+        "rss_mb": sum(w["rss_mb"] for w in workers) / count,
+        "pss_mb": sum(w["pss_mb"] for w in workers) / count,
+        "uss_mb": sum(w["uss_mb"] for w in workers) / count,
+        # What the whole pool costs the machine
+        "total_pss_mb": case["parent"]["pss_mb"] + sum(w["pss_mb"] for w in workers),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument(
+        "--requests", type=int, default=10, help="Forward passes per model."
+    )
+    parser.add_argument("--output", help="Also write the results as JSON here.")
+    parser.add_argument("--case", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        mode, concurrency = args.case
+        print(json.dumps(run_case(mode, int(concurrency), args.requests)))
+        return
+
+    results = {}
+    for concurrency in args.concurrency:
+        for mode in args.modes:
+            output = subprocess.run(
+                [
+                    sys.executable,
+                    os.path.abspath(__file__),
+                    "--case",
+                    mode,
+                    str(concurrency),
+                    "--requests",
+                    str(args.requests),
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            case = json.loads(output.strip().splitlines()[-1])
+            if "error" not in case:
+                case["summary"] = summarize(case)
+            results[f"{mode}/{concurrency}"] = case
+
+    print(
+        f"{'mode':<11} {'workers':>7} {'RSS MB':>8} {'PSS MB':>8} "
+        f"{'USS MB':>8} {'pool PSS MB':>12}"
+    )
+    for key, result in results.items():
+        mode, concurrency = key.split("/")
+        if "error" in result:
+            print(f"{mode:<11} {concurrency:>7} {result['error']}")
+            continue
+        row = result["summary"]
+        print(
+            f"{mode:<11} {concurrency:>7} {row['rss_mb']:>8.1f} {row['pss_mb']:>8.1f} "
+            f"{row['uss_mb']:>8.1f} {row['total_pss_mb']:>12.1f}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
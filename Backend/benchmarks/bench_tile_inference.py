@@ -0,0 +1,136 @@
+# ==============================================================================
+# bench_tile_inference.py - Peak RSS and Wall Time of Tiled Segmentation
+# ==============================================================================
+#
+# Runs segmentation_models_inference on synthetic square images of growing
+# size with a trivial 1x1-conv model, so the numbers reflect tiling and
+# stitching rather than the network. Every case runs in a fresh process so
+# its peak RSS is not polluted by earlier cases.
+#
+#   python benchmarks/bench_tile_inference.py
+#   python benchmarks/bench_tile_inference.py --sizes 2048 8192 --dtype float16
+#   python benchmarks/bench_tile_inference.py --streaming
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TrivialSegmentationModel:
+    """1x1 convolution + softmax, standing in for a real UNet."""
+
+    def __init__(self, num_classes):
+        import torch
+
+        self.conv = torch.nn.Conv2d(3, num_classes, 1)
+
+    def predict(self, x):
+        import torch
+
+        with torch.no_grad():
+            return torch.softmax(self.conv(x), dim=1)
+
+
+def run_case(size, patch_size, batch_size, num_classes, dtype, memmap, streaming):
+    import numpy as np
+    import pretrained_microscopy_models as pmm
+
+    image = np.random.randint(0, 255, (size, size, 3), dtype=np.uint8)
+    model = TrivialSegmentationModel(num_classes)
+    stride_size = patch_size // 2
+    tiles = int(np.ceil(size / stride_size)) ** 2
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, "output.npy") if memmap else None
+        start_time = time.perf_counter()
+        pmm.segmentation_training.segmentation_models_inference(
+            image,
+            model,
+            lambda x: x.astype("float32") / 255.0,
+            device="cpu",
+            batch_size=batch_size,
+            patch_size=patch_size,
+            num_classes=num_classes,
+            output_dtype=dtype,
+            output_path=output_path,
+            streaming=streaming,
+        )
+        wall_time = time.perf_counter() - start_time
+
+    # ru_maxrss is in kilobytes on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {
+        "size": size,
+        "tiles": tiles,
+        "dtype": dtype,
+        "memmap": memmap,
+        "streaming": streaming,
+        "wall_time": round(wall_time, 3),
+        "peak_rss_mb": round(peak_rss_mb, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1024, 2048, 4096, 6144]
+    )
+    parser.add_argument("--patch-size", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--num-classes", type=int, default=3)
+    parser.add_argument("--dtype", default="float32")
+    parser.add_argument("--memmap", action="store_true")
+    parser.add_argument("--streaming", action="store_true")
+    parser.add_argument("--case", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case is not None:
+        result = run_case(
+            args.case,
+            args.patch_size,
+            args.batch_size,
+            args.num_classes,
+            args.dtype,
+            args.memmap,
+            args.streaming,
+        )
+        print(json.dumps(result))
+        return
+
+    print(f"{'size':>6} {'tiles':>6} {'wall time (s)':>14} {'peak RSS (MB)':>14}")
+    for size in args.sizes:
+        command = [
+            sys.executable,
+            __file__,
+            "--case",
+            str(size),
+            "--patch-size",
+            str(args.patch_size),
+            "--batch-size",
+            str(args.batch_size),
+            "--num-classes",
+            str(args.num_classes),
+            "--dtype",
+            args.dtype,
+        ]
+        if args.memmap:
+            command.append("--memmap")
+        if args.streaming:
+            command.append("--streaming")
+        output = subprocess.run(command, capture_output=True, text=True, check=True)
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        print(
+            f"{result['size']:>6} {result['tiles']:>6} "
+            f"{result['wall_time']:>14.3f} {result['peak_rss_mb']:>14.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
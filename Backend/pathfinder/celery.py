@@ -1,6 +1,10 @@
 # pathfinder/celery.py
 import os
+import logging
 from celery import Celery
+from celery.signals import worker_init, worker_process_init
+
+logger = logging.getLogger(__name__)
 
 # Set default Django settings
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pathfinder.settings")
@@ -15,6 +19,85 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
 
 
+def is_prefork_pool(worker) -> bool:
+    """Whether a worker runs its tasks in forked pool processes."""
+    # The pool class is still the name given on the command line here
+    pool_cls = getattr(worker, "pool_cls", None)
+    pool_name = (
+        pool_cls if isinstance(pool_cls, str) else getattr(pool_cls, "__module__", "")
+    )
+    return "prefork" in pool_name or "processes" in pool_name
+
+
+@worker_init.connect
+def plan_ai_threads(sender=None, **kwargs):
+    """
+    Divide the CPUs between the processes of the pool. Pool processes size
+    their torch threads from it in configure_ai_threads; thread and solo
+    pools run every task in this process, which gets all the CPUs.
+    """
+    from api.cpu_threads import configure_worker_threads, set_pool_size
+
+    if is_prefork_pool(sender):
+        set_pool_size(sender.concurrency)
+    else:
+        configure_worker_threads(0, 1)
+
+
+@worker_process_init.connect
+def configure_ai_threads(**kwargs):
+    """Size this pool process's torch threads before it preloads any model."""
+    from billiard.process import current_process
+    from api.cpu_threads import configure_worker_threads
+
+    configure_worker_threads(getattr(current_process(), "index", 0) or 0)
+
+
+@worker_init.connect
+def share_ai_models(sender=None, **kwargs):
+    """
+    Load the MicroNet models once in the parent of a prefork pool, before the
+    pool processes are forked, so they share the weights instead of each
+    holding a copy. The children still warm them up in preload_ai_models.
+    """
+    from django.conf import settings
+
+    if not getattr(settings, "AI_SHARE_MODEL_WEIGHTS", False):
+        return
+    if getattr(settings, "AI_INFERENCE_SERVER_SOCKET", ""):
+        # The models live in the inference server
+        return
+
+    if not is_prefork_pool(sender):
+        logger.info("Not sharing AI models: the worker pool does not fork")
+        return
+
+    from django.db import connections
+    from api.ai_inference import share_models_before_fork
+
+    load_stats = share_models_before_fork()
+    # Connections opened while loading must not be inherited by the children
+    connections.close_all()
+    logger.info(f"Loaded {len(load_stats)} AI models for the pool to share")
+
+
+@worker_process_init.connect
+def preload_ai_models(**kwargs):
+    """Build and warm up the MicroNet models before the worker takes tasks."""
+    from django.conf import settings
+
+    if not getattr(settings, "AI_PRELOAD_MODELS", False):
+        return
+    if getattr(settings, "AI_INFERENCE_SERVER_SOCKET", ""):
+        return
+
+    from api.ai_inference import preload_models
+
+    load_stats = preload_models()
+    total = sum(s["load_time"] + s["warmup_time"] for s in load_stats.values())
+    logger.info(f"Preloaded {len(load_stats)} AI models in {total:.3f}s: {load_stats}")
+
+
 @app.task(bind=True)
 def debug_task(self):
     print(f"Request: {self.request!r}")
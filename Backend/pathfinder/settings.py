@@ -13,7 +13,6 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import os
 
-
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -79,12 +78,78 @@ WSGI_APPLICATION = "pathfinder.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# "development" keeps SQLite's defaults; "production" tunes SQLite for
+# concurrent Celery writers and API readers on a single node
+DATABASE_PROFILE = os.environ.get("DATABASE_PROFILE", "development")
+# "sqlite" or "postgresql"
+DATABASE_ENGINE = os.environ.get("DATABASE_ENGINE", "sqlite")
+# Seconds a connection is kept open between requests/tasks (0 closes it
+# after each one); persistent connections also skip re-running the pragmas
+DATABASE_CONN_MAX_AGE = int(
+    os.environ.get(
+        "DATABASE_CONN_MAX_AGE", "60" if DATABASE_PROFILE == "production" else "0"
+    )
+)
+# PostgreSQL connection pool (requires psycopg[pool]); replaces persistent
+# connections, so CONN_MAX_AGE is forced to 0 when it is enabled
+DATABASE_POOL = os.environ.get("DATABASE_POOL", "false").lower() == "true"
+DATABASE_POOL_MIN_SIZE = int(os.environ.get("DATABASE_POOL_MIN_SIZE", "2"))
+DATABASE_POOL_MAX_SIZE = int(os.environ.get("DATABASE_POOL_MAX_SIZE", "10"))
+
+if DATABASE_ENGINE == "postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("DATABASE_NAME", "pathfinder"),
+            "USER": os.environ.get("DATABASE_USER", "pathfinder"),
+            "PASSWORD": os.environ.get("DATABASE_PASSWORD", ""),
+            "HOST": os.environ.get("DATABASE_HOST", "localhost"),
+            "PORT": os.environ.get("DATABASE_PORT", "5432"),
+            "CONN_MAX_AGE": 0 if DATABASE_POOL else DATABASE_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": (
+                {
+                    "pool": {
+                        "min_size": DATABASE_POOL_MIN_SIZE,
+                        "max_size": DATABASE_POOL_MAX_SIZE,
+                    }
+                }
+                if DATABASE_POOL
+                else {}
+            ),
+        }
+    }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get("DATABASE_PATH", BASE_DIR / "db.sqlite3"),
+            "CONN_MAX_AGE": DATABASE_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": DATABASE_CONN_MAX_AGE > 0,
+        }
+    }
+
+# SQLite production profile: WAL lets readers run alongside the single
+# writer, IMMEDIATE transactions take the write lock up front (so a writer
+# waits on the busy timeout instead of failing with "database is locked"
+# when upgrading a read lock), and synchronous=NORMAL is durable in WAL mode
+SQLITE_BUSY_TIMEOUT = float(os.environ.get("SQLITE_BUSY_TIMEOUT", "20"))  # seconds
+SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+if DATABASE_ENGINE != "postgresql" and DATABASE_PROFILE == "production":
+    DATABASES["default"]["OPTIONS"] = {
+        "timeout": SQLITE_BUSY_TIMEOUT,
+        "transaction_mode": "IMMEDIATE",
+        "init_command": (
+            "PRAGMA journal_mode=WAL;"
+            "PRAGMA synchronous=NORMAL;"
+            f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB};"
+            "PRAGMA temp_store=MEMORY;"
+            f"PRAGMA mmap_size={SQLITE_MMAP_SIZE};"
+            "PRAGMA wal_autocheckpoint=1000"
+        ),
     }
-}
 
 
 # Password validation
@@ -148,9 +213,176 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 # AI Model storage
 AI_MODELS_PATH = os.path.join(BASE_DIR, "ai_models", "trained_models")
 
+# Local content-addressed store of pretrained weights, filled once with
+# `manage.py populate_weight_store`. When offline, loaders never download.
+AI_WEIGHT_STORE_PATH = os.environ.get(
+    "AI_WEIGHT_STORE_PATH", os.path.join(BASE_DIR, "ai_models", "weights")
+)
+AI_WEIGHTS_OFFLINE = os.environ.get("AI_WEIGHTS_OFFLINE", "false").lower() == "true"
+
+# Runtime used for inference: "eager", "torchscript" or "onnxruntime". The
+# latter two run artifacts written by `manage.py export_models` and fall
+# back to eager PyTorch when no valid export exists.
+AI_INFERENCE_BACKEND = os.environ.get("AI_INFERENCE_BACKEND", "eager")
+AI_EXPORT_PATH = os.environ.get(
+    "AI_EXPORT_PATH", os.path.join(BASE_DIR, "ai_models", "exported")
+)
+
+# Opt-in INT8 quantization per model key, overriding the "quantization"
+# entry of MODEL_CONFIGS, e.g. "malaria_segmentation=static,parasite_classification=dynamic"
+# Dynamic mode only converts Linear layers, so it is ignored for the UNet
+# segmentation models; static mode is the one that quantizes them
+AI_MODEL_QUANTIZATION = dict(
+    item.split("=", 1)
+    for item in os.environ.get("AI_MODEL_QUANTIZATION", "").split(",")
+    if "=" in item
+)
+AI_QUANTIZATION_CALIBRATION_SIZE = int(
+    os.environ.get("AI_QUANTIZATION_CALIBRATION_SIZE", "32")
+)
+
+# Segmentation either squashes images to the model input size ("resize") or
+# segments them at native resolution with overlapping tiles ("tiled")
+AI_SEGMENTATION_MODE = os.environ.get("AI_SEGMENTATION_MODE", "resize")
+AI_TILE_SIZE = int(os.environ.get("AI_TILE_SIZE", "512"))
+AI_TILE_STRIDE = int(os.environ.get("AI_TILE_STRIDE", "256"))
+AI_TILE_BATCH_SIZE = int(os.environ.get("AI_TILE_BATCH_SIZE", "8"))
+# Stream tiles row by row and blend overlaps with a "cosine" or "gaussian"
+# window, keeping memory proportional to one row of tiles
+AI_TILE_STREAMING = os.environ.get("AI_TILE_STREAMING", "false").lower() == "true"
+AI_TILE_WINDOW = os.environ.get("AI_TILE_WINDOW", "cosine")
+
+# Build and warm up every configured model when a Celery worker process
+# starts. Off by default; enable it in the worker environment only, as web
+# and management processes never serve predictions
+AI_PRELOAD_MODELS = os.environ.get("AI_PRELOAD_MODELS", "false").lower() == "true"
+# Load the models once in the Celery prefork parent so the pool processes
+# share the weight pages copy-on-write instead of each loading a copy (CPU
+# eager and TorchScript backends only)
+AI_SHARE_MODEL_WEIGHTS = (
+    os.environ.get("AI_SHARE_MODEL_WEIGHTS", "false").lower() == "true"
+)
+
+# Memory budget of the models loaded by one process (parameters and buffers);
+# least recently used models are evicted beyond it. 0 disables eviction
+AI_MODEL_MEMORY_BUDGET_MB = float(os.environ.get("AI_MODEL_MEMORY_BUDGET_MB", "2048"))
+
+# Unix socket of the inference server (manage.py run_inference_server). When
+# set, Celery tasks send predictions there and load no models themselves;
+# empty runs them inside the task process
+AI_INFERENCE_SERVER_SOCKET = os.environ.get("AI_INFERENCE_SERVER_SOCKET", "")
+AI_INFERENCE_SERVER_TIMEOUT = float(
+    os.environ.get("AI_INFERENCE_SERVER_TIMEOUT", "300")
+)  # seconds
+# Torch intra-op and inter-op threads of the inference server; 0 uses every
+# CPU available to it, respectively keeps the torch default
+AI_INFERENCE_SERVER_THREADS = int(os.environ.get("AI_INFERENCE_SERVER_THREADS", "0"))
+AI_INFERENCE_SERVER_INTEROP_THREADS = int(
+    os.environ.get("AI_INFERENCE_SERVER_INTEROP_THREADS", "0")
+)
+
+# Torch intra-op threads per Celery worker process. 0 divides the CPUs the
+# worker may use (affinity mask, cgroup quota) equally between its pool
+# processes so they do not oversubscribe the cores
+AI_TORCH_THREADS = int(os.environ.get("AI_TORCH_THREADS", "0"))
+# Inter-op threads per worker process; a worker runs one image at a time
+AI_TORCH_INTEROP_THREADS = int(os.environ.get("AI_TORCH_INTEROP_THREADS", "1"))
+# Pin each pool process to its own slice of the CPUs
+AI_CPU_AFFINITY = os.environ.get("AI_CPU_AFFINITY", "false").lower() == "true"
+
+# Micro-batching of concurrent inference requests for the same model. Only
+# useful when a worker process runs several tasks at once (--pool threads);
+# the inference server always batches, with these limits.
+AI_BATCHING_ENABLED = os.environ.get("AI_BATCHING_ENABLED", "false").lower() == "true"
+AI_BATCH_MAX_SIZE = int(os.environ.get("AI_BATCH_MAX_SIZE", "8"))
+AI_BATCH_MAX_WAIT = float(os.environ.get("AI_BATCH_MAX_WAIT", "0.01"))  # seconds
+
+# Cache of inference results keyed by image content hash and model version
+AI_RESULT_CACHE_ENABLED = (
+    os.environ.get("AI_RESULT_CACHE_ENABLED", "true").lower() == "true"
+)
+AI_RESULT_CACHE_MAX_ENTRIES = int(
+    os.environ.get("AI_RESULT_CACHE_MAX_ENTRIES", "10000")
+)
+
+# Largest number of images accepted by one batch upload request
+AI_BATCH_UPLOAD_MAX_IMAGES = int(os.environ.get("AI_BATCH_UPLOAD_MAX_IMAGES", "200"))
+DATA_UPLOAD_MAX_NUMBER_FILES = AI_BATCH_UPLOAD_MAX_IMAGES
+
+# Per-process inference stage histograms are published here and summed by
+# the /api/metrics/ scrape endpoint; empty keeps them in-process only
+AI_METRICS_DIR = os.environ.get(
+    "AI_METRICS_DIR", os.path.join(BASE_DIR, "ai_models", "metrics")
+)
+
+# Seconds between writes of a process's metrics file; observations in
+# between are written together when the interval ends
+AI_METRICS_EXPORT_INTERVAL = float(os.environ.get("AI_METRICS_EXPORT_INTERVAL", "1.0"))
+
+# Test runs publish metrics to a temporary directory instead of AI_METRICS_DIR
+TEST_RUNNER = "pathfinder.test_runner.TestRunner"
+
 # Celery configuration for async processing
 CELERY_BROKER_URL = "redis://localhost:6379/0"
 CELERY_RESULT_BACKEND = "redis://localhost:6379/0"
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
+# Model preloading runs in worker_process_init; give it time before the
+# parent considers the child process dead
+CELERY_WORKER_PROC_ALIVE_TIMEOUT = 300
+
+# Push finished analyses to /api/mobile/session-events/<session_id>/ over
+# Redis pub/sub instead of having clients poll for each image
+AI_RESULT_PUSH_ENABLED = (
+    os.environ.get("AI_RESULT_PUSH_ENABLED", "true").lower() == "true"
+)
+AI_RESULT_PUSH_REDIS_URL = os.environ.get("AI_RESULT_PUSH_REDIS_URL", CELERY_BROKER_URL)
+AI_RESULT_STREAM_HEARTBEAT = float(os.environ.get("AI_RESULT_STREAM_HEARTBEAT", "15"))
+AI_RESULT_STREAM_TIMEOUT = float(os.environ.get("AI_RESULT_STREAM_TIMEOUT", "300"))
+
+# Cache of the serialized result payloads served by the mobile result check
+# and the session results endpoint, dropped whenever a result, review, image
+# or session is written. LocMemCache is per process: with separate Celery
+# workers or several web workers use "redis" so invalidations reach them all;
+# the timeout bounds staleness otherwise
+AI_RESPONSE_CACHE_ENABLED = (
+    os.environ.get("AI_RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+)
+AI_RESPONSE_CACHE_BACKEND = os.environ.get("AI_RESPONSE_CACHE_BACKEND", "locmem")
+AI_RESPONSE_CACHE_REDIS_URL = os.environ.get(
+    "AI_RESPONSE_CACHE_REDIS_URL", CELERY_BROKER_URL
+)
+AI_RESPONSE_CACHE_TIMEOUT = int(
+    os.environ.get("AI_RESPONSE_CACHE_TIMEOUT", "60")
+)  # seconds
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "results": (
+        {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": AI_RESPONSE_CACHE_REDIS_URL,
+            "KEY_PREFIX": "pathfinder",
+            "TIMEOUT": AI_RESPONSE_CACHE_TIMEOUT,
+        }
+        if AI_RESPONSE_CACHE_BACKEND == "redis"
+        else {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "pathfinder-results",
+            "TIMEOUT": AI_RESPONSE_CACHE_TIMEOUT,
+            "OPTIONS": {"MAX_ENTRIES": 5000},
+        }
+    ),
+}
+
+# Uploads are streamed to disk in chunks and hashed on the way; files over
+# AI_UPLOAD_MAX_FILE_SIZE are dropped and answered with 413
+FILE_UPLOAD_HANDLERS = ["api.uploads.HashingUploadHandler"]
+AI_UPLOAD_MAX_FILE_SIZE = int(
+    os.environ.get("AI_UPLOAD_MAX_FILE_SIZE", str(50 * 1024 * 1024))
+)  # bytes
+# Longest side in pixels of the thumbnail generated for every upload
+AI_UPLOAD_THUMBNAIL_SIZE = int(os.environ.get("AI_UPLOAD_THUMBNAIL_SIZE", "256"))
@@ -0,0 +1,25 @@
+# pathfinder/test_runner.py
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Django's test runner, with the per-process metrics files of the test run
+    kept in a temporary directory rather than the deployment's AI_METRICS_DIR.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._metrics_dir = tempfile.TemporaryDirectory(prefix="micronet-metrics-")
+        self._metrics_settings = override_settings(
+            AI_METRICS_DIR=self._metrics_dir.name
+        )
+        self._metrics_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._metrics_settings.disable()
+        self._metrics_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
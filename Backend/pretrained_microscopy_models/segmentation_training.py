@@ -198,8 +198,58 @@ def extract_patches(arr, patch_shape=8, extraction_step=1):
     return patches
 
 # https://github.com/choosehappy/PytorchDigitalPathology
+def _predict_tiles(model, batch):
+    """Run a batch of tiles through a smp model (predict) or a plain callable."""
+    if hasattr(model, 'predict'):
+        return model.predict(batch)
+    with torch.no_grad():
+        return model(batch)
+
+
 def segmentation_models_inference(io, model, preprocessing_fn, device = None, batch_size = 8, patch_size = 512,
-                                  num_classes=3, probabilities=None):
+                                  num_classes=3, probabilities=None, stride_size=None,
+                                  output_dtype=np.float32, output_path=None,
+                                  streaming=False, window='cosine', return_class_ids=False):
+    """Segment an image of any size with overlapping tiles.
+
+    Tiles of patch_size are extracted every stride_size pixels (half a patch
+    by default) and only the centre stride_size x stride_size region of each
+    tile prediction is kept, so tile borders never end up in the output.
+
+    Args:
+        io (ndarray): HxWx3 image
+        model: segmentation model, either exposing predict() like
+            segmentation_models_pytorch models or a plain callable
+        preprocessing_fn (callable): normalization applied to the whole image
+        batch_size (int): number of tiles per forward pass
+        patch_size (int): tile size fed to the model
+        num_classes (int): number of output channels of the model
+        probabilities (list, optional): per-class thresholds, defaults to 0.5
+        stride_size (int, optional): distance between tiles, defaults to
+            patch_size // 2. patch_size - stride_size must be even.
+        output_dtype (dtype): dtype of the stitched probabilities, float16
+            halves the memory of the output buffer
+        output_path (str, optional): back the stitched output with a
+            memory-mapped .npy file at this path instead of RAM
+        streaming (bool): process one row of tiles at a time and blend
+            overlapping tile predictions, see
+            segmentation_models_inference_streaming
+        window (str): blending window of the streaming mode
+        return_class_ids (bool): return the argmax over the stitched class
+            scores instead of thresholding them, for models whose outputs
+            are logits or softmax probabilities rather than sigmoids
+
+    Returns:
+        ndarray: HxWx(num_classes - 1) boolean masks, background excluded,
+        or HxW uint8 class ids with return_class_ids
+    """
+
+    if streaming:
+        return segmentation_models_inference_streaming(
+            io, model, preprocessing_fn, device=device, batch_size=batch_size,
+            patch_size=patch_size, stride_size=stride_size, num_classes=num_classes,
+            probabilities=probabilities, window=window, output_path=output_path,
+            return_class_ids=return_class_ids)
 
     # This will not output the first class and assumes that the first class is wherever the other classes are not!
     try:
@@ -208,18 +258,20 @@ def segmentation_models_inference(io, model, preprocessing_fn, device = None, ba
         io = preprocessing_fn(np.array(io))
         
     io_shape_orig = np.array(io.shape)
-    stride_size = patch_size // 2
+    if stride_size is None:
+        stride_size = patch_size // 2
+    if stride_size > patch_size or (patch_size - stride_size) % 2:
+        raise ValueError('patch_size - stride_size must be even and non-negative')
+    margin = (patch_size - stride_size) // 2
     if device is None:
         device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
-    # add half the stride as padding around the image, so that we can crop it away later
-    io = np.pad(io, [(stride_size // 2, stride_size // 2), (stride_size // 2, stride_size // 2), (0, 0)],
+    # add the tile margin as padding around the image, so that we can crop it away later
+    io = np.pad(io, [(margin, margin), (margin, margin), (0, 0)],
                 mode="reflect")
 
-    io_shape_wpad = np.array(io.shape)
-
-    # pad to match an exact multiple of unet patch size, otherwise last row/column are lost
-    npad0 = int(np.ceil(io_shape_wpad[0] / patch_size) * patch_size - io_shape_wpad[0])
-    npad1 = int(np.ceil(io_shape_wpad[1] / patch_size) * patch_size - io_shape_wpad[1])
+    # pad so the tiles cover the whole image, otherwise last row/column are lost
+    npad0 = int(np.ceil(io_shape_orig[0] / stride_size) * stride_size - io_shape_orig[0])
+    npad1 = int(np.ceil(io_shape_orig[1] / stride_size) * stride_size - io_shape_orig[1])
 
     io = np.pad(io, [(0, npad0), (0, npad1), (0, 0)], mode="constant")
 
@@ -227,41 +279,41 @@ def segmentation_models_inference(io, model, preprocessing_fn, device = None, ba
         warnings.simplefilter('ignore')
         arr_out = extract_patches(io, (patch_size, patch_size, 3), stride_size)
 
-    arr_out_shape = arr_out.shape
-    arr_out = arr_out.reshape(-1, patch_size, patch_size, 3)
+    # tile grid; arr_out stays a strided view so tiles are only copied per batch
+    n_rows, n_cols = arr_out.shape[0], arr_out.shape[1]
+    tile_indices = list(product(range(n_rows), range(n_cols)))
+
+    # preallocate the stitched output and write each tile centre straight into it
+    output_shape = (n_rows * stride_size, n_cols * stride_size, num_classes)
+    if output_path is None:
+        output = np.empty(output_shape, dtype=output_dtype)
+    else:
+        output = np.lib.format.open_memmap(output_path, mode='w+', dtype=output_dtype,
+                                           shape=output_shape)
 
     # in case we have a large network, lets cut the list of tiles into batches
-    output = np.zeros((0, num_classes, patch_size, patch_size))
-    def divide_batch(l, n): 
-        for i in range(0, l.shape[0], n):  
-            yield l[i:i + n,::] 
-    for batch_arr in divide_batch(arr_out, batch_size):
+    for start in range(0, len(tile_indices), batch_size):
+        batch_indices = tile_indices[start:start + batch_size]
+        batch_arr = np.stack([arr_out[i, j, 0] for i, j in batch_indices])
         arr_out_gpu = torch.from_numpy(batch_arr.transpose(0, 3, 1, 2).astype('float32')).to(device)
 
         # ---- get results
-        output_batch = model.predict(arr_out_gpu)
+        output_batch = _predict_tiles(model, arr_out_gpu)
 
-        # --- pull from GPU and append to rest of output
-        if probabilities is None:
-            output_batch = output_batch.detach().cpu().numpy().round()
-        else:
-            output_batch = output_batch.detach().cpu().numpy()
-
-        output = np.append(output, output_batch, axis=0)
-
-    output = output.transpose((0, 2, 3, 1))
+        # --- pull from GPU, keep only the centre of each tile
+        output_batch = output_batch[:, :, margin:patch_size - margin, margin:patch_size - margin]
+        output_batch = output_batch.detach().cpu().numpy()
+        if probabilities is None and not return_class_ids:
+            output_batch = output_batch.round()
 
-    # turn from a single list into a matrix of tiles
-    output = output.reshape(arr_out_shape[0], arr_out_shape[1], patch_size, patch_size, output.shape[3])
-
-    # remove the padding from each tile, we only keep the center
-    output = output[:, :, stride_size // 2:-stride_size // 2, stride_size // 2:-stride_size // 2, :]
-
-    # turn all the tiles into an image
-    output = np.concatenate(np.concatenate(output, 1), 1)
+        for (i, j), tile in zip(batch_indices, output_batch):
+            output[i * stride_size:(i + 1) * stride_size,
+                   j * stride_size:(j + 1) * stride_size, :] = tile.transpose(1, 2, 0)
 
     # incase there was extra padding to get a multiple of patch size, remove that as well
     output = output[0:io_shape_orig[0], 0:io_shape_orig[1], :]  # remove paddind, crop back
+    if return_class_ids:
+        return _class_ids(output, num_classes)
     if probabilities is None:
         if num_classes == 1:
             return output.astype('bool')
@@ -273,6 +325,178 @@ def segmentation_models_inference(io, model, preprocessing_fn, device = None, ba
         return output[:, :, 1:].astype('bool')
 
 
+def blending_window(patch_size, window='cosine'):
+    """2D weight window used to blend overlapping tile predictions.
+
+    Args:
+        patch_size (int): tile size
+        window (str): 'cosine' (Hann) or 'gaussian' (sigma = patch_size / 8)
+
+    Returns:
+        ndarray: patch_size x patch_size float32 weights, strictly positive
+    """
+    x = np.arange(patch_size, dtype=np.float64) + 0.5
+    if window == 'cosine':
+        w = np.sin(np.pi * x / patch_size) ** 2
+    elif window == 'gaussian':
+        sigma = patch_size / 8
+        w = np.exp(-((x - patch_size / 2) ** 2) / (2 * sigma ** 2))
+    else:
+        raise ValueError("window must be 'cosine' or 'gaussian'")
+    w = np.maximum(w, 1e-6)
+    return np.outer(w, w).astype('float32')
+
+
+def _padded_indices(n_padded, size, margin):
+    """Map padded coordinates back to image coordinates.
+
+    Mirrors np.pad with 'reflect' for margin pixels on both sides followed by
+    zero padding at the end. Returns the source indices and a mask of which
+    padded coordinates hold image data (the rest are zeros).
+    """
+    idx = np.abs(np.arange(n_padded) - margin)
+    over = idx >= size
+    idx[over] = 2 * (size - 1) - idx[over]
+    valid = (np.arange(n_padded) < size + 2 * margin) & (idx >= 0)
+    idx[~valid] = 0
+    return idx, valid
+
+
+def segmentation_models_inference_streaming(io, model, preprocessing_fn, device=None, batch_size=8,
+                                            patch_size=512, stride_size=None, num_classes=3,
+                                            probabilities=None, window='cosine', output_path=None,
+                                            return_class_ids=False):
+    """Segment an image row of tiles by row, blending overlapping tiles.
+
+    Unlike segmentation_models_inference, which keeps only tile centres, every
+    tile prediction is weighted by a cosine or Gaussian window and accumulated,
+    which removes seams between tiles. Only the rows of the image under the
+    current row of tiles are read, preprocessed and accumulated; finished rows
+    are thresholded, written out and dropped. Memory is therefore proportional
+    to one row of tiles, and io may be a memory-mapped array larger than RAM.
+
+    Args:
+        io (ndarray): HxWx3 image, may be a np.memmap
+        model: segmentation model, either exposing predict() like
+            segmentation_models_pytorch models or a plain callable
+        preprocessing_fn (callable): normalization applied to each strip of rows
+        batch_size (int): number of tiles per forward pass
+        patch_size (int): tile size fed to the model
+        stride_size (int, optional): distance between tiles, defaults to
+            patch_size // 2. patch_size - stride_size must be even.
+        num_classes (int): number of output channels of the model
+        probabilities (list, optional): per-class thresholds, defaults to 0.5
+        window (str): 'cosine' or 'gaussian' blending window
+        output_path (str, optional): write the boolean masks to a
+            memory-mapped .npy file at this path instead of RAM
+        return_class_ids (bool): return the argmax over the blended class
+            scores instead of thresholding them
+
+    Returns:
+        ndarray: HxWx(num_classes - 1) boolean masks, background excluded,
+        or HxW uint8 class ids with return_class_ids
+    """
+    if stride_size is None:
+        stride_size = patch_size // 2
+    if stride_size > patch_size or (patch_size - stride_size) % 2:
+        raise ValueError('patch_size - stride_size must be even and non-negative')
+    margin = (patch_size - stride_size) // 2
+    if device is None:
+        device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+
+    height, width = io.shape[:2]
+    n_rows = int(np.ceil(height / stride_size))
+    n_cols = int(np.ceil(width / stride_size))
+    padded_width = (n_cols - 1) * stride_size + patch_size
+    col_idx, col_valid = _padded_indices(padded_width, width, margin)
+    row_idx, row_valid = _padded_indices((n_rows - 1) * stride_size + patch_size, height, margin)
+
+    weights = blending_window(patch_size, window)
+    weights_gpu = torch.from_numpy(weights).to(device)
+
+    if return_class_ids:
+        output_shape, output_dtype = (height, width), np.uint8
+    else:
+        out_channels = 1 if num_classes == 1 else num_classes - 1
+        output_shape, output_dtype = (height, width, out_channels), bool
+    if output_path is None:
+        output = np.empty(output_shape, dtype=output_dtype)
+    else:
+        output = np.lib.format.open_memmap(output_path, mode='w+', dtype=output_dtype,
+                                           shape=output_shape)
+
+    # accumulators for the patch_size rows under the current row of tiles
+    acc = np.zeros((patch_size, padded_width, num_classes), dtype='float32')
+    acc_weight = np.zeros((patch_size, padded_width, 1), dtype='float32')
+
+    for r in range(n_rows):
+        top = r * stride_size
+
+        # read and preprocess only the strip of rows this row of tiles covers
+        rows = slice(top, top + patch_size)
+        strip = np.asarray(io[row_idx[rows]])[:, col_idx]
+        try:
+            strip = preprocessing_fn(strip)
+        except AttributeError:
+            strip = preprocessing_fn(np.array(strip))
+        strip = strip.astype('float32', copy=False)
+        strip[~row_valid[rows]] = 0
+        strip[:, ~col_valid] = 0
+
+        for start in range(0, n_cols, batch_size):
+            cols = range(start, min(start + batch_size, n_cols))
+            batch_arr = np.stack([strip[:, c * stride_size:c * stride_size + patch_size] for c in cols])
+            batch_gpu = torch.from_numpy(batch_arr.transpose(0, 3, 1, 2)).to(device)
+            output_batch = _predict_tiles(model, batch_gpu) * weights_gpu
+            output_batch = output_batch.detach().cpu().numpy().transpose(0, 2, 3, 1)
+            for c, tile in zip(cols, output_batch):
+                acc[:, c * stride_size:c * stride_size + patch_size] += tile
+                acc_weight[:, c * stride_size:c * stride_size + patch_size, 0] += weights
+
+        # rows above the next row of tiles will not receive more predictions
+        done = patch_size if r == n_rows - 1 else stride_size
+        finished = acc[:done] / acc_weight[:done]
+
+        # drop the padding and write the finished rows out
+        y0, y1 = max(top, margin), min(top + done, height + margin)
+        if y1 > y0:
+            block = finished[y0 - top:y1 - top, margin:margin + width]
+            if return_class_ids:
+                output[y0 - margin:y1 - margin] = _class_ids(block, num_classes)
+            else:
+                output[y0 - margin:y1 - margin] = _threshold_classes(block, num_classes, probabilities)
+
+        # shift the accumulators up by one row of tiles
+        acc[:patch_size - stride_size] = acc[stride_size:]
+        acc[patch_size - stride_size:] = 0
+        acc_weight[:patch_size - stride_size] = acc_weight[stride_size:]
+        acc_weight[patch_size - stride_size:] = 0
+
+    if isinstance(output, np.memmap):
+        output.flush()
+    return output
+
+
+def _class_ids(output, num_classes):
+    """Turn HxWxC class scores into an HxW uint8 mask of the best class."""
+    if num_classes == 1:
+        return (output[:, :, 0] > 0.5).astype(np.uint8)
+    return output.argmax(axis=2).astype(np.uint8)
+
+
+def _threshold_classes(output, num_classes, probabilities=None):
+    """Turn HxWxC class probabilities into boolean masks without background."""
+    if probabilities is None:
+        output = output.round()
+        if num_classes == 1:
+            return output.astype('bool')
+        return output[:, :, 1:].astype('bool')
+    masks = np.empty(output.shape[:2] + (num_classes - 1,), dtype=bool)
+    for i in range(num_classes - 1):  # don't care about background class
+        masks[:, :, i] = output[:, :, i + 1] > probabilities[i]
+    return masks
+
+
 def train_segmentation_model(model,
                              architecture,
                              encoder,